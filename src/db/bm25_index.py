@@ -0,0 +1,97 @@
+import math
+import re
+import threading
+from collections import Counter
+from typing import Dict, List, Tuple
+
+from langchain_core.documents import Document
+
+STOP_WORDS = {
+  "a", "an", "and", "are", "as", "at", "be", "by", "did", "do", "does", "for", "from", "how", "in", "is", "it",
+  "its", "of", "on", "or", "that", "the", "this", "to", "was", "were", "what", "when", "where", "which", "who",
+  "why", "with",
+}
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[.,][0-9]+)*")
+
+
+def tokenize(text: str) -> List[str]:
+  return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOP_WORDS]
+
+
+class BM25Index:
+  """Okapi BM25 inverted index over the chunks of one report partition."""
+
+  def __init__(self, k1: float = 1.5, b: float = 0.75):
+    self.k1 = k1
+    self.b = b
+    self._documents: Dict[str, Tuple[Document, int]] = {}
+    self._postings: Dict[str, Dict[str, int]] = {}
+    self._total_length = 0
+    self._lock = threading.Lock()
+
+  def __len__(self):
+    return len(self._documents)
+
+  def add(self, ids: List[str], texts: List[str], metadatas: List[dict] = None):
+    metadatas = metadatas or [{} for _ in texts]
+    with self._lock:
+      for doc_id, text, metadata in zip(ids, texts, metadatas):
+        if doc_id in self._documents:
+          self._remove(doc_id)
+        term_counts = Counter(tokenize(text))
+        length = sum(term_counts.values())
+        self._documents[doc_id] = (Document(page_content=text, metadata=metadata or {}, id=doc_id), length)
+        self._total_length += length
+        for term, count in term_counts.items():
+          self._postings.setdefault(term, {})[doc_id] = count
+
+  def remove(self, ids: List[str]):
+    with self._lock:
+      for doc_id in ids:
+        if doc_id in self._documents:
+          self._remove(doc_id)
+
+  def _remove(self, doc_id: str):
+    document, length = self._documents.pop(doc_id)
+    self._total_length -= length
+    for term in set(tokenize(document.page_content)):
+      postings = self._postings.get(term)
+      if postings is not None:
+        postings.pop(doc_id, None)
+        if not postings:
+          del self._postings[term]
+
+  def search(self, query: str, k: int = 4) -> List[Tuple[Document, float]]:
+    with self._lock:
+      document_count = len(self._documents)
+      if document_count == 0:
+        return []
+      average_length = self._total_length / document_count
+
+      scores: Dict[str, float] = {}
+      for term in set(tokenize(query)):
+        postings = self._postings.get(term)
+        if not postings:
+          continue
+        idf = math.log(1 + (document_count - len(postings) + 0.5) / (len(postings) + 0.5))
+        for doc_id, frequency in postings.items():
+          length = self._documents[doc_id][1]
+          norm = frequency + self.k1 * (1 - self.b + self.b * length / average_length)
+          scores[doc_id] = scores.get(doc_id, 0.0) + idf * frequency * (self.k1 + 1) / norm
+
+      best = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+      return [(self._documents[doc_id][0], score) for doc_id, score in best]
+
+
+def reciprocal_rank_fusion(ranked_lists, k: int, rrf_k: int = 60) -> List[Document]:
+  """Merges ranked document lists, a document scores sum(1 / (rrf_k + rank)) over the lists it appears in."""
+  scores = {}
+  documents = {}
+  for ranked in ranked_lists:
+    for rank, document in enumerate(ranked):
+      key = document.page_content
+      documents.setdefault(key, document)
+      scores[key] = scores.get(key, 0.0) + 1.0 / (rrf_k + rank + 1)
+  best = sorted(scores, key=scores.get, reverse=True)[:k]
+  return [documents[key] for key in best]
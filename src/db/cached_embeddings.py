@@ -0,0 +1,132 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from src.util.env_property import EMBEDDING_CACHE_MAX_ENTRIES, \
+  EMBEDDING_CACHE_PATH, EMBEDDING_CACHE_PERSIST_MAX_ENTRIES
+from src.util.logger import logger
+from src.util.metrics import metrics
+
+EMBEDDING_CACHE_LOOKUPS = metrics.counter("embedding_cache_lookups_total", "Text embedding cache lookups by result (memory/disk/miss)", ["model", "result"])
+EMBEDDING_CACHE_ENTRIES = metrics.gauge("embedding_cache_entries", "Text embeddings held in memory", ["model"])
+
+
+class CachedEmbeddings(Embeddings):
+  """Embeddings wrapper with an in-memory LRU keyed by text hash, optionally backed by a SQLite file.
+
+  Misses of one call are embedded together in a single batch by the wrapped model.
+  Queries and documents share entries, which holds for sentence transformers where both embed the same way.
+  """
+
+  # evict the disk store in chunks instead of on every insert
+  EVICTION_CHECK_EVERY = 500
+
+  def __init__(self, embeddings: Embeddings, model_name: str, max_entries: int = EMBEDDING_CACHE_MAX_ENTRIES,
+      path: Optional[str] = EMBEDDING_CACHE_PATH, persist_max_entries: int = EMBEDDING_CACHE_PERSIST_MAX_ENTRIES):
+    self.embeddings = embeddings
+    self.model_name = model_name
+    self.max_entries = max_entries
+    self.persist_max_entries = persist_max_entries
+    self._entries: OrderedDict[str, List[float]] = OrderedDict()
+    self._lock = threading.Lock()
+    self._connection = self._open(path) if path else None
+    self._inserts = 0
+
+  def _open(self, path: str):
+    directory = os.path.dirname(path)
+    if directory:
+      os.makedirs(directory, exist_ok=True)
+    connection = sqlite3.connect(path, check_same_thread=False)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("CREATE TABLE IF NOT EXISTS embedding_cache (key TEXT PRIMARY KEY, vector BLOB NOT NULL, created_at REAL NOT NULL)")
+    connection.execute("CREATE INDEX IF NOT EXISTS embedding_cache_created_at ON embedding_cache (created_at)")
+    connection.commit()
+    logger.info(f"Embedding cache for {self.model_name} persisted at {path}")
+    return connection
+
+  def _key(self, text: str) -> str:
+    return hashlib.sha256(f"{self.model_name}\x00{text}".encode("utf-8")).hexdigest()
+
+  def _remember(self, key: str, vector: List[float]):
+    self._entries[key] = vector
+    self._entries.move_to_end(key)
+    while len(self._entries) > self.max_entries:
+      self._entries.popitem(last=False)
+
+  def _lookup(self, keys: List[str]) -> dict:
+    found = {}
+    with self._lock:
+      for key in keys:
+        vector = self._entries.get(key)
+        if vector is not None:
+          self._entries.move_to_end(key)
+          found[key] = vector
+          EMBEDDING_CACHE_LOOKUPS.labels(model=self.model_name, result="memory").inc()
+
+      missing = [key for key in keys if key not in found]
+      if self._connection is None:
+        return found
+
+      # sqlite limits the number of bound parameters per statement
+      for start in range(0, len(missing), 500):
+        batch = missing[start:start + 500]
+        placeholders = ",".join("?" for _ in batch)
+        rows = self._connection.execute(f"SELECT key, vector FROM embedding_cache WHERE key IN ({placeholders})", batch).fetchall()
+        for key, blob in rows:
+          vector = np.frombuffer(blob, dtype=np.float32).tolist()
+          found[key] = vector
+          self._remember(key, vector)
+          EMBEDDING_CACHE_LOOKUPS.labels(model=self.model_name, result="disk").inc()
+    return found
+
+  def _store(self, pairs):
+    with self._lock:
+      for key, vector in pairs:
+        self._remember(key, vector)
+      EMBEDDING_CACHE_ENTRIES.labels(model=self.model_name).set(len(self._entries))
+
+      if self._connection is None:
+        return
+      now = time.time()
+      self._connection.executemany("INSERT OR REPLACE INTO embedding_cache (key, vector, created_at) VALUES (?, ?, ?)",
+                                   [(key, np.asarray(vector, dtype=np.float32).tobytes(), now) for key, vector in pairs])
+      self._inserts += len(pairs)
+      if self._inserts >= self.EVICTION_CHECK_EVERY:
+        self._inserts = 0
+        count = self._connection.execute("SELECT COUNT(*) FROM embedding_cache").fetchone()[0]
+        overflow = count - self.persist_max_entries
+        if overflow > 0:
+          self._connection.execute(
+              "DELETE FROM embedding_cache WHERE key IN (SELECT key FROM embedding_cache ORDER BY created_at LIMIT ?)", (overflow,))
+      self._connection.commit()
+
+  def _embed(self, texts: List[str], embed_fn) -> List[List[float]]:
+    keys = [self._key(text) for text in texts]
+    found = self._lookup(list(dict.fromkeys(keys)))
+
+    missing = {}
+    for key, text in zip(keys, texts):
+      if key not in found and key not in missing:
+        missing[key] = text
+
+    if missing:
+      EMBEDDING_CACHE_LOOKUPS.labels(model=self.model_name, result="miss").inc(len(missing))
+      vectors = embed_fn(list(missing.values()))
+      pairs = list(zip(missing.keys(), vectors))
+      self._store(pairs)
+      found.update(pairs)
+
+    return [found[key] for key in keys]
+
+  def embed_documents(self, texts: List[str]) -> List[List[float]]:
+    return self._embed(texts, self.embeddings.embed_documents)
+
+  def embed_query(self, text: str) -> List[float]:
+    return self._embed([text], lambda missing: [self.embeddings.embed_query(missing[0])])[0]
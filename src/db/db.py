@@ -1,25 +1,112 @@
 import abc
-import tempfile
+import hashlib
+import os
+import re
+import threading
+import time
+from datetime import datetime
 from abc import abstractmethod
 from langchain.retrievers import RePhraseQueryRetriever
 from langchain_community.embeddings import HuggingFaceEmbeddings
 from langchain.vectorstores import Chroma
 from langchain_core.prompts import PromptTemplate
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.vectorstores import VectorStoreRetriever
 from uuid import uuid4
 
-from langchain_experimental.open_clip import OpenCLIPEmbeddings
+import numpy as np
 
-from chromadb import Client
+from chromadb import Client, PersistentClient
+from src.db.bm25_index import BM25Index, reciprocal_rank_fusion
+from src.db.cached_embeddings import CachedEmbeddings
+from src.db.embeddings import ClipEmbeddingProvider
+from src.db.mmap_vector_store import MmapReportPartition, MmapReportRetriever, \
+  normalize, recover_interrupted_swaps
+from src.db.reranker import CrossEncoderReranker, RerankingRetriever
+from src.db.report_catalog import ReportCatalog
 from src.llm.llm_provider import get_llm
 from src.models.router import UserIntentionEnum
+from src.util.component_registry import component_registry
+from src.util.env_property import INGESTION_EMBED_BATCH_SIZE, CLIP_BATCH_SIZE, \
+  VECTOR_DB_SOURCE, VECTOR_DB_PATH, REPORT_HYBRID_FETCH_K, RERANK_ENABLED, \
+  RERANK_CANDIDATES, REPORT_HNSW_M, REPORT_HNSW_CONSTRUCTION_EF, REPORT_HNSW_SEARCH_EF, \
+  MMAP_VECTOR_DB_PATH, MMAP_VECTOR_DTYPE
 from src.util.prompt_manager import prompt_manager
 from src.util.logger import logger
+from src.util.metrics import metrics
 
-# normal version
-# clip_embedder = OpenCLIPEmbeddings(model_name="ViT-g-14", checkpoint="laion2b_s34b_b88k")
+RETRIEVAL_SECONDS = metrics.histogram("retrieval_seconds", "Vector search latency per collection", ["collection"])
+VECTOR_DB_OPEN_SECONDS = metrics.gauge("vector_db_open_seconds", "Time it took to open the vector db", ["source"])
 
-# version for light aws deployment
-clip_embedder = OpenCLIPEmbeddings(model_name="ViT-B/32", checkpoint="laion2b_s34b_b79k")
+# ViT-B-32 for light aws deployment, CLIP_MODEL_NAME=ViT-g-14 CLIP_CHECKPOINT=laion2b_s34b_b88k for the normal version
+get_clip_embedder = component_registry.register("clip_embedder", ClipEmbeddingProvider)
+
+get_text_embeddings = component_registry.register(
+    "text_embeddings", lambda: CachedEmbeddings(HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2"), "all-MiniLM-L6-v2"))
+
+get_reranker = component_registry.register("reranker", CrossEncoderReranker, warm_up=RERANK_ENABLED)
+
+class TimedVectorStoreRetriever(VectorStoreRetriever):
+    """Vector store retriever that records its search latency under the collection name."""
+
+    collection: str = "unknown"
+
+    def _get_relevant_documents(self, query, *, run_manager, **kwargs):
+      with RETRIEVAL_SECONDS.labels(collection=self.collection).time():
+        return super()._get_relevant_documents(query, run_manager=run_manager, **kwargs)
+
+    async def _aget_relevant_documents(self, query, *, run_manager, **kwargs):
+      with RETRIEVAL_SECONDS.labels(collection=self.collection).time():
+        return await super()._aget_relevant_documents(query, run_manager=run_manager, **kwargs)
+
+def timed_retriever(vectorstore, collection, **kwargs):
+    return TimedVectorStoreRetriever(vectorstore=vectorstore, collection=collection, **kwargs)
+
+class HybridReportRetriever(BaseRetriever):
+    """BM25 keyword hits and vector hits of one report partition, fused by reciprocal rank."""
+
+    vector_retriever: BaseRetriever
+    bm25_index: BM25Index
+    k: int = 4
+    fetch_k: int = REPORT_HYBRID_FETCH_K
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> list[Document]:
+      vector_documents = self.vector_retriever.invoke(query, config={"callbacks": run_manager.get_child()})
+      with RETRIEVAL_SECONDS.labels(collection="report_bm25").time():
+        keyword_documents = [document for document, _ in self.bm25_index.search(query, self.fetch_k)]
+      return reciprocal_rank_fusion([keyword_documents, vector_documents], self.k)
+
+REPORT_PARTITION_PREFIX = "report_"
+
+def report_chunk_id(text: str, date: str) -> str:
+    # identical chunks keep their id across amended uploads of one report, so they are never embedded twice,
+    # the date is part of the hash so reports of other dates never share or delete each other's chunks
+    return hashlib.sha256(f"{date}\n{text}".encode("utf-8")).hexdigest()
+
+def iter_report_chunk_batches(documents, date: str, size: int = INGESTION_EMBED_BATCH_SIZE):
+    """Batches of (id, text, chunk metadata), documents are chunk texts or (text, metadata) pairs and may be a generator."""
+    batch = []
+    for document in documents:
+      text, chunk_metadata = (document, {}) if isinstance(document, str) else document
+      # the size is kept with the chunk, a catalog rebuild then never reads the documents
+      batch.append((report_chunk_id(text, date), text, {**chunk_metadata, "size_bytes": len(text.encode("utf-8"))}))
+      if len(batch) >= size:
+        yield batch
+        batch = []
+    if batch:
+      yield batch
+
+REPORT_HNSW_DEFAULTS = {"M": REPORT_HNSW_M, "construction_ef": REPORT_HNSW_CONSTRUCTION_EF, "search_ef": REPORT_HNSW_SEARCH_EF}
+
+def hnsw_metadata(hnsw: dict) -> dict:
+    # chroma reads the index parameters from the collection metadata when the collection is created
+    return {f"hnsw:{key}": value for key, value in (hnsw or {}).items() if value is not None}
+
+def report_partition_name(ticker: str) -> str:
+    # chroma collection names allow [a-zA-Z0-9._-] and must end with an alphanumeric character
+    return REPORT_PARTITION_PREFIX + re.sub(r"[^a-zA-Z0-9_-]", "_", ticker.upper()).rstrip("_-")
 
 class FinReportVectorDB(abc.ABC):
 
@@ -28,6 +115,16 @@ class FinReportVectorDB(abc.ABC):
         pass
 
     @abstractmethod
+    def get_report_details(self, ticker=None):
+        pass
+
+    def search_many_per_ticker(self, tickers, queries, k=4, type=None, rerank=RERANK_ENABLED):
+      """search_many for every ticker on its own, not merged, the queries are embedded once for all tickers."""
+      queries = list(queries)
+      query_embeddings = self.transformer_fn.embed_documents(queries) if queries else []
+      return {ticker: self.search_many(ticker, queries, k, type, rerank, query_embeddings=query_embeddings)
+              for ticker in dict.fromkeys(tickers)}
+
     def search_report_context(self, ticker, query):
         pass
 
@@ -36,11 +133,15 @@ class FinReportVectorDB(abc.ABC):
         pass
 
     @abstractmethod
-    def get_base_retriever(self, type=None, ticker=None):
+    def get_base_retriever(self, type=None, ticker=None, k=4, rerank=RERANK_ENABLED):
       pass
 
     @abstractmethod
-    def add_new_report(self, embed, metadata):
+    def search_many(self, ticker_or_tickers, queries, k=4, type=None, rerank=RERANK_ENABLED, query_embeddings=None):
+      pass
+
+    @abstractmethod
+    def add_new_report(self, embed, metadata, progress=None):
         pass
 
     @abstractmethod
@@ -55,6 +156,10 @@ class FinReportVectorDB(abc.ABC):
     def store_image_embedding(self, file_bytes, uri:str, metadata: dict = None):
       pass
 
+    @abstractmethod
+    def store_image_embeddings(self, images: list, uris: list, metadatas: list):
+      pass
+
     @abstractmethod
     def search_image(self, query: str, top_k=3):
       pass
@@ -67,71 +172,221 @@ class FinReportVectorDB(abc.ABC):
     def define_route(self, query):
       pass
 
-class InMemoryFinReportVectorDBReport(FinReportVectorDB):
+class PartitionedFinReportVectorDB(FinReportVectorDB):
+    """Routing, images, the report catalog and the retrieval pipeline shared by every backend.
 
-    def __init__(self):
-        transformer_fn = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
+    How report partitions are stored, searched and written is left to the subclass.
+    """
+
+    def __init__(self, client, catalog: ReportCatalog):
+        # routing examples and images live in chroma collections of this client for every backend
+        self.client = client
+        self.catalog = catalog
+        transformer_fn = get_text_embeddings()
 
         self.route_db = Chroma(
+            client=self.client,
             collection_name="routing",
             embedding_function=transformer_fn)
 
-        self.route_db.add_texts([prompt_manager.get_prompt("company_news_route")], metadatas=[{"route": UserIntentionEnum.NEWS_ABOUT_COMPANY.name}], ids=["INIT_0"])
-        self.route_db.add_texts([prompt_manager.get_prompt("company_price_fall_route")], metadatas=[{"route": UserIntentionEnum.ANALYSE_SHARE_PRISE.name}], ids=["INIT_1"])
-        self.route_db.add_texts([prompt_manager.get_prompt("fin_report_route")], metadatas=[{"route": UserIntentionEnum.COMPANY_INFORMATION_FROM_REPORT.name}], ids=["INIT_2"])
-        self.route_db.add_texts([prompt_manager.get_prompt("other_financial_route")], metadatas=[{"route": UserIntentionEnum.OTHER_FINANCIAL_QUESTIONS.name}], ids=["INIT_3"])
+        # one batched write (and embedding call) for all routing examples
+        routes = [
+          ("company_news_route", UserIntentionEnum.NEWS_ABOUT_COMPANY),
+          ("company_price_fall_route", UserIntentionEnum.ANALYSE_SHARE_PRISE),
+          ("fin_report_route", UserIntentionEnum.COMPANY_INFORMATION_FROM_REPORT),
+          ("other_financial_route", UserIntentionEnum.OTHER_FINANCIAL_QUESTIONS),
+        ]
+        route_ids = [f"INIT_{i}" for i in range(len(routes))]
+        route_texts = [prompt_manager.get_prompt(prompt) for prompt, _ in routes]
+        route_metadatas = [{"route": route.name} for _, route in routes]
+        # add() skips ids a persistent store already holds, edited route prompts are upserted instead
+        stored = self.route_db._collection.get(ids=route_ids, include=["documents", "metadatas"])
+        if dict(zip(stored["ids"], zip(stored["documents"], stored["metadatas"]))) != dict(zip(route_ids, zip(route_texts, route_metadatas))):
+          self.route_db._collection.upsert(ids=route_ids, documents=route_texts, metadatas=route_metadatas,
+                                           embeddings=transformer_fn.embed_documents(route_texts))
 
         self.define_route("What is the latest news about Apple Inc.?")
 
+        self.transformer_fn = transformer_fn
+        self._bm25_indexes = {}
+        self._write_locks = {}
+        self._partitions_lock = threading.Lock()
 
-        self.report_db = Chroma(
-            collection_name="report",
-            embedding_function=transformer_fn)
+        self._image_db = None
 
-        self.image_db = Chroma(
-            collection_name="image",
-            embedding_function=clip_embedder)
+        self.embed_image_db = self.client.get_or_create_collection("embed_image")
+
+    @abstractmethod
+    def report_partitions(self):
+      """Names of the stored report partitions, one per ticker."""
+      pass
+
+    @abstractmethod
+    def stored_report_chunks(self, ticker: str) -> dict:
+      """ids, documents and metadatas of every chunk in the ticker's partition."""
+      pass
+
+    @abstractmethod
+    def report_vector_retriever(self, ticker: str, k: int) -> BaseRetriever:
+      pass
+
+    @abstractmethod
+    def search_partition(self, ticker: str, query_embeddings, k: int):
+      """(distance, document) hits of every query embedding in the ticker's partition."""
+      pass
+
+    @abstractmethod
+    def report_manifest(self, ticker: str, date: str) -> dict:
+      pass
+
+    @abstractmethod
+    def partition_count(self, name: str) -> int:
+      """Number of chunks in the partition, without reading them."""
+      pass
+
+    @abstractmethod
+    def rebuild_catalog(self):
+      pass
 
-        self.embed_image_db = Client().get_or_create_collection("embed_image")
+    def open_catalog(self):
+      """Trusts the saved catalog when it lists exactly the stored partitions with their chunk counts, rebuilds it otherwise."""
+      counts = {name: self.partition_count(name) for name in self.report_partitions()}
+      # empty partitions have no entry
+      stored = {name: count for name, count in counts.items() if count}
+      if {entry.partition: entry.chunks for entry in self.catalog.entries()} == stored:
+        logger.info(f"Report catalog matches the {len(stored)} stored partitions")
+        return
+      # missing, or from before a crash or a store copied from elsewhere, the partitions are the truth
+      self.rebuild_catalog()
+
+    @property
+    def image_db(self):
+      # only built when images are stored by path, so the clip model is not loaded with the db
+      if self._image_db is None:
+        self._image_db = Chroma(
+            client=self.client,
+            collection_name="image",
+            embedding_function=get_clip_embedder())
+      return self._image_db
 
     def define_route(self, query):
-      result = self.route_db.search(query, search_type="similarity", k=1)
+      with RETRIEVAL_SECONDS.labels(collection="routing").time():
+        result = self.route_db.search(query, search_type="similarity", k=1)
       return UserIntentionEnum.from_str(result[0].metadata['route'])
 
+    def bm25_index(self, ticker: str) -> BM25Index:
+      name = report_partition_name(ticker)
+      with self._partitions_lock:
+        index = self._bm25_indexes.get(name)
+      if index is not None:
+        return index
+
+      # rebuilt from the stored chunks once per process, e.g. after reopening a persistent db
+      index = BM25Index()
+      stored = self.stored_report_chunks(ticker)
+      index.add(stored["ids"], stored["documents"], stored["metadatas"])
+      with self._partitions_lock:
+        return self._bm25_indexes.setdefault(name, index)
+
+    def partition_write_lock(self, ticker: str) -> threading.Lock:
+      """Held by the one writer of a partition from reading its manifest until the catalog is refreshed."""
+      with self._partitions_lock:
+        return self._write_locks.setdefault(report_partition_name(ticker), threading.Lock())
+
     def get_existing_reports(self):
-      results = self.report_db.get(include=["metadatas"])
-      uniques = {m.get('ticker') for m in results["metadatas"] if m}
-      return uniques
+      # served from the catalog, the collections are not touched
+      return self.catalog.tickers()
+
+    def get_report_details(self, ticker=None):
+      if ticker is None:
+        return self.catalog.entries()
+      return self.catalog.get(report_partition_name(ticker))
+
+    def record_stored_partition(self, name: str, ticker, stored: dict, ingested_at=None):
+      if not stored["ids"]:
+        self.catalog.remove(name)
+        return
+      dates = {(m or {}).get("date") for m in stored["metadatas"] if (m or {}).get("date")}
+      # documents are only passed for chunks stored before their size was kept in the metadata
+      documents = stored.get("documents") or [""] * len(stored["ids"])
+      size_bytes = sum((m or {}).get("size_bytes", len(document.encode("utf-8")))
+                       for m, document in zip(stored["metadatas"], documents))
+      self.catalog.record(name, ticker or name[len(REPORT_PARTITION_PREFIX):], list(dates), len(stored["ids"]),
+                          size_bytes, ingested_at)
+
+    def refresh_catalog(self, ticker: str):
+      # read back from the partition after an upload, so the entry lists exactly the dates still stored
+      self.record_stored_partition(report_partition_name(ticker), ticker, self.stored_report_chunks(ticker),
+                                   ingested_at=datetime.utcnow())
 
     def get_rephrased_retriever(self, type=None, ticker=None):
       template = PromptTemplate(
           template=prompt_manager.get_prompt('rephrase_question_for_similarity_search'),
           input_variables=["question"])
-      base_retriever = self.report_db.as_retriever(search_type="similarity", search_kwargs={"k": 5, "filter": {"ticker": ticker}})
+      base_retriever = self.report_vector_retriever(ticker, 5)
 
       retriever = RePhraseQueryRetriever.from_llm(retriever=base_retriever, llm = get_llm(), prompt=template)
 
       return retriever
 
-    def get_base_retriever(self, type=None, ticker=None):
-      base_retriever = self.report_db.as_retriever(search_type="similarity", search_kwargs={"k": 4, "filter": {"ticker": ticker}})
+    def get_base_retriever(self, type=None, ticker=None, k=4, rerank=RERANK_ENABLED):
+      # with reranking the base retriever returns the wide candidate set and the cross-encoder keeps k
+      candidates_k = max(k, RERANK_CANDIDATES) if rerank else k
+      if type == "hybrid":
+        vector_retriever = self.report_vector_retriever(ticker, max(candidates_k, REPORT_HYBRID_FETCH_K))
+        base_retriever = HybridReportRetriever(vector_retriever=vector_retriever, bm25_index=self.bm25_index(ticker),
+                                               k=candidates_k, fetch_k=max(candidates_k, REPORT_HYBRID_FETCH_K))
+      else:
+        base_retriever = self.report_vector_retriever(ticker, candidates_k)
+
+      if rerank:
+        return RerankingRetriever(base_retriever=base_retriever, reranker=get_reranker(), k=k)
       return base_retriever
 
+    def search_many(self, ticker_or_tickers, queries, k=4, type=None, rerank=RERANK_ENABLED, query_embeddings=None):
+      """Ranked chunks for every query, embedded in one batch and searched with one vectorized query per partition.
+
+      With several tickers the partitions are searched with the same embeddings and merged by distance.
+      With rerank the candidates of all queries are scored by the cross-encoder in one batch.
+      Precomputed query_embeddings skip the embedding step.
+      """
+      tickers = [ticker_or_tickers] if isinstance(ticker_or_tickers, str) else list(ticker_or_tickers)
+      queries = list(queries)
+      if not queries:
+        return []
+      candidates_k = max(k, RERANK_CANDIDATES) if rerank else k
+      fetch_k = max(candidates_k, REPORT_HYBRID_FETCH_K) if type == "hybrid" else candidates_k
+      if query_embeddings is None:
+        query_embeddings = self.transformer_fn.embed_documents(queries)
+
+      hits = [[] for _ in queries]
+      with RETRIEVAL_SECONDS.labels(collection="report_batch").time():
+        for ticker in tickers:
+          for query_hits, partition_hits in zip(hits, self.search_partition(ticker, query_embeddings, fetch_k)):
+            query_hits.extend(partition_hits)
+      vector_results = [[document for _, document in sorted(query_hits, key=lambda hit: hit[0])[:fetch_k]] for query_hits in hits]
+
+      results = vector_results
+      if type == "hybrid":
+        results = []
+        with RETRIEVAL_SECONDS.labels(collection="report_bm25").time():
+          for query, vector_documents in zip(queries, vector_results):
+            keyword_lists = [[document for document, _ in self.bm25_index(ticker).search(query, fetch_k)] for ticker in tickers]
+            results.append(reciprocal_rank_fusion(keyword_lists + [vector_documents], candidates_k))
+
+      if rerank:
+        return get_reranker().rerank_many(queries, results, k)
+      return results
+
     def search_report_context(self, ticker, query):
       template = PromptTemplate(
           template=prompt_manager.get_prompt('rephrase_question_for_similarity_search'),
           input_variables=["question"])
-      base_retriever = self.report_db.as_retriever(search_type="similarity", search_kwargs={"k": 5}, filter={"ticker": ticker})
+      base_retriever = self.report_vector_retriever(ticker, 5)
       retriever = RePhraseQueryRetriever.from_llm(retriever=base_retriever, llm = get_llm(), prompt=template)
       results = retriever.invoke(query)
       return results
 
-    def add_new_report(self, documents, metadata):
-      self.report_db.add_texts(documents,
-                               metadatas=[{"ticker": metadata["ticker"]} for _ in range(len(documents))],
-                               ids=[str(metadata["ticker"] + "_" + metadata["date"] + str(i)) for i in range(len(documents))]
-                               )
-
     def store_image_itself(self, image_path: str, metadata: dict = None):
       id = self.image_db.add_images(
           uris = [image_path],
@@ -139,44 +394,359 @@ class InMemoryFinReportVectorDBReport(FinReportVectorDB):
       return logger.info(f"Image saved with id = {id}")
 
     def store_image_embedding(self, file_bytes, uri:str, metadata: dict = None):
-      id_doc = str(uuid4())
-
-      image_embeddings = None
-
-      with tempfile.NamedTemporaryFile(suffix=".jpg") as tmp:
-        tmp.write(file_bytes)
-        tmp.flush()
-        image_embeddings = clip_embedder.embed_image([tmp.name])[0]
-
-      # image_embeddings = clip_embedder.embed_image([image_path])
-      id = self.embed_image_db.add(
-          ids=[id_doc],
-          embeddings=image_embeddings,
-          # documents=[image_path],          # just store the path, not the image bytes
-          metadatas=[metadata],
-          uris=[uri]
-      )
-      return logger.info(f"Image saved with id = {id}")
+      return self.store_image_embeddings([file_bytes], [uri], [metadata])[0]
+
+    def store_image_embeddings(self, images: list, uris: list, metadatas: list):
+      # images are bytes or decoded PIL images, embedded and written one CLIP batch at a time
+      ids = []
+      for start in range(0, len(images), CLIP_BATCH_SIZE):
+        batch_ids = [str(uuid4()) for _ in images[start:start + CLIP_BATCH_SIZE]]
+        image_embeddings = get_clip_embedder().embed_images(images[start:start + CLIP_BATCH_SIZE])
+
+        self.embed_image_db.add(
+            ids=batch_ids,
+            embeddings=image_embeddings,
+            # documents=[image_path],          # just store the path, not the image bytes
+            metadatas=metadatas[start:start + CLIP_BATCH_SIZE],
+            uris=uris[start:start + CLIP_BATCH_SIZE]
+        )
+        ids.extend(batch_ids)
+        logger.info(f"Images saved: {len(ids)}/{len(images)}")
+      return ids
 
     def search_image(self, query: str, top_k=3):
-      results = self.image_db.search(query=query, search_type="similarity")
+      with RETRIEVAL_SECONDS.labels(collection="image").time():
+        results = self.image_db.search(query=query, search_type="similarity")
       return logger.info(f"Search image by query {query} result {results}")
 
     def search_image_embedd(self, query: str, top_k=1):
-      embedded_query = clip_embedder.embed_documents([query])[0]
-      results = self.embed_image_db.query(
-          query_embeddings=[embedded_query],
-          n_results=top_k
-      )
+      embedded_query = get_clip_embedder().embed_query(query)
+      with RETRIEVAL_SECONDS.labels(collection="embed_image").time():
+        results = self.embed_image_db.query(
+            query_embeddings=[embedded_query],
+            n_results=top_k
+        )
       logger.info(f"Search image by query {query} result {results}")
       return results
 
-    def delete_report(self, ticker):
-      self.report_db.delete(where={"ticker": ticker})
+class InMemoryFinReportVectorDBReport(PartitionedFinReportVectorDB):
+    """Report partitions kept as one chroma collection per ticker."""
+
+    def __init__(self, client=None, catalog=None):
+        # all collections share one chroma client, ephemeral unless a subclass passes a persistent one
+        super().__init__(client=client or Client(), catalog=catalog or ReportCatalog())
+        # one collection per ticker, queries never filter over other companies' chunks
+        self._report_dbs = {}
+        self._partition_hnsw = {}
+
+    def report_db(self, ticker: str) -> Chroma:
+      name = report_partition_name(ticker)
+      with self._partitions_lock:
+        report_db = self._report_dbs.get(name)
+        if report_db is None:
+          hnsw = self._partition_hnsw.get(name, REPORT_HNSW_DEFAULTS)
+          report_db = Chroma(
+              client=self.client,
+              collection_name=name,
+              embedding_function=self.transformer_fn,
+              collection_metadata={"ticker": ticker, **hnsw_metadata(hnsw)})
+          self._report_dbs[name] = report_db
+        return report_db
+
+    def set_partition_hnsw(self, ticker: str, hnsw: dict):
+      """HNSW parameters (M, construction_ef, search_ef) for the ticker's partition, used when it is next created."""
+      with self._partitions_lock:
+        self._partition_hnsw[report_partition_name(ticker)] = {**REPORT_HNSW_DEFAULTS, **hnsw}
+
+    def stored_report_chunks(self, ticker: str) -> dict:
+      return self.report_db(ticker).get(include=["documents", "metadatas"])
+
+    def report_vector_retriever(self, ticker: str, k: int) -> BaseRetriever:
+      return timed_retriever(self.report_db(ticker), "report", search_type="similarity", search_kwargs={"k": k})
+
+    def search_partition(self, ticker: str, query_embeddings, k: int):
+      """(distance, document) hits of every query embedding in the ticker's partition, one chroma query for all."""
+      collection = self.report_db(ticker)._collection
+      count = collection.count()
+      if count == 0:
+        return [[] for _ in query_embeddings]
+      result = collection.query(query_embeddings=query_embeddings, n_results=min(k, count),
+                                include=["documents", "metadatas", "distances"])
+      return [
+        [(distance, Document(page_content=document, metadata=doc_metadata or {}, id=doc_id))
+         for doc_id, document, doc_metadata, distance in zip(result["ids"][i], result["documents"][i],
+                                                              result["metadatas"][i], result["distances"][i])]
+        for i in range(len(query_embeddings))
+      ]
+
+    def report_partitions(self):
+      names = [c if isinstance(c, str) else c.name for c in self.client.list_collections()]
+      return [name for name in names if name.startswith(REPORT_PARTITION_PREFIX)]
+
+    def partition_count(self, name: str) -> int:
+      return self.client.get_collection(name).count()
+
+    def rebuild_catalog(self):
+      # one pass over the stored metadata, entries of partitions gone from the store are dropped
+      partitions = self.report_partitions()
+      for name in partitions:
+        collection = self.client.get_collection(name)
+        stored = collection.get(include=["metadatas"])
+        if any("size_bytes" not in (m or {}) for m in stored["metadatas"]):
+          stored = collection.get(include=["documents", "metadatas"])
+        self.record_stored_partition(name, (collection.metadata or {}).get("ticker"), stored)
+      self.catalog.retain(partitions)
+      logger.info(f"Report catalog rebuilt: {len(self.catalog.tickers())} tickers")
+
+    def report_manifest(self, ticker: str, date: str) -> dict:
+      """Chunk ids of the ticker's report of the given date, mapped to the metadata they were stored with."""
+      stored = self.report_db(ticker).get(where={"date": date}, include=["metadatas"])
+      return {doc_id: doc_metadata or {} for doc_id, doc_metadata in zip(stored["ids"], stored["metadatas"])}
+
+    def add_new_report(self, documents, metadata, progress=None):
+      """Upserts the ticker's report of metadata["date"], an upload of the same date replaces the previous version.
+
+      Reports of other dates stay stored next to it. Chunk ids hash the date and the text, so only
+      chunks missing from the report's manifest are embedded and unchanged chunks only get their metadata
+      updated. Documents are consumed batch by batch, a streamed report is never held in memory, and
+      chunks gone from the amended version are deleted at the end.
+      """
+      # the manifest is read before the writes, a second writer of the partition would interleave its deletes
+      with self.partition_write_lock(metadata["ticker"]):
+        report_db = self.report_db(metadata["ticker"])
+        bm25_index = self.bm25_index(metadata["ticker"])
+        manifest = self.report_manifest(metadata["ticker"], metadata["date"])
+
+        seen_ids = set()
+        added = kept = 0
+        for batch in iter_report_chunk_batches(documents, metadata["date"]):
+          new, updated = [], []
+          for doc_id, text, extra_metadata in batch:
+            if doc_id in seen_ids:
+              continue
+            seen_ids.add(doc_id)
+            chunk_metadata = {**extra_metadata, "ticker": metadata["ticker"], "date": metadata["date"]}
+            if doc_id not in manifest:
+              new.append((doc_id, text, chunk_metadata))
+            else:
+              kept += 1
+              # chunks carried over from the previous version are never re-embedded
+              if manifest[doc_id] != chunk_metadata:
+                updated.append((doc_id, text, chunk_metadata))
+
+          if updated:
+            batch_ids, batch_texts, batch_metadatas = (list(column) for column in zip(*updated))
+            report_db._collection.update(ids=batch_ids, metadatas=batch_metadatas)
+            bm25_index.add(batch_ids, batch_texts, batch_metadatas)
+          if new:
+            batch_ids, batch_texts, batch_metadatas = (list(column) for column in zip(*new))
+            report_db.add_texts(batch_texts, metadatas=batch_metadatas, ids=batch_ids)
+            bm25_index.add(batch_ids, batch_texts, batch_metadatas)
+            added += len(new)
+          if progress:
+            progress(added + kept)
+
+        removed_ids = [doc_id for doc_id in manifest if doc_id not in seen_ids]
+        if removed_ids:
+          report_db.delete(ids=removed_ids)
+          bm25_index.remove(removed_ids)
+
+        self.refresh_catalog(metadata["ticker"])
+      logger.info(f"Report {metadata['ticker']} {metadata['date']} upserted: {added} chunks embedded, "
+                  f"{kept} kept, {len(removed_ids)} removed")
+      return {"added": added, "kept": kept, "removed": len(removed_ids)}
 
-      collection = self.report_db._collection
-      logger.info("Total records:", collection.count())
+    def delete_report(self, ticker):
+      # dropping the partition frees its whole index instead of a filtered delete
+      name = report_partition_name(ticker)
+      with self.partition_write_lock(ticker):
+        with self._partitions_lock:
+          self._report_dbs.pop(name, None)
+          self._bm25_indexes.pop(name, None)
+          if name in self.report_partitions():
+            self.client.delete_collection(name)
+        self.catalog.remove(name)
+      logger.info(f"Report partition {name} dropped")
+
+
+class PersistentFinReportVectorDBReport(InMemoryFinReportVectorDBReport):
+    """Same collections as the in-memory db, kept on disk under VECTOR_DB_PATH so reports survive restarts.
+
+    Routing examples are upserted with fixed ids on every start, reports and images are reopened as they are.
+    """
+
+    def __init__(self, path: str = VECTOR_DB_PATH):
+        self.path = path
+        catalog = ReportCatalog(path=os.path.join(path, "report_catalog.json"))
+        super().__init__(client=PersistentClient(path=path), catalog=catalog)
+        self.migrate_shared_report_collection()
+        self.open_catalog()
+        logger.info(f"Persistent vector db opened at {path}: {len(self.report_partitions())} report partitions, "
+                    f"{self.embed_image_db.count()} images")
+
+    def migrate_shared_report_collection(self):
+      # stores written before partitioning kept every ticker in one "report" collection
+      names = [c if isinstance(c, str) else c.name for c in self.client.list_collections()]
+      if "report" not in names:
+        return
+
+      legacy = self.client.get_collection("report")
+      data = legacy.get(include=["documents", "metadatas", "embeddings"])
+      by_ticker = {}
+      for doc_id, document, doc_metadata, embedding in zip(data["ids"], data["documents"], data["metadatas"], data["embeddings"]):
+        ticker = (doc_metadata or {}).get("ticker")
+        if ticker:
+          by_ticker.setdefault(ticker, []).append((doc_id, document, doc_metadata, embedding))
+
+      for ticker, rows in by_ticker.items():
+        collection = self.report_db(ticker)._collection
+        # embeddings are copied, nothing is re-embedded
+        for start in range(0, len(rows), INGESTION_EMBED_BATCH_SIZE):
+          batch = rows[start:start + INGESTION_EMBED_BATCH_SIZE]
+          collection.upsert(ids=[r[0] for r in batch], documents=[r[1] for r in batch],
+                            metadatas=[r[2] for r in batch], embeddings=[r[3] for r in batch])
+
+      self.client.delete_collection("report")
+      logger.info(f"Migrated {len(data['ids'])} chunks of {len(by_ticker)} tickers from the shared report collection")
+
+class MmapFinReportVectorDBReport(PartitionedFinReportVectorDB):
+    """Reports kept as memory-mapped numpy partitions under MMAP_VECTOR_DB_PATH and searched by brute force.
+
+    A 10-K is a few thousand chunks, for that size one matrix product over a contiguous matrix beats
+    an HNSW lookup plus sqlite. Routing examples and images stay in a persistent chroma store next to it.
+    """
+
+    def __init__(self, path: str = MMAP_VECTOR_DB_PATH, dtype: str = MMAP_VECTOR_DTYPE):
+        self.path = path
+        self.dtype = dtype
+        self._partitions = {}
+        os.makedirs(path, exist_ok=True)
+        catalog = ReportCatalog(path=os.path.join(path, "report_catalog.json"))
+        super().__init__(client=PersistentClient(path=os.path.join(path, "chroma")), catalog=catalog)
+
+        recover_interrupted_swaps(path)
+        self.open_catalog()
+        # partitions are opened on their first use, nothing is mapped until then
+        logger.info(f"Mmap vector db opened at {path}: {len(self.report_partitions())} report partitions")
+
+    def partition_by_name(self, name: str) -> MmapReportPartition:
+      with self._partitions_lock:
+        partition = self._partitions.get(name)
+        if partition is None:
+          partition = MmapReportPartition(os.path.join(self.path, name), dtype=self.dtype)
+          self._partitions[name] = partition
+        return partition
+
+    def partition(self, ticker: str) -> MmapReportPartition:
+      return self.partition_by_name(report_partition_name(ticker))
+
+    def report_partitions(self):
+      # partition names never contain dots, the .tmp and .old directories of an interrupted write are skipped
+      return [name for name in os.listdir(self.path)
+              if name.startswith(REPORT_PARTITION_PREFIX) and "." not in name and os.path.isdir(os.path.join(self.path, name))]
+
+    def partition_count(self, name: str) -> int:
+      # reads the header of the mapped matrix only
+      return len(self.partition_by_name(name))
+
+    def rebuild_catalog(self):
+      partitions = self.report_partitions()
+      for name in partitions:
+        stored = self.partition_by_name(name).get()
+        ticker = (stored["metadatas"][0] or {}).get("ticker") if stored["metadatas"] else None
+        self.record_stored_partition(name, ticker, stored)
+      self.catalog.retain(partitions)
+      logger.info(f"Report catalog rebuilt: {len(self.catalog.tickers())} tickers")
+
+    def stored_report_chunks(self, ticker: str) -> dict:
+      return self.partition(ticker).get()
+
+    def report_vector_retriever(self, ticker: str, k: int) -> BaseRetriever:
+      return MmapReportRetriever(partition=self.partition(ticker), embeddings=self.transformer_fn, k=k)
+
+    def search_partition(self, ticker: str, query_embeddings, k: int):
+      return self.partition(ticker).search(normalize(query_embeddings), k)
+
+    def report_manifest(self, ticker: str, date: str) -> dict:
+      stored = self.partition(ticker).get()
+      return {doc_id: doc_metadata or {} for doc_id, doc_metadata in zip(stored["ids"], stored["metadatas"])
+              if (doc_metadata or {}).get("date") == date}
+
+    def add_new_report(self, documents, metadata, progress=None):
+      """Same content-hashed upsert as the chroma backends, the partition files are rewritten once at the end.
+
+      Rows of the ticker's reports of other dates are carried into the new files unchanged. Vectors are
+      gathered batch by batch in the storage dtype, the texts and the new matrix are the only part of
+      the report held until the write.
+      """
+      # the partition is rewritten from a snapshot of it, a second writer would drop the first one's rows
+      with self.partition_write_lock(metadata["ticker"]):
+        partition = self.partition(metadata["ticker"])
+        bm25_index = self.bm25_index(metadata["ticker"])
+        manifest = self.report_manifest(metadata["ticker"], metadata["date"])
+
+        stored = partition.get()
+        other_rows = [(doc_id, text, doc_metadata) for doc_id, text, doc_metadata
+                      in zip(stored["ids"], stored["documents"], stored["metadatas"]) if doc_id not in manifest]
+        ids = [doc_id for doc_id, _, _ in other_rows]
+        texts = [text for _, text, _ in other_rows]
+        metadatas = [doc_metadata for _, _, doc_metadata in other_rows]
+        vectors = [partition.vectors(ids).astype(partition.dtype)] if ids else []
+        del stored, other_rows
+
+        seen_ids = set()
+        added = kept = 0
+        for batch in iter_report_chunk_batches(documents, metadata["date"]):
+          new, carried, updated = [], [], []
+          for doc_id, text, extra_metadata in batch:
+            if doc_id in seen_ids:
+              continue
+            seen_ids.add(doc_id)
+            chunk_metadata = {**extra_metadata, "ticker": metadata["ticker"], "date": metadata["date"]}
+            if doc_id not in manifest:
+              new.append((doc_id, text, chunk_metadata))
+            else:
+              carried.append((doc_id, text, chunk_metadata))
+              if manifest[doc_id] != chunk_metadata:
+                updated.append((doc_id, text, chunk_metadata))
+
+          if carried:
+            vectors.append(partition.vectors([doc_id for doc_id, _, _ in carried]).astype(partition.dtype))
+          if new:
+            vectors.append(normalize(self.transformer_fn.embed_documents([text for _, text, _ in new])).astype(partition.dtype))
+          for doc_id, text, chunk_metadata in carried + new:
+            ids.append(doc_id)
+            texts.append(text)
+            metadatas.append(chunk_metadata)
+          if new or updated:
+            bm25_index.add(*(list(column) for column in zip(*(new + updated))))
+          added += len(new)
+          kept += len(carried)
+          if progress:
+            progress(added + kept)
+
+        if ids:
+          partition.write(ids, texts, metadatas, np.vstack(vectors))
+        else:
+          partition.drop()
+        removed_ids = [doc_id for doc_id in manifest if doc_id not in seen_ids]
+        bm25_index.remove(removed_ids)
+
+        self.refresh_catalog(metadata["ticker"])
+      logger.info(f"Report {metadata['ticker']} {metadata['date']} upserted: {added} chunks embedded, "
+                  f"{kept} kept, {len(removed_ids)} removed")
+      return {"added": added, "kept": kept, "removed": len(removed_ids)}
 
+    def delete_report(self, ticker):
+      name = report_partition_name(ticker)
+      with self.partition_write_lock(ticker):
+        partition = self.partition_by_name(name)
+        with self._partitions_lock:
+          self._partitions.pop(name, None)
+          self._bm25_indexes.pop(name, None)
+        partition.drop()
+        self.catalog.remove(name)
+      logger.info(f"Report partition {name} dropped")
 
 class VectorDBResolver:
   _instance = None
@@ -186,17 +756,26 @@ class VectorDBResolver:
 
   def resolve_db_source(self):
     if VectorDBResolver._instance is None:
+      start_time = time.perf_counter()
       if self.source == 'inmemory':
         VectorDBResolver._instance = InMemoryFinReportVectorDBReport()
+      elif self.source == 'persistent':
+        VectorDBResolver._instance = PersistentFinReportVectorDBReport()
+      elif self.source == 'mmap':
+        VectorDBResolver._instance = MmapFinReportVectorDBReport()
       else:
         raise Exception("No DB resolver found")
+      open_seconds = time.perf_counter() - start_time
+      VECTOR_DB_OPEN_SECONDS.labels(source=self.source).set(open_seconds)
+      logger.info(f"Vector db '{self.source}' opened in {open_seconds:.2f}s")
     return VectorDBResolver._instance
 
-resolver = VectorDBResolver("inmemory")
-db_client = resolver.resolve_db_source()
+resolver = VectorDBResolver(VECTOR_DB_SOURCE)
+get_db_client = component_registry.register("vector_db", resolver.resolve_db_source)
 
 
 if __name__ == "__main__":
+  db_client = get_db_client()
   # db_client.store_image_itself("/Users/ibahr/personal/dnd/dnd/characters/img/cover.jpg", {"description": "Sample Image"})
   # db_client.search_image("a cover image with fantasy art", top_k=2)
 
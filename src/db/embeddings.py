@@ -1,32 +1,122 @@
-from transformers import CLIPProcessor, CLIPModel
+import io
+import os
+import threading
+import time
+from typing import List, Union
+
+import open_clip
 import torch
+from langchain_core.embeddings import Embeddings
 from PIL import Image
-import chromadb
-
-# Load model + processor
-model = CLIPModel.from_pretrained("openai/clip-vit-base-patch32")
-processor = CLIPProcessor.from_pretrained("openai/clip-vit-base-patch32")
-
-
-def embed_image(image: Image.Image):
-  inputs = processor(images=image, return_tensors="pt")
-  with torch.no_grad():
-    image_features = model.get_image_features(**inputs)
-  image_features /= image_features.norm(p=2, dim=-1, keepdim=True)
-  return image_features[0].tolist()
-
-def embed_text(text: str):
-  inputs = processor(text=[text], return_tensors="pt", padding=True)
-  with torch.no_grad():
-    text_features = model.get_text_features(**inputs)
-  text_features /= text_features.norm(p=2, dim=-1, keepdim=True)
-  return text_features[0].tolist()
-
-
-def clip_transformer_embedding(image: Image.Image = None, text: str = None):
-  if image:
-    return embed_image(image)
-  elif text:
-    return embed_text(text)
-  else:
-    raise ValueError("Either image or text must be provided for embedding.")
+
+from src.util.env_property import CLIP_MODEL_NAME, CLIP_CHECKPOINT, \
+  CLIP_BACKEND, CLIP_BATCH_SIZE, CLIP_ONNX_PATH
+from src.util.logger import logger
+from src.util.metrics import metrics
+
+CLIP_IMAGES_EMBEDDED = metrics.counter("clip_images_embedded_total", "Images embedded by the shared CLIP model", ["backend"])
+CLIP_IMAGE_BATCH_SECONDS = metrics.histogram("clip_image_batch_seconds", "Time to embed one batch of images", ["backend"])
+CLIP_IMAGES_PER_SECOND = metrics.gauge("clip_images_per_second", "Image embedding throughput of the last batch", ["backend"])
+
+ImageInput = Union[str, bytes, Image.Image]
+
+
+class ClipEmbeddingProvider(Embeddings):
+  """The one CLIP model of the process, shared by every image and image-text search.
+
+  backend:
+    torch - fp32 weights, same numbers as the OpenCLIP embeddings used before
+    int8  - dynamic int8 quantization of the Linear layers, smaller and faster on CPU
+    onnx  - image tower exported once to ONNX and run with onnxruntime, text stays on torch
+  """
+
+  def __init__(self, model_name: str = CLIP_MODEL_NAME, checkpoint: str = CLIP_CHECKPOINT,
+      backend: str = CLIP_BACKEND, batch_size: int = CLIP_BATCH_SIZE, onnx_path: str = CLIP_ONNX_PATH):
+    self.model_name = model_name
+    self.checkpoint = checkpoint
+    self.backend = backend
+    self.batch_size = batch_size
+
+    model, _, self.preprocess = open_clip.create_model_and_transforms(model_name, pretrained=checkpoint)
+    model.eval()
+    if backend == "int8":
+      model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    self.model = model
+    self.tokenizer = open_clip.get_tokenizer(model_name)
+
+    self._onnx_session = self._load_onnx_session(onnx_path) if backend == "onnx" else None
+    # torch modules are not safe to share between threads that run inference concurrently
+    self._lock = threading.Lock()
+    logger.info(f"CLIP {model_name} ({checkpoint}) loaded with backend {backend}")
+
+  def _load_onnx_session(self, onnx_path: str):
+    try:
+      # torch.onnx.export needs onnx, the session needs onnxruntime
+      import onnx  # noqa: F401
+      import onnxruntime
+    except ImportError as e:
+      raise ImportError(f"CLIP_BACKEND=onnx needs the onnx and onnxruntime packages ({e}), "
+                        f"install them or use CLIP_BACKEND=torch / int8") from e
+
+    if not os.path.exists(onnx_path):
+      directory = os.path.dirname(onnx_path)
+      if directory:
+        os.makedirs(directory, exist_ok=True)
+      image_size = self.model.visual.image_size
+      if isinstance(image_size, int):
+        image_size = (image_size, image_size)
+      dummy = torch.randn(1, 3, *image_size)
+      logger.info(f"Exporting CLIP image encoder to {onnx_path}")
+      torch.onnx.export(self.model.visual, dummy, onnx_path,
+                        input_names=["pixel_values"], output_names=["image_embeds"],
+                        dynamic_axes={"pixel_values": {0: "batch"}, "image_embeds": {0: "batch"}},
+                        opset_version=17)
+
+    return onnxruntime.InferenceSession(onnx_path, providers=["CPUExecutionProvider"])
+
+  @staticmethod
+  def _to_image(image: ImageInput) -> Image.Image:
+    if isinstance(image, Image.Image):
+      return image.convert("RGB")
+    if isinstance(image, bytes):
+      return Image.open(io.BytesIO(image)).convert("RGB")
+    return Image.open(image).convert("RGB")
+
+  def _encode_image_batch(self, pixel_values: torch.Tensor) -> torch.Tensor:
+    if self._onnx_session is not None:
+      output = self._onnx_session.run(None, {"pixel_values": pixel_values.numpy()})[0]
+      return torch.from_numpy(output)
+    with self._lock, torch.no_grad():
+      return self.model.encode_image(pixel_values)
+
+  def embed_images(self, images: List[ImageInput]) -> List[List[float]]:
+    """Embeds paths, raw bytes or PIL images in batches of batch_size, normalized like OpenCLIP."""
+    embeddings = []
+    for start in range(0, len(images), self.batch_size):
+      batch = images[start:start + self.batch_size]
+      start_time = time.perf_counter()
+
+      pixel_values = torch.stack([self.preprocess(self._to_image(image)) for image in batch])
+      features = self._encode_image_batch(pixel_values)
+      features = features / features.norm(p=2, dim=-1, keepdim=True)
+      embeddings.extend(features.tolist())
+
+      elapsed = time.perf_counter() - start_time
+      CLIP_IMAGES_EMBEDDED.labels(backend=self.backend).inc(len(batch))
+      CLIP_IMAGE_BATCH_SECONDS.labels(backend=self.backend).observe(elapsed)
+      if elapsed > 0:
+        CLIP_IMAGES_PER_SECOND.labels(backend=self.backend).set(len(batch) / elapsed)
+    return embeddings
+
+  def embed_image(self, uris: List[str]) -> List[List[float]]:
+    # name used by chroma for image collections
+    return self.embed_images(uris)
+
+  def embed_documents(self, texts: List[str]) -> List[List[float]]:
+    with self._lock, torch.no_grad():
+      features = self.model.encode_text(self.tokenizer(texts))
+    features = features / features.norm(p=2, dim=-1, keepdim=True)
+    return features.tolist()
+
+  def embed_query(self, text: str) -> List[float]:
+    return self.embed_documents([text])[0]
@@ -0,0 +1,219 @@
+import json
+import os
+import shutil
+import threading
+from typing import List
+
+import numpy as np
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.retrievers import BaseRetriever
+
+from src.util.metrics import metrics
+
+EMBEDDINGS_FILE = "embeddings.npy"
+CHUNKS_FILE = "chunks.jsonl"
+OFFSETS_FILE = "offsets.npy"
+CURRENT_FILE = "CURRENT"
+
+RETRIEVAL_SECONDS = metrics.histogram("retrieval_seconds", "Vector search latency per collection", ["collection"])
+
+
+def normalize(vectors) -> np.ndarray:
+  vectors = np.asarray(vectors, dtype=np.float32)
+  if vectors.ndim == 1:
+    vectors = vectors[None, :]
+  norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+  return vectors / np.where(norms == 0, 1, norms)
+
+
+def recover_interrupted_swaps(root: str):
+  """Moves back partitions an older version of write() left as <name>.old when it crashed between its two renames."""
+  for entry in os.listdir(root):
+    if not entry.endswith(".old"):
+      continue
+    live_path = os.path.join(root, entry[:-len(".old")])
+    if not os.path.exists(live_path):
+      os.replace(os.path.join(root, entry), live_path)
+
+
+def _save_synced(path: str, write):
+  with open(path, "wb") as f:
+    write(f)
+    f.flush()
+    os.fsync(f.fileno())
+
+
+class PartitionVersion:
+  """One written version of a partition, the matrix, the jsonl sidecar and its line offsets are all memory-mapped.
+
+  Nothing is parsed on open, a chunk's line is decoded when it is read.
+  """
+
+  def __init__(self, path: str):
+    self.path = path
+    self.matrix = np.load(os.path.join(path, EMBEDDINGS_FILE), mmap_mode="r")
+    chunks_path = os.path.join(path, CHUNKS_FILE)
+    self.chunks = np.memmap(chunks_path, dtype=np.uint8, mode="r") if os.path.getsize(chunks_path) \
+      else np.zeros(0, dtype=np.uint8)
+    offsets_path = os.path.join(path, OFFSETS_FILE)
+    if os.path.exists(offsets_path):
+      self.offsets = np.load(offsets_path, mmap_mode="r")
+    else:
+      # partitions written before the offsets file, the line ends are found once per process
+      self.offsets = np.concatenate([[0], np.flatnonzero(self.chunks == ord("\n")) + 1])
+    if self.matrix.shape[0] != len(self.offsets) - 1:
+      raise ValueError(f"Partition {path} is inconsistent: {self.matrix.shape[0]} vectors for {len(self.offsets) - 1} chunks")
+    self._rows_by_id = None
+
+  def __len__(self):
+    return self.matrix.shape[0]
+
+  def row(self, i: int) -> dict:
+    return json.loads(self.chunks[self.offsets[i]:self.offsets[i + 1]].tobytes())
+
+  def rows(self):
+    for i in range(len(self)):
+      yield self.row(i)
+
+  def rows_by_id(self) -> dict:
+    # only ingestion looks rows up by id, the map is built on its first lookup
+    if self._rows_by_id is None:
+      self._rows_by_id = {row["id"]: i for i, row in enumerate(self.rows())}
+    return self._rows_by_id
+
+
+class MmapReportPartition:
+  """One ticker's chunks: normalized embeddings in a memory-mapped .npy matrix plus a jsonl sidecar of ids, texts and metadata.
+
+  Row i of the matrix belongs to line i of the sidecar. Every write goes to a new version directory
+  and the CURRENT file is switched to it with one atomic rename, so a crash leaves the previous version
+  current. The partition is opened on first use, readers keep the version they already hold.
+  """
+
+  def __init__(self, path: str, dtype: str = "float16"):
+    self.path = path
+    self.dtype = np.dtype(dtype)
+    self._version = None
+    self._lock = threading.Lock()
+
+  def _current_path(self):
+    pointer = os.path.join(self.path, CURRENT_FILE)
+    if os.path.exists(pointer):
+      with open(pointer, "r", encoding="utf-8") as f:
+        return os.path.join(self.path, f.read().strip())
+    # layout written before versioned directories, the files sit in the partition directory itself
+    if os.path.exists(os.path.join(self.path, EMBEDDINGS_FILE)):
+      return self.path
+    return None
+
+  def version(self):
+    """The current version, opened on the first call, None while nothing is stored."""
+    version = self._version
+    if version is not None:
+      return version
+    with self._lock:
+      if self._version is None:
+        path = self._current_path()
+        self._version = PartitionVersion(path) if path else None
+      return self._version
+
+  def __len__(self):
+    version = self.version()
+    return len(version) if version else 0
+
+  def get(self) -> dict:
+    """Every stored chunk, decoded from the sidecar on each call."""
+    ids, texts, metadatas = [], [], []
+    version = self.version()
+    for row in version.rows() if version else ():
+      ids.append(row["id"])
+      texts.append(row["text"])
+      metadatas.append(row["metadata"])
+    return {"ids": ids, "documents": texts, "metadatas": metadatas}
+
+  def write(self, ids: List[str], texts: List[str], metadatas: List[dict], vectors: np.ndarray):
+    """Replaces the partition with the given rows, vectors must already be normalized."""
+    with self._lock:
+      os.makedirs(self.path, exist_ok=True)
+      current = self._current_path()
+      number = int(os.path.basename(current)[1:]) + 1 if current and current != self.path else 1
+      version_name = f"v{number}"
+      version_path = os.path.join(self.path, version_name)
+      shutil.rmtree(version_path, ignore_errors=True)
+      os.makedirs(version_path)
+
+      _save_synced(os.path.join(version_path, EMBEDDINGS_FILE),
+                   lambda f: np.save(f, np.ascontiguousarray(vectors, dtype=self.dtype)))
+      offsets = [0]
+
+      def write_chunks(f):
+        for doc_id, text, doc_metadata in zip(ids, texts, metadatas):
+          line = (json.dumps({"id": doc_id, "text": text, "metadata": doc_metadata}) + "\n").encode("utf-8")
+          f.write(line)
+          offsets.append(offsets[-1] + len(line))
+
+      _save_synced(os.path.join(version_path, CHUNKS_FILE), write_chunks)
+      _save_synced(os.path.join(version_path, OFFSETS_FILE), lambda f: np.save(f, np.asarray(offsets, dtype=np.int64)))
+
+      # the one atomic step, until the rename the previous version stays current
+      pointer_tmp = os.path.join(self.path, CURRENT_FILE + ".tmp")
+      _save_synced(pointer_tmp, lambda f: f.write(version_name.encode("utf-8")))
+      os.replace(pointer_tmp, os.path.join(self.path, CURRENT_FILE))
+      self._version = PartitionVersion(version_path)
+
+      # older versions, versions of an interrupted write and files of the flat layout
+      for entry in os.listdir(self.path):
+        entry_path = os.path.join(self.path, entry)
+        if entry in (version_name, CURRENT_FILE):
+          continue
+        if os.path.isdir(entry_path):
+          shutil.rmtree(entry_path, ignore_errors=True)
+        elif entry in (EMBEDDINGS_FILE, CHUNKS_FILE, OFFSETS_FILE):
+          os.remove(entry_path)
+
+  def vectors(self, ids: List[str]) -> np.ndarray:
+    """Stored vectors of the given ids as float32 rows."""
+    version = self.version()
+    rows = version.rows_by_id()
+    return np.asarray(version.matrix[[rows[doc_id] for doc_id in ids]], dtype=np.float32)
+
+  def drop(self):
+    with self._lock:
+      shutil.rmtree(self.path, ignore_errors=True)
+      self._version = None
+
+  def search(self, query_vectors: np.ndarray, k: int):
+    """(distance, document) hits per query, cosine distance from one matrix product over the whole partition."""
+    version = self.version()
+    if version is None or len(version) == 0:
+      return [[] for _ in range(len(query_vectors))]
+
+    # float16 rows are upcast by the product, float32 storage multiplies the mapped pages directly
+    similarities = query_vectors @ version.matrix.T
+    k = min(k, len(version))
+    results = []
+    for row in similarities:
+      best = np.argpartition(-row, k - 1)[:k]
+      best = best[np.argsort(-row[best])]
+      hits = []
+      for i in best:
+        chunk = version.row(i)
+        hits.append((1.0 - float(row[i]), Document(page_content=chunk["text"], metadata=chunk["metadata"], id=chunk["id"])))
+      results.append(hits)
+    return results
+
+
+class MmapReportRetriever(BaseRetriever):
+  """Top k chunks of one memory-mapped partition for a single query."""
+
+  partition: MmapReportPartition
+  embeddings: Embeddings
+  k: int = 4
+
+  def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> list[Document]:
+    query_vectors = normalize(self.embeddings.embed_query(query))
+    with RETRIEVAL_SECONDS.labels(collection="report_mmap").time():
+      hits = self.partition.search(query_vectors, self.k)[0]
+    return [document for _, document in hits]
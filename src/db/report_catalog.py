@@ -0,0 +1,97 @@
+import json
+import os
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from src.models.report_catalog import ReportCatalogEntry
+from src.util.logger import logger
+
+
+class ReportCatalog:
+  """Per-ticker summary of the stored reports, refreshed from the partition on every upsert and delete.
+
+  Entries are keyed by report partition, so tickers that differ only in case share one entry.
+  Listing reads a precomputed ticker set instead of the collections. With a path the catalog
+  is written next to the persistent vector db, on start the db checks it against its partitions and
+  rebuilds it only when they differ.
+  """
+
+  def __init__(self, path: Optional[str] = None):
+    self.path = path
+    self._entries: Dict[str, ReportCatalogEntry] = {}
+    self._tickers = frozenset()
+    self._lock = threading.Lock()
+    if path and os.path.exists(path):
+      self._load()
+
+  def _load(self):
+    with open(self.path, "r", encoding="utf-8") as f:
+      data = json.load(f)
+    self._entries = {partition: ReportCatalogEntry(**entry) for partition, entry in data.items()}
+    self._refresh_tickers()
+    logger.info(f"Report catalog loaded from {self.path}: {len(self._entries)} tickers")
+
+  def _save(self):
+    if not self.path:
+      return
+    directory = os.path.dirname(self.path)
+    if directory:
+      os.makedirs(directory, exist_ok=True)
+    # written to a temp file and renamed, so a crash never leaves a half written catalog
+    tmp_path = self.path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+      json.dump({partition: entry.model_dump(mode="json") for partition, entry in self._entries.items()}, f)
+    os.replace(tmp_path, self.path)
+
+  def _refresh_tickers(self):
+    self._tickers = frozenset(entry.ticker for entry in self._entries.values())
+
+  def record(self, partition: str, ticker: str, dates: List[str], chunks: int, size_bytes: int, ingested_at: datetime = None):
+    """Sets the entry to what the partition stores, ingested_at is only passed when a report was just uploaded."""
+    dates = sorted(dates) or ["unknown"]
+    with self._lock:
+      entry = self._entries.get(partition)
+      if entry is None:
+        ingested_at = ingested_at or datetime.utcnow()
+        entry = ReportCatalogEntry(ticker=ticker, latest_date=dates[-1], partition=partition,
+                                   first_ingested_at=ingested_at, last_ingested_at=ingested_at)
+        self._entries[partition] = entry
+      entry.ticker = ticker
+      entry.dates = dates
+      entry.latest_date = dates[-1]
+      entry.chunks = chunks
+      entry.bytes = size_bytes
+      if ingested_at is not None:
+        entry.last_ingested_at = ingested_at
+      self._refresh_tickers()
+      self._save()
+
+  def remove(self, partition: str):
+    with self._lock:
+      if self._entries.pop(partition, None) is not None:
+        self._refresh_tickers()
+        self._save()
+
+  def retain(self, partitions):
+    """Drops entries of partitions that are no longer stored."""
+    partitions = set(partitions)
+    with self._lock:
+      stale = [partition for partition in self._entries if partition not in partitions]
+      for partition in stale:
+        del self._entries[partition]
+      if stale:
+        self._refresh_tickers()
+        self._save()
+
+  def tickers(self) -> frozenset:
+    return self._tickers
+
+  def get(self, partition: str) -> Optional[ReportCatalogEntry]:
+    with self._lock:
+      entry = self._entries.get(partition)
+      return entry.model_copy(deep=True) if entry else None
+
+  def entries(self) -> List[ReportCatalogEntry]:
+    with self._lock:
+      return [entry.model_copy(deep=True) for entry in self._entries.values()]
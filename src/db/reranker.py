@@ -0,0 +1,58 @@
+from typing import List
+
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from src.util.env_property import RERANK_MODEL, RERANK_BATCH_SIZE, \
+  RERANK_MAX_LENGTH
+from src.util.logger import logger
+from src.util.metrics import metrics
+
+RERANK_SECONDS = metrics.histogram("rerank_seconds", "Time to score one batch of query-passage pairs with the cross-encoder", ["model"])
+RERANK_PAIRS = metrics.counter("rerank_pairs_total", "Query-passage pairs scored by the cross-encoder", ["model"])
+
+
+class CrossEncoderReranker:
+  """Small cross-encoder run on CPU that reorders retrieved passages by relevance to the query."""
+
+  def __init__(self, model_name: str = RERANK_MODEL, batch_size: int = RERANK_BATCH_SIZE, max_length: int = RERANK_MAX_LENGTH):
+    from sentence_transformers import CrossEncoder
+
+    self.model_name = model_name
+    self.batch_size = batch_size
+    self.model = CrossEncoder(model_name, device="cpu", max_length=max_length)
+    logger.info(f"Cross-encoder {model_name} loaded for reranking")
+
+  def rerank_many(self, queries: List[str], candidates: List[List[Document]], top_n: int) -> List[List[Document]]:
+    """Scores the pairs of all queries in one batched predict and keeps the top_n passages of each query."""
+    pairs = [(query, document.page_content) for query, documents in zip(queries, candidates) for document in documents]
+    if not pairs:
+      return [[] for _ in queries]
+
+    with RERANK_SECONDS.labels(model=self.model_name).time():
+      scores = self.model.predict(pairs, batch_size=self.batch_size, show_progress_bar=False)
+    RERANK_PAIRS.labels(model=self.model_name).inc(len(pairs))
+
+    results = []
+    offset = 0
+    for documents in candidates:
+      scored = zip(scores[offset:offset + len(documents)], range(len(documents)), documents)
+      results.append([document for _, _, document in sorted(scored, key=lambda item: (-item[0], item[1]))[:top_n]])
+      offset += len(documents)
+    return results
+
+  def rerank(self, query: str, documents: List[Document], top_n: int) -> List[Document]:
+    return self.rerank_many([query], [documents], top_n)[0]
+
+
+class RerankingRetriever(BaseRetriever):
+  """Takes a wide candidate set from the base retriever and keeps the k passages the cross-encoder scores best."""
+
+  base_retriever: BaseRetriever
+  reranker: CrossEncoderReranker
+  k: int = 3
+
+  def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> list[Document]:
+    candidates = self.base_retriever.invoke(query, config={"callbacks": run_manager.get_child()})
+    return self.reranker.rerank(query, candidates, self.k)
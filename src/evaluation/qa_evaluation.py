@@ -1,15 +1,15 @@
 from evaluate import load
 
 from src.service.file_format_service import soup_html_to_text, any_format_to_str
-from src.service.graph.core.subquery_retrieval_graph1 import \
-  run_subquery_search_in_report_full_state
 from src.service.query_report_service import \
-  base_query_report_question_answer_full_state
+  base_query_report_question_answer_full_state_many
 from src.usecase.report_uc import save_text_report
+from src.llm.llm_cache import set_default_namespace
 from src.util.logger import logger
 
 from src.evaluation.test_util import get_qa_test_json
 
+set_default_namespace("evaluation")
 
 with open("/Users/ibahr/Desktop/reports/AAPL.html", "rb") as f:
   pdf_content = f.read()
@@ -31,10 +31,13 @@ answers = []
 questions = []
 references = []
 
-for item_map in test_data:
+# contexts of all questions are retrieved in one batch
+full_states = base_query_report_question_answer_full_state_many(ticker="AAPL", queries=[item_map['question'] for item_map in test_data])
+
+for item_map, full_state in zip(test_data, full_states):
     logger.info(f"Evaluating question: {item_map['question']}")
     # result = run_subquery_search_in_report_full_state(ticker="AAPL", question=item_map['question'])['final_answer']
-    result = base_query_report_question_answer_full_state(ticker="AAPL", query=item_map['question'])['answer']
+    result = full_state['answer']
     # answer = result.get("final_answer", "") if isinstance(result, dict) else str(result)
     answers.append(str(result))
     questions.append(item_map['question'])
@@ -10,11 +10,12 @@ from trulens.core.otel.instrument import instrument
 from trulens.otel.semconv.trace import SpanAttributes
 from pydantic import BaseModel, Field
 
+from src.llm.llm_cache import set_default_namespace
 from src.llm.llm_provider import get_llm
 from src.service.file_format_service import soup_html_to_text
 from src.service.graph.core.subquery_retrieval_graph1 import \
   run_subquery_search_in_report_full_state
-from src.service.query_report_service import base_query_report_question_answer_full_state
+from src.service.query_report_service import base_query_report_question_answer_full_state, search_report_many
 from src.usecase.report_uc import save_text_report
 from src.util.env_property import LLM_SOURCE_JUDGE
 from src.util.prompt_manager import prompt_manager
@@ -24,6 +25,9 @@ import time
 from src.usecase.report_uc import save_report
 from langchain.schema.runnable import RunnableLambda
 
+# identical prompts on every rerun are answered from the disk cache
+set_default_namespace("evaluation")
+
 #DATA PREPARATION
 # with open("/Users/ibahr/Desktop/reports/AAPL.html", "rb") as f:
 #   pdf_content = f.read()
@@ -75,7 +79,7 @@ Model answer: {answer}
 """)
 answer_relevance_prompt = ChatPromptTemplate.from_messages([answer_relevance_criteria_prompt, human_prompt])
 
-llm_aw = get_llm(specific_source=LLM_SOURCE_JUDGE).with_structured_output(EvaluationScore) | RunnableLambda(extract_score)
+llm_aw = get_llm(specific_source=LLM_SOURCE_JUDGE, schema=EvaluationScore) | RunnableLambda(extract_score)
 answer_relevance_criteria_chain = LLMChain(llm=llm_aw, prompt=answer_relevance_prompt, verbose=True)
 
 
@@ -88,7 +92,7 @@ Your groundedness score (0.0 to 1.0):
 """)
 
 groundedness_prompt = ChatPromptTemplate.from_messages([groundedness_criteria_prompt, groundedness_human_prompt])
-llm_g = get_llm(specific_source=LLM_SOURCE_JUDGE).with_structured_output(EvaluationScore) | RunnableLambda(extract_score)
+llm_g = get_llm(specific_source=LLM_SOURCE_JUDGE, schema=EvaluationScore) | RunnableLambda(extract_score)
 groundedness_criteria_chain = LLMChain(llm=llm_g, prompt=groundedness_prompt, verbose=True)
 
 
@@ -100,7 +104,7 @@ Model context: {context}
 """)
 context_relevance_prompt = ChatPromptTemplate.from_messages([context_relevance_criteria_prompt, context_prompt])
 
-llm_cr = get_llm(specific_source=LLM_SOURCE_JUDGE).with_structured_output(EvaluationScore) | RunnableLambda(extract_score)
+llm_cr = get_llm(specific_source=LLM_SOURCE_JUDGE, schema=EvaluationScore) | RunnableLambda(extract_score)
 context_relevance_criteria_chain = LLMChain(llm=llm_cr, prompt=context_relevance_prompt,  verbose=True)
 
 
@@ -155,6 +159,10 @@ class RephraseCircularRagWrapper:
     return "RephraseCircularRag"
 
 class SimpleSearchRagWrapper:
+  def __init__(self, contexts: dict = None):
+    # contexts prefetched by question, questions outside the batch are retrieved on the spot
+    self.contexts = contexts or {}
+
   @instrument(
       span_type=SpanAttributes.SpanType.RECORD_ROOT,
       attributes={
@@ -162,7 +170,7 @@ class SimpleSearchRagWrapper:
       },
   )
   def rag_wrapper(self, query: str) -> dict:
-    out =  base_query_report_question_answer_full_state(ticker="AAPL", query=query)
+    out =  base_query_report_question_answer_full_state(ticker="AAPL", query=query, context=self.contexts.get(query))
     return {"final_answer": out['answer'], "context": out["context"], "question": out['question']}
 
   def get_app_name(self):
@@ -170,7 +178,7 @@ class SimpleSearchRagWrapper:
 
 # RUN TEST
 rephrase_circular_rag_app = RephraseCircularRagWrapper()
-simple_search_rag_app = SimpleSearchRagWrapper()
+simple_search_rag_app = SimpleSearchRagWrapper(dict(zip(test_question_list, search_report_many("AAPL", test_question_list))))
 
 # Feedbacks
 relevance_feedback = (Feedback(custom_relevance, name="ANSWER RELEVANCE").on_input_output())
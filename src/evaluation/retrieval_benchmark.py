@@ -0,0 +1,166 @@
+"""Retrieval benchmark: sweeps backends, chunking, HNSW parameters and k over a fixed report and its QA set.
+
+  python -m src.evaluation.retrieval_benchmark --report /path/AAPL.html --ticker AAPL --qa AAPL_qa.json \\
+      --backends chroma,mmap --chunkers semantic,recursive:300,recursive:1000 --m 16,32 --construction-ef 100,200 \\
+      --search-ef 10,50 --k 1,4,8
+
+HNSW parameters only apply to the chroma backend, the mmap backend is measured once per chunker.
+
+Recall@k counts a question as answered when one of the top k chunks covers at least
+--relevance-threshold of the content words of its reference answer.
+"""
+import argparse
+import itertools
+import json
+import os
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from src.db.bm25_index import tokenize
+from src.db.db import PersistentFinReportVectorDBReport, \
+  MmapFinReportVectorDBReport
+from src.evaluation.test_util import get_qa_test_json
+from src.service.file_format_service import any_format_to_str
+from src.service.split_service import text_to_semantic_splitting, \
+  text_to_recursive_splitting
+from src.util.logger import logger
+
+CONTENT_TYPES = {
+  ".html": "text/html",
+  ".htm": "text/html",
+  ".pdf": "application/pdf",
+  ".txt": "text/plain",
+}
+
+
+def split_report(text: str, chunker: str):
+  if chunker == "semantic":
+    return text_to_semantic_splitting(text)
+  name, _, size = chunker.partition(":")
+  if name == "recursive":
+    chunk_size = int(size or 300)
+    return text_to_recursive_splitting(text, chunk_size=chunk_size, overlap=chunk_size // 5)
+  raise ValueError(f"Unknown chunker {chunker}, expected semantic or recursive:<chunk size>")
+
+
+def reference_coverage(reference: str, chunk: str) -> float:
+  reference_tokens = set(tokenize(reference))
+  if not reference_tokens:
+    return 0.0
+  return len(reference_tokens & set(tokenize(chunk))) / len(reference_tokens)
+
+
+def directory_size_mb(path: str) -> float:
+  size = sum(f.stat().st_size for f in Path(path).rglob("*") if f.is_file())
+  return size / (1024 * 1024)
+
+
+def open_db(backend: str, path: str, ticker: str, hnsw: dict):
+  if backend == "mmap":
+    return MmapFinReportVectorDBReport(path=path)
+  db = PersistentFinReportVectorDBReport(path=path)
+  db.set_partition_hnsw(ticker, hnsw)
+  return db
+
+
+def run_config(backend, chunks, qa, ticker, hnsw, ks, mode, repeats, threshold):
+  # a fresh on-disk db per config. Chroma loads the whole hnsw index and the mmap backend maps the whole matrix,
+  # so the size on disk is the memory footprint of either
+  path = tempfile.mkdtemp(prefix="retrieval_benchmark_")
+  try:
+    db = open_db(backend, path, ticker, hnsw)
+
+    # chunk and query embeddings are cached beforehand, so build time and latency are about the index only
+    db.transformer_fn.embed_documents(chunks)
+    db.transformer_fn.embed_documents([item["question"] for item in qa])
+
+    start_time = time.perf_counter()
+    db.add_new_report(chunks, {"ticker": ticker, "date": "benchmark"})
+    build_seconds = time.perf_counter() - start_time
+    index_mb = directory_size_mb(path)
+
+    rows = []
+    for k in ks:
+      latencies = []
+      hits = 0
+      for item in qa:
+        for _ in range(repeats):
+          start_time = time.perf_counter()
+          documents = db.search_many(ticker, [item["question"]], k=k, type=mode, rerank=False)[0]
+          latencies.append(time.perf_counter() - start_time)
+        if any(reference_coverage(str(item["reference"]), d.page_content) >= threshold for d in documents):
+          hits += 1
+
+      rows.append({
+        "backend": backend,
+        **hnsw,
+        "k": k,
+        "chunks": len(chunks),
+        "recall@k": round(hits / len(qa), 3),
+        "p50_ms": round(float(np.percentile(latencies, 50)) * 1000, 2),
+        "p99_ms": round(float(np.percentile(latencies, 99)) * 1000, 2),
+        "build_s": round(build_seconds, 2),
+        "index_mb": round(index_mb, 2),
+      })
+    return rows
+  finally:
+    shutil.rmtree(path, ignore_errors=True)
+
+
+def int_list(value: str):
+  return [int(v) for v in value.split(",") if v]
+
+
+def main():
+  parser = argparse.ArgumentParser(description="Sweep report index parameters and measure recall@k and latency")
+  parser.add_argument("--report", required=True, help="report file to ingest, e.g. the AAPL 10-K used by src/evaluation")
+  parser.add_argument("--ticker", default="AAPL")
+  parser.add_argument("--backends", default="chroma", help="comma separated: chroma, mmap")
+  parser.add_argument("--qa", default="AAPL_qa.json", help="file in resources/q_a_test")
+  parser.add_argument("--chunkers", default="semantic", help="comma separated: semantic, recursive:<chunk size>")
+  parser.add_argument("--m", type=int_list, default=[16])
+  parser.add_argument("--construction-ef", type=int_list, default=[100])
+  parser.add_argument("--search-ef", type=int_list, default=[10])
+  parser.add_argument("--k", type=int_list, default=[1, 4, 8])
+  parser.add_argument("--mode", default="similarity", help="similarity | hybrid")
+  parser.add_argument("--repeats", type=int, default=5, help="timed runs per question")
+  parser.add_argument("--relevance-threshold", type=float, default=0.5)
+  parser.add_argument("--output", help="write the rows as json lines to this file")
+  args = parser.parse_args()
+
+  content_type = CONTENT_TYPES.get(os.path.splitext(args.report)[1].lower(), "text/plain")
+  with open(args.report, "rb") as f:
+    text = any_format_to_str(f.read(), content_type)
+  qa = get_qa_test_json(args.qa)
+
+  rows = []
+  for chunker in args.chunkers.split(","):
+    chunks = split_report(text, chunker)
+    logger.info(f"Chunker {chunker}: {len(chunks)} chunks")
+    for backend in args.backends.split(","):
+      hnsw_grid = itertools.product(args.m, args.construction_ef, args.search_ef) if backend == "chroma" else [(None, None, None)]
+      for m, construction_ef, search_ef in hnsw_grid:
+        hnsw = {"M": m, "construction_ef": construction_ef, "search_ef": search_ef}
+        config_rows = run_config(backend, chunks, qa, args.ticker, hnsw, args.k, args.mode, args.repeats, args.relevance_threshold)
+        for row in config_rows:
+          row = {"chunker": chunker, **row}
+          rows.append(row)
+          logger.info(json.dumps(row))
+
+  if args.output:
+    with open(args.output, "w", encoding="utf-8") as f:
+      for row in rows:
+        f.write(json.dumps(row) + "\n")
+
+  columns = list(rows[0].keys()) if rows else []
+  print("\t".join(columns))
+  for row in rows:
+    print("\t".join(str(row[column]) for column in columns))
+
+
+if __name__ == "__main__":
+  main()
@@ -1,6 +1,9 @@
 from src.service.graph.intention_service import classify_intent_with_prompt
+from src.llm.llm_cache import set_default_namespace
 from src.util.logger import logger
 
+set_default_namespace("evaluation")
+
 
 
 def evaluate_route_classification(classify_intent_func):
@@ -0,0 +1,151 @@
+import contextvars
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional, Sequence
+
+from langchain_core.caches import BaseCache
+from langchain_core.load import dumps, loads
+from langchain_core.outputs import Generation
+
+from src.util.env_property import LLM_CACHE_PATH, LLM_CACHE_NAMESPACES, \
+  LLM_CACHE_MAX_ENTRIES
+from src.util.logger import logger
+from src.util.metrics import metrics
+
+LLM_CACHE_LOOKUPS = metrics.counter("llm_cache_lookups_total", "Exact match LLM response cache lookups by result (hit/miss)", ["namespace", "result"])
+LLM_CACHE_EVICTIONS = metrics.counter("llm_cache_evictions_total", "LLM responses evicted from the disk cache")
+
+DEFAULT_NAMESPACE = "chat"
+
+_namespace = contextvars.ContextVar("llm_cache_namespace", default=None)
+_default_namespace = DEFAULT_NAMESPACE
+
+
+def set_default_namespace(namespace: str):
+  """Namespace used by every thread of the process, e.g. "evaluation" at the top of an eval script."""
+  global _default_namespace
+  _default_namespace = namespace
+
+
+def current_namespace() -> str:
+  return _namespace.get() or _default_namespace
+
+
+@contextmanager
+def llm_cache_namespace(namespace: str):
+  token = _namespace.set(namespace)
+  try:
+    yield
+  finally:
+    _namespace.reset(token)
+
+
+class SQLiteLlmCache(BaseCache):
+  """Exact match LLM response cache in a local SQLite file.
+
+  llm_string carries the model id, temperature and bound tools (structured output schema),
+  prompt carries the serialized messages, so the key is a hash of both.
+  Only namespaces listed in LLM_CACHE_NAMESPACES read and write the cache.
+  """
+
+  # evict in chunks instead of on every insert
+  EVICTION_CHECK_EVERY = 100
+
+  def __init__(self, path: str = LLM_CACHE_PATH, enabled_namespaces: Sequence[str] = LLM_CACHE_NAMESPACES,
+      max_entries: int = LLM_CACHE_MAX_ENTRIES):
+    self.path = path
+    self.enabled_namespaces = set(enabled_namespaces)
+    self.max_entries = max_entries
+    self._connection = None
+    self._lock = threading.Lock()
+    self._inserts = 0
+
+  def _connect(self):
+    if self._connection is None:
+      directory = os.path.dirname(self.path)
+      if directory:
+        os.makedirs(directory, exist_ok=True)
+      self._connection = sqlite3.connect(self.path, check_same_thread=False)
+      self._connection.execute("PRAGMA journal_mode=WAL")
+      self._connection.execute(
+          "CREATE TABLE IF NOT EXISTS llm_cache ("
+          "key TEXT PRIMARY KEY, namespace TEXT NOT NULL, value TEXT NOT NULL, last_access REAL NOT NULL)")
+      self._connection.execute("CREATE INDEX IF NOT EXISTS llm_cache_last_access ON llm_cache (last_access)")
+      self._connection.commit()
+    return self._connection
+
+  def is_enabled(self, namespace: str) -> bool:
+    return namespace in self.enabled_namespaces
+
+  @staticmethod
+  def _key(namespace: str, prompt: str, llm_string: str) -> str:
+    return hashlib.sha256("\x00".join((namespace, llm_string, prompt)).encode("utf-8")).hexdigest()
+
+  def lookup(self, prompt: str, llm_string: str) -> Optional[Sequence[Generation]]:
+    namespace = current_namespace()
+    if not self.is_enabled(namespace):
+      return None
+
+    key = self._key(namespace, prompt, llm_string)
+    with self._lock:
+      connection = self._connect()
+      row = connection.execute("SELECT value FROM llm_cache WHERE key = ?", (key,)).fetchone()
+      if row is not None:
+        connection.execute("UPDATE llm_cache SET last_access = ? WHERE key = ?", (time.time(), key))
+        connection.commit()
+
+    if row is None:
+      LLM_CACHE_LOOKUPS.labels(namespace=namespace, result="miss").inc()
+      return None
+
+    try:
+      generations = loads(row[0], allowed_objects="core", secrets_from_env=False)
+    except Exception as e:
+      logger.warning(f"LLM cache: dropping unreadable entry {key}: {e}")
+      LLM_CACHE_LOOKUPS.labels(namespace=namespace, result="miss").inc()
+      return None
+
+    LLM_CACHE_LOOKUPS.labels(namespace=namespace, result="hit").inc()
+    return generations
+
+  def update(self, prompt: str, llm_string: str, return_val: Sequence[Generation]) -> None:
+    namespace = current_namespace()
+    if not self.is_enabled(namespace):
+      return
+
+    key = self._key(namespace, prompt, llm_string)
+    value = dumps(list(return_val))
+    with self._lock:
+      connection = self._connect()
+      connection.execute("INSERT OR REPLACE INTO llm_cache (key, namespace, value, last_access) VALUES (?, ?, ?, ?)",
+                         (key, namespace, value, time.time()))
+      self._inserts += 1
+      if self._inserts % self.EVICTION_CHECK_EVERY == 0:
+        self._evict(connection)
+      connection.commit()
+
+  def _evict(self, connection):
+    count = connection.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+    overflow = count - self.max_entries
+    if overflow <= 0:
+      return
+    connection.execute(
+        "DELETE FROM llm_cache WHERE key IN (SELECT key FROM llm_cache ORDER BY last_access LIMIT ?)", (overflow,))
+    LLM_CACHE_EVICTIONS.inc(overflow)
+
+  def clear(self, **kwargs) -> None:
+    namespace = kwargs.get("namespace")
+    with self._lock:
+      connection = self._connect()
+      if namespace:
+        connection.execute("DELETE FROM llm_cache WHERE namespace = ?", (namespace,))
+      else:
+        connection.execute("DELETE FROM llm_cache")
+      connection.commit()
+
+
+llm_cache = SQLiteLlmCache()
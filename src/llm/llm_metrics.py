@@ -0,0 +1,63 @@
+import time
+from typing import Any
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+
+from src.util.metrics import metrics
+
+LLM_CALLS = metrics.counter("llm_calls_total", "LLM calls by model source and result (ok/error)", ["source", "result"])
+LLM_TOKENS = metrics.counter("llm_tokens_total", "LLM tokens by model source and direction (input/output)", ["source", "direction"])
+LLM_CALL_SECONDS = metrics.histogram("llm_call_seconds", "LLM call latency by model source", ["source"])
+
+
+def get_token_usage(response: LLMResult):
+  """Returns (input_tokens, output_tokens) of an LLM result, whatever provider produced it."""
+  input_tokens, output_tokens = 0, 0
+  for generations in response.generations:
+    for generation in generations:
+      message = getattr(generation, "message", None)
+      usage = getattr(message, "usage_metadata", None) if message is not None else None
+      if usage:
+        input_tokens += int(usage.get("input_tokens", 0))
+        output_tokens += int(usage.get("output_tokens", 0))
+
+  if input_tokens == 0 and output_tokens == 0 and response.llm_output:
+    usage = response.llm_output.get("token_usage") or response.llm_output.get("usage") or {}
+    input_tokens = int(usage.get("prompt_tokens", 0) or usage.get("input_tokens", 0) or 0)
+    output_tokens = int(usage.get("completion_tokens", 0) or usage.get("output_tokens", 0) or 0)
+  return input_tokens, output_tokens
+
+
+class LlmMetricsCallbackHandler(BaseCallbackHandler):
+  """Counts calls, tokens and latency of every client the registry builds for one llm source."""
+
+  run_inline = True
+
+  def __init__(self, source: str):
+    self.source = source
+    self._started = {}
+
+  def _start(self, run_id: UUID):
+    self._started[run_id] = time.perf_counter()
+
+  def on_llm_start(self, serialized: dict, prompts: Any, *, run_id: UUID, **kwargs: Any) -> None:
+    self._start(run_id)
+
+  def on_chat_model_start(self, serialized: dict, messages: Any, *, run_id: UUID, **kwargs: Any) -> None:
+    self._start(run_id)
+
+  def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+    start_time = self._started.pop(run_id, None)
+    if start_time is not None:
+      LLM_CALL_SECONDS.labels(source=self.source).observe(time.perf_counter() - start_time)
+    LLM_CALLS.labels(source=self.source, result="ok").inc()
+
+    input_tokens, output_tokens = get_token_usage(response)
+    LLM_TOKENS.labels(source=self.source, direction="input").inc(input_tokens)
+    LLM_TOKENS.labels(source=self.source, direction="output").inc(output_tokens)
+
+  def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+    self._started.pop(run_id, None)
+    LLM_CALLS.labels(source=self.source, result="error").inc()
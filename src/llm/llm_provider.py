@@ -1,13 +1,26 @@
-from src.util.env_property import LLM_URL, BEDROCK_MODEL, get_env_property, \
+from src.util.env_property import LLM_URL, BEDROCK_MODEL, \
   GOOGLE_AI_MODEL, BEDROCK_MODEL_JUDGE, BEDROCK_MODEL_REASONING, \
-  BEDROCK_MODEL_CHEAP, BEDROCK_MODEL_SUMMARY, LLM_SOURCE
+  BEDROCK_MODEL_CHEAP, BEDROCK_MODEL_SUMMARY, LLM_SOURCE, AWS_REGION, \
+  LLM_MAX_POOL_CONNECTIONS, LLM_CREDENTIALS_REFRESH_SECONDS, LLM_MAX_RETRIES, \
+  BEDROCK_MODEL_RPM, BEDROCK_MODEL_TPM, BEDROCK_MODEL_REASONING_RPM, \
+  BEDROCK_MODEL_REASONING_TPM, BEDROCK_MODEL_CHEAP_RPM, BEDROCK_MODEL_CHEAP_TPM, \
+  BEDROCK_MODEL_SUMMARY_RPM, BEDROCK_MODEL_SUMMARY_TPM, BEDROCK_MODEL_JUDGE_RPM, \
+  BEDROCK_MODEL_JUDGE_TPM, GOOGLE_AI_MODEL_RPM, GOOGLE_AI_MODEL_TPM, \
+  OPEN_AI_MODEL_RPM, OPEN_AI_MODEL_TPM
 from langchain_ollama import ChatOllama
 import boto3
+from botocore.config import Config
 from langchain_aws import ChatBedrockConverse
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain.chat_models import ChatOpenAI
 from langchain.schema import HumanMessage
+from src.llm.llm_cache import llm_cache
+from src.llm.llm_metrics import LlmMetricsCallbackHandler
+from src.util.component_registry import component_registry
+from src.llm.rate_limiter import get_rate_limiter, TokenUsageCallbackHandler
 from src.util.logger import logger
+from src.util.metrics import metrics
+import threading
 import time
 
 # llm = OllamaClient(base_url="http://localhost:11434", model="mistral:instruct")
@@ -16,67 +29,135 @@ import time
 # llmOldClient = OllamaClient(base_url=get_env_property("LLM_URL"), model="mistral:instruct")
   # llm = ChatOllama(base_url=get_env_property("LLM_URL"), model="mistral:instruct", verbose=True, temperature=0)
 
+LLM_CLIENT_LOOKUPS = metrics.counter("llm_client_registry_lookups_total", "get_llm lookups by result (hit/miss)", ["source", "result"])
+LLM_CLIENT_BUILD_SECONDS = metrics.histogram("llm_client_build_seconds", "Time spent constructing an LLM client", ["source"])
+LLM_CLIENTS_CACHED = metrics.gauge("llm_clients_cached", "Number of LLM clients held by the registry")
+
+
+class AwsSessionHolder:
+  """Shares one boto3 session (and its credential provider) between all bedrock clients.
+
+  Refreshable credentials are touched periodically from a daemon thread, so an expiring
+  token is renewed in the background instead of on the request path.
+  """
+
+  def __init__(self, refresh_interval_seconds: int = LLM_CREDENTIALS_REFRESH_SECONDS):
+    self.refresh_interval_seconds = refresh_interval_seconds
+    self._session = None
+    self._lock = threading.Lock()
+    self._refresh_thread = None
+
+  def get_session(self):
+    with self._lock:
+      if self._session is None:
+        self._session = boto3.Session()
+        self._start_refresh()
+      return self._session
+
+  def _start_refresh(self):
+    if self.refresh_interval_seconds <= 0 or self._refresh_thread is not None:
+      return
+    self._refresh_thread = threading.Thread(target=self._refresh_loop, name="aws-credentials-refresh", daemon=True)
+    self._refresh_thread.start()
+
+  def _refresh_loop(self):
+    while True:
+      time.sleep(self.refresh_interval_seconds)
+      try:
+        credentials = self._session.get_credentials()
+        if credentials is not None:
+          # triggers a refresh when the token is inside the advisory expiry window
+          credentials.get_frozen_credentials()
+      except Exception as e:
+        logger.warning(f"Background AWS credentials refresh failed: {e}")
+
+
+aws_session_holder = AwsSessionHolder()
+_bedrock_runtime_client = None
+_bedrock_runtime_lock = threading.Lock()
+
+
+def get_bedrock_runtime_client():
+  global _bedrock_runtime_client
+  with _bedrock_runtime_lock:
+    if _bedrock_runtime_client is None:
+      session = aws_session_holder.get_session()
+      # "standard" retry mode retries throttling errors with jittered exponential backoff
+      _bedrock_runtime_client = session.client(
+          "bedrock-runtime",
+          region_name=AWS_REGION,
+          config=Config(
+              max_pool_connections=LLM_MAX_POOL_CONNECTIONS,
+              retries={"mode": "standard", "max_attempts": LLM_MAX_RETRIES}
+          )
+      )
+    return _bedrock_runtime_client
+
+
+def rate_limit_kwargs(limiter_name, requests_per_minute, tokens_per_minute):
+  # the limiter is shared by every client of the same model, whatever temperature or schema
+  rate_limiter = get_rate_limiter(limiter_name, requests_per_minute, tokens_per_minute)
+  return {"rate_limiter": rate_limiter, "callbacks": [TokenUsageCallbackHandler(rate_limiter)]}
+
 def local_ollama_client(temperature=0):
-  return ChatOllama(base_url=LLM_URL, model="mistral:instruct", verbose=True, temperature=temperature)
+  return ChatOllama(base_url=LLM_URL, model="mistral:instruct", verbose=True, temperature=temperature, cache=llm_cache)
 
 def google_ai_client(temperature=0):
-  time.sleep(20)
-  return ChatGoogleGenerativeAI(model=GOOGLE_AI_MODEL)
+  return ChatGoogleGenerativeAI(
+      model=GOOGLE_AI_MODEL,
+      temperature=temperature,
+      max_retries=LLM_MAX_RETRIES,
+      cache=llm_cache,
+      **rate_limit_kwargs(GOOGLE_AI_MODEL, GOOGLE_AI_MODEL_RPM, GOOGLE_AI_MODEL_TPM)
+  )
   # "gemini-1.5-pro",  # or "gemini-1.5-flash")
 
 def open_ai_model(temperature=0):
-  time.sleep(5)
-  return ChatOpenAI(model_name="gpt-3.5-turbo", temperature=temperature)
-
-def bedrock_client(temperature=0, source: str = None):
-  bedrock_id = None
-  # bedrock_id = "us.meta.llama4-maverick-17b-instruct-v1:0"
-  time.sleep(10)
+  return ChatOpenAI(
+      model_name="gpt-3.5-turbo",
+      temperature=temperature,
+      max_retries=LLM_MAX_RETRIES,
+      cache=llm_cache,
+      **rate_limit_kwargs("gpt-3.5-turbo", OPEN_AI_MODEL_RPM, OPEN_AI_MODEL_TPM)
+  )
 
+def get_bedrock_model_id(source: str = None):
   if source == 'bedrock_judge':
     logger.info(f"Using bedrock judge model id: {BEDROCK_MODEL_JUDGE}")
-    bedrock_id = BEDROCK_MODEL_JUDGE
+    return BEDROCK_MODEL_JUDGE, BEDROCK_MODEL_JUDGE_RPM, BEDROCK_MODEL_JUDGE_TPM
   elif source == 'bedrock_reasoning':
     logger.info(f"Using bedrock reasoning model id: {BEDROCK_MODEL_REASONING}")
-    bedrock_id = BEDROCK_MODEL_REASONING
+    return BEDROCK_MODEL_REASONING, BEDROCK_MODEL_REASONING_RPM, BEDROCK_MODEL_REASONING_TPM
   elif source == 'bedrock_cheap':
     logger.info(f"Using bedrock cheap model id: {BEDROCK_MODEL_CHEAP}")
-    bedrock_id = BEDROCK_MODEL_CHEAP
+    return BEDROCK_MODEL_CHEAP, BEDROCK_MODEL_CHEAP_RPM, BEDROCK_MODEL_CHEAP_TPM
   elif source == 'bedrock_summary':
     logger.info(f"Using bedrock summary model id: {BEDROCK_MODEL_SUMMARY}")
-    bedrock_id = BEDROCK_MODEL_SUMMARY
+    return BEDROCK_MODEL_SUMMARY, BEDROCK_MODEL_SUMMARY_RPM, BEDROCK_MODEL_SUMMARY_TPM
   elif source == 'bedrock_general':
     logger.info(f"Using bedrock general model {BEDROCK_MODEL}")
-    bedrock_id = BEDROCK_MODEL
-  else:
-    bedrock_id = BEDROCK_MODEL
+    return BEDROCK_MODEL, BEDROCK_MODEL_RPM, BEDROCK_MODEL_TPM
 
-  # Optional: specify a profile name
-  session = boto3.Session()
-  # session = boto3.Session(profile_name="default", region_name="us-east-1")
-  credentials = session.get_credentials().get_frozen_credentials()
+  return BEDROCK_MODEL, BEDROCK_MODEL_RPM, BEDROCK_MODEL_TPM
 
-  aws_access_key_id = credentials.access_key
-  aws_secret_access_key = credentials.secret_key
-  aws_session_token = credentials.token  # can be None if not using
+def bedrock_client(temperature=0, source: str = None):
+  # bedrock_id = "us.meta.llama4-maverick-17b-instruct-v1:0"
+  bedrock_id, requests_per_minute, tokens_per_minute = get_bedrock_model_id(source)
 
   # ID_BEDROCK = "anthropic.claude-3-sonnet-20240229-v1:0"
 
+  # the runtime client keeps its own connection pool and refreshable credentials,
+  # so every model id shares the same HTTP connections
   return ChatBedrockConverse(
       model_id=bedrock_id,
-      region_name="us-east-1",
-      aws_access_key_id=aws_access_key_id,
-      aws_secret_access_key=aws_secret_access_key,
-      aws_session_token=aws_session_token,  # optional
-      temperature=temperature
+      client=get_bedrock_runtime_client(),
+      temperature=temperature,
+      cache=llm_cache,
+      **rate_limit_kwargs(bedrock_id, requests_per_minute, tokens_per_minute)
   )
 
 
-def get_llm(temperature=0, specific_source: str = LLM_SOURCE):
-    # llm_source = get_env_property(specific_source, "ollama")
-    llm_source = specific_source
-
-
+def build_llm(temperature=0, llm_source: str = LLM_SOURCE):
     if "ollama" in llm_source:
         logger.info("llm_provider: using ollama client")
         return local_ollama_client(temperature)
@@ -93,6 +174,65 @@ def get_llm(temperature=0, specific_source: str = LLM_SOURCE):
     return local_ollama_client()
 
 
+class LlmClientRegistry:
+  """Builds every (source, temperature, structured output schema) client once and reuses it."""
+
+  def __init__(self):
+    self._clients = {}
+    self._lock = threading.Lock()
+    self._key_locks = {}
+
+  def get(self, temperature=0, llm_source: str = LLM_SOURCE, schema=None):
+    key = (llm_source, temperature, schema)
+
+    client = self._clients.get(key)
+    if client is not None:
+      LLM_CLIENT_LOOKUPS.labels(source=llm_source, result="hit").inc()
+      return client
+
+    with self._lock:
+      key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+    # build outside of the registry lock so slow clients do not block other keys
+    with key_lock:
+      client = self._clients.get(key)
+      if client is not None:
+        LLM_CLIENT_LOOKUPS.labels(source=llm_source, result="hit").inc()
+        return client
+
+      LLM_CLIENT_LOOKUPS.labels(source=llm_source, result="miss").inc()
+      start_time = time.perf_counter()
+      if schema is None:
+        client = build_llm(temperature, llm_source)
+        client.callbacks = list(client.callbacks or []) + [LlmMetricsCallbackHandler(llm_source)]
+      else:
+        client = self.get(temperature, llm_source).with_structured_output(schema)
+      LLM_CLIENT_BUILD_SECONDS.labels(source=llm_source).observe(time.perf_counter() - start_time)
+
+      with self._lock:
+        self._clients[key] = client
+        LLM_CLIENTS_CACHED.set(len(self._clients))
+      return client
+
+  def clear(self):
+    with self._lock:
+      self._clients.clear()
+      self._key_locks.clear()
+      LLM_CLIENTS_CACHED.set(0)
+
+
+llm_registry = LlmClientRegistry()
+
+
+def get_llm(temperature=0, specific_source: str = LLM_SOURCE, schema=None):
+    # llm_source = get_env_property(specific_source, "ollama")
+    return llm_registry.get(temperature, specific_source, schema)
+
+
+# default client built during warm-up, so the first chat does not pay for it
+component_registry.register("llm", get_llm)
+
+
 if __name__ == "__main__":
     llm = bedrock_client()
     response = llm.invoke([HumanMessage(content="Say this is a test!")])
@@ -0,0 +1,175 @@
+import asyncio
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, Optional
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+from langchain_core.rate_limiters import BaseRateLimiter
+
+from src.util.metrics import metrics
+
+RATE_LIMIT_WAIT_SECONDS = metrics.histogram("llm_rate_limit_wait_seconds", "Time a request waited for the per-model limiter", ["limiter"])
+RATE_LIMIT_QUEUE = metrics.gauge("llm_rate_limit_queue", "Requests currently queued on the per-model limiter", ["limiter"])
+RATE_LIMIT_TOKENS = metrics.counter("llm_rate_limit_tokens_total", "Tokens debited from the per-model limiter", ["limiter"])
+
+
+def get_total_tokens(response: LLMResult) -> int:
+  """Extracts total token usage from an LLM result, whatever provider produced it."""
+  total = 0
+  for generations in response.generations:
+    for generation in generations:
+      message = getattr(generation, "message", None)
+      usage = getattr(message, "usage_metadata", None) if message is not None else None
+      if usage:
+        total += int(usage.get("total_tokens", 0))
+
+  if total == 0 and response.llm_output:
+    usage = response.llm_output.get("token_usage") or response.llm_output.get("usage") or {}
+    total = int(usage.get("total_tokens", 0) or 0)
+  return total
+
+
+class TokenBucketRateLimiter(BaseRateLimiter):
+  """Requests-per-minute and tokens-per-minute budget shared by every caller of one model.
+
+  A request takes one slot from the request bucket up front. Tokens are only known after
+  the response, so they are debited afterwards (see TokenUsageCallbackHandler) and the
+  token bucket may go into debt; new requests wait until the debt is paid back.
+  Waiters are served strictly in arrival order, for threads and coroutines alike.
+  """
+
+  def __init__(self, name: str, requests_per_minute: Optional[int], tokens_per_minute: Optional[int] = None,
+      burst_seconds: float = 10, check_every_n_seconds: float = 0.05, clock: Callable[[], float] = time.monotonic):
+    self.name = name
+    self.clock = clock
+    self.request_rate = requests_per_minute / 60 if requests_per_minute else None
+    self.token_rate = tokens_per_minute / 60 if tokens_per_minute else None
+    self.request_capacity = max(1.0, self.request_rate * burst_seconds) if self.request_rate else None
+    self.token_capacity = float(tokens_per_minute) if tokens_per_minute else None
+    self.check_every_n_seconds = check_every_n_seconds
+
+    self._requests = self.request_capacity or 0.0
+    self._tokens = self.token_capacity or 0.0
+    self._last_refill = clock()
+    self._waiters = deque()
+    self._condition = threading.Condition()
+
+  def _refill(self):
+    now = self.clock()
+    elapsed = now - self._last_refill
+    self._last_refill = now
+    if self.request_rate:
+      self._requests = min(self.request_capacity, self._requests + elapsed * self.request_rate)
+    if self.token_rate:
+      self._tokens = min(self.token_capacity, self._tokens + elapsed * self.token_rate)
+
+  def _seconds_until_available(self) -> float:
+    delay = 0.0
+    if self.request_rate and self._requests < 1:
+      delay = max(delay, (1 - self._requests) / self.request_rate)
+    if self.token_rate and self._tokens <= 0:
+      delay = max(delay, (1 - self._tokens) / self.token_rate)
+    return delay
+
+  def _try_consume(self, waiter) -> float:
+    """Returns 0 when the waiter got its slot, otherwise how long to wait before retrying."""
+    self._refill()
+    if self._waiters[0] is not waiter:
+      return self.check_every_n_seconds
+    delay = self._seconds_until_available()
+    if delay > 0:
+      return delay
+    if self.request_rate:
+      self._requests -= 1
+    self._waiters.popleft()
+    RATE_LIMIT_QUEUE.labels(limiter=self.name).set(len(self._waiters))
+    self._condition.notify_all()
+    return 0.0
+
+  def _enqueue(self):
+    waiter = object()
+    self._waiters.append(waiter)
+    RATE_LIMIT_QUEUE.labels(limiter=self.name).set(len(self._waiters))
+    return waiter
+
+  def _leave(self, waiter):
+    if waiter in self._waiters:
+      self._waiters.remove(waiter)
+      RATE_LIMIT_QUEUE.labels(limiter=self.name).set(len(self._waiters))
+      self._condition.notify_all()
+
+  def acquire(self, *, blocking: bool = True) -> bool:
+    if not self.request_rate and not self.token_rate:
+      return True
+
+    start_time = time.perf_counter()
+    with self._condition:
+      waiter = self._enqueue()
+      try:
+        while True:
+          delay = self._try_consume(waiter)
+          if delay == 0:
+            RATE_LIMIT_WAIT_SECONDS.labels(limiter=self.name).observe(time.perf_counter() - start_time)
+            return True
+          if not blocking:
+            return False
+          self._condition.wait(timeout=delay)
+      finally:
+        self._leave(waiter)
+
+  async def aacquire(self, *, blocking: bool = True) -> bool:
+    if not self.request_rate and not self.token_rate:
+      return True
+
+    start_time = time.perf_counter()
+    with self._condition:
+      waiter = self._enqueue()
+    try:
+      while True:
+        with self._condition:
+          delay = self._try_consume(waiter)
+        if delay == 0:
+          RATE_LIMIT_WAIT_SECONDS.labels(limiter=self.name).observe(time.perf_counter() - start_time)
+          return True
+        if not blocking:
+          return False
+        await asyncio.sleep(min(delay, 1.0))
+    finally:
+      with self._condition:
+        self._leave(waiter)
+
+  def record_tokens(self, tokens: int):
+    if not tokens:
+      return
+    RATE_LIMIT_TOKENS.labels(limiter=self.name).inc(tokens)
+    if not self.token_rate:
+      return
+    with self._condition:
+      self._refill()
+      self._tokens -= tokens
+
+
+class TokenUsageCallbackHandler(BaseCallbackHandler):
+  """Debits the tokens reported by every finished call from the model's limiter."""
+
+  def __init__(self, rate_limiter: TokenBucketRateLimiter):
+    self.rate_limiter = rate_limiter
+
+  def on_llm_end(self, response: LLMResult, **kwargs: Any) -> None:
+    self.rate_limiter.record_tokens(get_total_tokens(response))
+
+
+_limiters: Dict[str, TokenBucketRateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(name: str, requests_per_minute: Optional[int], tokens_per_minute: Optional[int] = None) -> TokenBucketRateLimiter:
+  """One limiter per model id for the whole process, whichever source asked for it first sets the budget."""
+  with _limiters_lock:
+    limiter = _limiters.get(name)
+    if limiter is None:
+      limiter = TokenBucketRateLimiter(name, requests_per_minute, tokens_per_minute)
+      _limiters[name] = limiter
+    return limiter
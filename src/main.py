@@ -1,17 +1,37 @@
-from fastapi import FastAPI, Query, Form
+import time
+import_start_time = time.perf_counter()
+
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Query, Form, HTTPException
 
 from src.llm.llm_provider import get_llm
-from src.service.graph.router import start_graph_v2
+from src.service.graph.router import start_graph_v2, stream_graph_v2
 from pydantic import BaseModel
 from fastapi import FastAPI, File, UploadFile
+from typing import List
 from src.usecase import report_uc as report_use_case
-from src.usecase.image_uc import save_image_embeddings
+from src.usecase.image_uc import save_image_embeddings, save_image_embeddings_batch
+from src.util.executor import run_blocking
+from src.usecase.report_ingestion_uc import report_ingestion_queue
+from src.util.component_registry import component_registry
+from src.util.env_property import WARM_UP_ON_STARTUP
 from src.util.logger import logger
+from src.util.metrics import metrics
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from PIL import Image
 import io
 import json
 
-app = FastAPI(title="MACONDO-BE")
+import_seconds = time.perf_counter() - import_start_time
+logger.info(f"Startup: application modules imported in {import_seconds:.2f}s")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+  if WARM_UP_ON_STARTUP:
+    component_registry.start_warm_up()
+  yield
+
+app = FastAPI(title="MACONDO-BE", lifespan=lifespan)
 
 class ChatRequest(BaseModel):
   message: str
@@ -21,12 +41,35 @@ class ChatRequest(BaseModel):
 async def root():
     return "Macondo-be is working"
 
+@app.get("/health/live")
+async def health_live():
+  return {"status": "alive"}
+
+@app.get("/health/ready")
+async def health_ready():
+  ready = component_registry.is_ready()
+  body = {
+    "status": "ready" if ready else "not_ready",
+    "import_seconds": round(import_seconds, 3),
+    "components": component_registry.report(),
+  }
+  return JSONResponse(body, status_code=200 if ready else 503)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics_endpoint():
+  return metrics.render()
+
 @app.post("/chat/")
 async def chat_endpoint(req: ChatRequest):
-  result = await start_graph_v2(req.message)
+  result = await start_graph_v2(req.message, req.session_id)
 
   return {"reply": f"{result}"}
 
+@app.post("/chat/stream/")
+async def chat_stream_endpoint(req: ChatRequest):
+  return StreamingResponse(stream_graph_v2(req.message, req.session_id), media_type="text/event-stream",
+                           headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 # ===== REPORT ENDPOINTS =====
 @app.post("/report/")
 async def save_report(file: UploadFile = File(...),
@@ -39,8 +82,15 @@ async def save_report(file: UploadFile = File(...),
   logger.info(f"ENDPOINT: /report/ save report {ticker}")
 
   metadata = {"ticker": ticker, "date": date}
-  report_use_case.save_report(file, metadata, content_type)
-  return {"status": "File uploaded successfully"}
+  job = report_ingestion_queue.submit(file, metadata, content_type)
+  return {"status": "File accepted for ingestion", "job_id": job.id}
+
+@app.get("/report/jobs/{job_id}")
+async def get_report_job(job_id: str):
+  job = report_ingestion_queue.get(job_id)
+  if job is None:
+    raise HTTPException(status_code=404, detail=f"Ingestion job {job_id} not found")
+  return job.model_dump()
 
 @app.get("/report/")
 async def get_all_reports():
@@ -48,6 +98,13 @@ async def get_all_reports():
   reports = report_use_case.get_report_list()
   return {"reports": reports}
 
+@app.get("/report/{ticker}")
+async def get_report_details(ticker: str):
+  details = report_use_case.get_report_details(ticker)
+  if details is None:
+    raise HTTPException(status_code=404, detail=f"No report stored for {ticker}")
+  return details.model_dump()
+
 @app.delete("/report/")
 async def delete_report(ticker: str):
   logger.info("DELETE /report/")
@@ -81,3 +138,30 @@ async def upload_image(
         metadata_dict = {}
     doc_id = save_image_embeddings(image_bytes, metadata=metadata_dict, link=link)
     return {"id": doc_id}
+
+@app.post("/upload_images/")
+async def upload_images(
+    files: List[UploadFile] = File(...),
+    metadata: str = Form("{}"),
+    links: str = Form("{}"),
+):
+    """Batch upload of images or zip archives of images.
+
+    metadata is a json object applied to every image, links a json object of filename -> link
+    (the filename is used as link when missing).
+    """
+    logger.info(f"POST /upload_images/ with {len(files)} files")
+    try:
+        metadata_dict = json.loads(metadata)
+    except Exception:
+        metadata_dict = {}
+    try:
+        links_dict = json.loads(links)
+    except Exception:
+        links_dict = {}
+
+    # the spooled upload files are read one image at a time while the batches are embedded
+    uploaded = [(file.filename, file.file) for file in files]
+    # decoding and embedding are cpu bound, keep them off the event loop
+    results = await run_blocking(save_image_embeddings_batch, uploaded, metadata_dict, links_dict)
+    return {"images": results}
@@ -0,0 +1,34 @@
+from datetime import datetime
+from enum import Enum
+from typing import Dict, Optional
+
+from pydantic import BaseModel, Field
+
+
+class IngestionStage(str, Enum):
+  QUEUED = "QUEUED"
+  PARSING = "PARSING"
+  CHUNKING = "CHUNKING"
+  EMBEDDING = "EMBEDDING"
+  # pdf pages are parsed, chunked and embedded as one pipeline
+  STREAMING = "STREAMING"
+  DONE = "DONE"
+  FAILED = "FAILED"
+
+
+class IngestionJob(BaseModel):
+  """State of one background report ingestion, as returned by GET /report/jobs/{id}."""
+  id: str
+  ticker: str
+  date: str
+  content_type: Optional[str] = None
+  stage: IngestionStage = IngestionStage.QUEUED
+  pages_parsed: int = 0
+  chunks_total: int = 0
+  chunks_embedded: int = 0
+  chunks_reused: int = Field(0, description="Chunks unchanged since the previous upload of the same report date, not embedded again")
+  chunks_removed: int = Field(0, description="Chunks of the previous upload of the same report date missing from this one")
+  timings: Dict[str, float] = Field(default_factory=dict, description="Seconds spent per stage")
+  error: Optional[str] = None
+  created_at: datetime = Field(default_factory=datetime.utcnow)
+  finished_at: Optional[datetime] = None
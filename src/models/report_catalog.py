@@ -0,0 +1,16 @@
+from datetime import datetime
+from typing import List, Optional
+
+from pydantic import BaseModel, Field
+
+
+class ReportCatalogEntry(BaseModel):
+  """Stored report of one ticker, as returned by GET /report/{ticker}."""
+  ticker: str
+  latest_date: str
+  dates: List[str] = Field(default_factory=list, description="Report dates stored for the ticker, oldest first")
+  chunks: int = 0
+  bytes: int = Field(0, description="UTF-8 size of the stored chunk texts")
+  first_ingested_at: datetime = Field(default_factory=datetime.utcnow)
+  last_ingested_at: datetime = Field(default_factory=datetime.utcnow)
+  partition: Optional[str] = None
@@ -1,42 +1,132 @@
+import threading
+import time
+from collections import OrderedDict
+
 from langchain_core.prompts import ChatPromptTemplate
-from langgraph.store.memory import InMemoryStore
+from src.util.env_property import CHAT_MEMORY_MAX_SESSIONS, CHAT_MEMORY_TTL_SECONDS
 from src.util.logger import logger
+from src.util.metrics import metrics
 
 from src.llm.llm_provider import get_llm
 from src.util.prompt_manager import prompt_manager
 
+CHAT_MEMORY_SESSIONS = metrics.gauge("chat_memory_sessions", "Live chat sessions held in memory")
+CHAT_MEMORY_CHARACTERS = metrics.gauge("chat_memory_characters", "Characters of chat history held in memory")
+CHAT_MEMORY_EVICTIONS = metrics.counter("chat_memory_evictions_total", "Chat sessions evicted from memory", ["reason"])
+
+
+class SessionHistory():
+  def __init__(self):
+    self.messages = []
+    self.length = 0
+    self.last_access = time.monotonic()
+    # set while the llm summarises the session, concurrent turns do not start a second summary
+    self.summarising = False
+
+  def append(self, role, message):
+    self.messages.append((role, message))
+    self.length += len(message) if message is not None else 0
+
+  def replace(self, messages):
+    self.messages = messages
+    self.length = sum(len(msg) for role, msg in messages if msg is not None)
+
+
 class SummaryChatHistory():
-  def __init__(self, llm, summarize_prompt, summary_trim_coeficient = 0.5, window_character_size=2000):
+  """Chat history per session, summarised by the llm once it grows over the window size.
+
+  Sessions are kept in LRU order, capped by max_sessions and dropped after ttl_seconds of inactivity.
+  """
+
+  def __init__(self, llm, summarize_prompt, summary_trim_coeficient = 0.5, window_character_size=2000,
+      max_sessions=CHAT_MEMORY_MAX_SESSIONS, ttl_seconds=CHAT_MEMORY_TTL_SECONDS, llm_factory=None):
     super().__init__()
-    self.memory = InMemoryStore()
+    self.sessions: OrderedDict[str, SessionHistory] = OrderedDict()
     self.window_size = window_character_size
     self.coeficient = summary_trim_coeficient
-    self.llm = llm
+    self._llm = llm
+    # lets the graph module be imported without building an llm client
+    self._llm_factory = llm_factory
     self.summarizer_prompt = summarize_prompt
+    self.max_sessions = max_sessions
+    self.ttl_seconds = ttl_seconds
+    self.total_length = 0
+    self._lock = threading.Lock()
+
+  @property
+  def llm(self):
+    if self._llm is None and self._llm_factory is not None:
+      self._llm = self._llm_factory()
+    return self._llm
+
+  def _touch(self, user_id, create=False):
+    now = time.monotonic()
+    self._evict_expired(now)
+
+    session = self.sessions.get(user_id)
+    if session is None:
+      if not create:
+        return None
+      session = SessionHistory()
+      self.sessions[user_id] = session
+      self._evict_overflow()
+
+    session.last_access = now
+    self.sessions.move_to_end(user_id)
+    return session
+
+  def _drop(self, user_id, reason):
+    session = self.sessions.pop(user_id)
+    self.total_length -= session.length
+    CHAT_MEMORY_EVICTIONS.labels(reason=reason).inc()
+
+  def _evict_expired(self, now):
+    # sessions are in access order, so expired ones are always at the front
+    while self.sessions and self.ttl_seconds > 0:
+      user_id, session = next(iter(self.sessions.items()))
+      if now - session.last_access < self.ttl_seconds:
+        break
+      self._drop(user_id, "ttl")
+
+  def _evict_overflow(self):
+    while len(self.sessions) > self.max_sessions:
+      user_id = next(iter(self.sessions))
+      self._drop(user_id, "lru")
+
+  def _update_metrics(self):
+    CHAT_MEMORY_SESSIONS.set(len(self.sessions))
+    CHAT_MEMORY_CHARACTERS.set(self.total_length)
 
   def add_message(self, user_id, role, message):
-    namespace = (user_id, "history")
-    history = self.memory.get(namespace, "chat")
-
-    if history is None:
-      history = []
-      history.append((role, message))
-      self.memory.put(namespace, "chat", history)
-    else:
-      history = history.value
-      history.append((role, message))
-      self.memory.put(namespace, "chat", history)
-
-    if self.is_history_too_long(history):
-      summarized_history = self.summarise_history(history)
-      self.memory.put(namespace, "chat", summarized_history)
+    with self._lock:
+      session = self._touch(user_id, create=True)
+      previous_length = session.length
+      session.append(role, message)
+      self.total_length += session.length - previous_length
+      history = list(session.messages)
+      too_long = not session.summarising and self.is_history_too_long(session)
+      session.summarising = too_long
+      self._update_metrics()
+
+    if too_long:
+      # summarise outside of the lock, other sessions must not wait for the llm
+      try:
+        summarized_history = self.summarise_history(history)
+        with self._lock:
+          # the session may have been evicted and recreated meanwhile, only messages appended after history are kept
+          if self.sessions.get(user_id) is session and session.messages[:len(history)] == history:
+            previous_length = session.length
+            session.replace(summarized_history + session.messages[len(history):])
+            self.total_length += session.length - previous_length
+            self._update_metrics()
+      finally:
+        session.summarising = False
 
     logger.info(f"HISTORY IS: {history}")
 
-  def is_history_too_long(self, history):
-    logger.info(f"IS HISTORY TO LONG?: {history}")
-    total_length = sum(len(msg) for role, msg in history if msg is not None)
-    return total_length > self.window_size
+  def is_history_too_long(self, session: SessionHistory):
+    logger.info(f"IS HISTORY TO LONG?: {session.length} characters")
+    return session.length > self.window_size
 
   def sanitize_msg(self, msg: str) -> str:
     return msg.replace("{", "").replace("}", "").replace("\n", " ").replace("\r", " ")
@@ -59,16 +149,12 @@ class SummaryChatHistory():
 
 
   def get_history(self, user_id):
-    namespace = (user_id, "history")
-    history = self.memory.get(namespace, "chat")
-
-    if history is None:
-        history = []
-
-    return history.value
-
-summary_memory = SummaryChatHistory(get_llm(), prompt_manager.get_prompt('trim_chat_history'), window_character_size=200)
-
+    with self._lock:
+      session = self._touch(user_id)
+      self._update_metrics()
+      if session is None:
+        return []
+      return list(session.messages)
 
 if __name__ == "__main__":
   history = SummaryChatHistory(get_llm(), prompt_manager.get_prompt('trim_chat_history'), window_character_size=200)
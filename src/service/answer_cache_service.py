@@ -0,0 +1,153 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+import numpy as np
+
+from src.db.db import get_text_embeddings
+from src.models.router import UserIntentionEnum
+from src.util.env_property import ANSWER_CACHE_ENABLED, \
+  ANSWER_CACHE_SIMILARITY_THRESHOLD, ANSWER_CACHE_MAX_ENTRIES, \
+  ANSWER_CACHE_TTL_NEWS_SECONDS, ANSWER_CACHE_TTL_SHARE_PRICE_SECONDS, \
+  ANSWER_CACHE_TTL_REPORT_SECONDS, ANSWER_CACHE_TTL_OTHER_SECONDS
+from src.util.logger import logger
+from src.util.metrics import metrics
+
+ANSWER_CACHE_LOOKUPS = metrics.counter("answer_cache_lookups_total", "Semantic answer cache lookups by result (hit/miss)", ["intent", "result"])
+ANSWER_CACHE_SECONDS_SAVED = metrics.counter("answer_cache_seconds_saved_total", "Pipeline time skipped thanks to cached answers", ["intent"])
+ANSWER_CACHE_ENTRIES = metrics.gauge("answer_cache_entries", "Answers held by the semantic answer cache")
+ANSWER_CACHE_INVALIDATIONS = metrics.counter("answer_cache_invalidations_total", "Cached answers dropped by reason", ["reason"])
+
+INTENT_TTL_SECONDS = {
+  UserIntentionEnum.NEWS_ABOUT_COMPANY: ANSWER_CACHE_TTL_NEWS_SECONDS,
+  UserIntentionEnum.ANALYSE_SHARE_PRISE: ANSWER_CACHE_TTL_SHARE_PRICE_SECONDS,
+  UserIntentionEnum.COMPANY_INFORMATION_FROM_REPORT: ANSWER_CACHE_TTL_REPORT_SECONDS,
+  UserIntentionEnum.OTHER_FINANCIAL_QUESTIONS: ANSWER_CACHE_TTL_OTHER_SECONDS,
+}
+
+
+def normalize_question(question: str) -> str:
+  question = re.sub(r"[^\w\s]", " ", question.lower())
+  return " ".join(question.split())
+
+
+@dataclass
+class CachedAnswer:
+  intent: UserIntentionEnum
+  tickers: tuple
+  question: str
+  embedding: np.ndarray
+  answer: str
+  pipeline_seconds: float
+  expires_at: float = field(default=0.0)
+
+
+class SemanticAnswerCache:
+  """Answers keyed by (intent, tickers) and matched on the cosine similarity of the normalized question.
+
+  Report answers of a ticker are dropped as soon as that ticker's report is added or deleted.
+  """
+
+  def __init__(self, embeddings=None, similarity_threshold=ANSWER_CACHE_SIMILARITY_THRESHOLD,
+      max_entries=ANSWER_CACHE_MAX_ENTRIES, ttl_seconds=None):
+    self._embeddings = embeddings
+    self.similarity_threshold = similarity_threshold
+    self.max_entries = max_entries
+    self.ttl_seconds = ttl_seconds or INTENT_TTL_SECONDS
+    self._entries: OrderedDict[int, CachedAnswer] = OrderedDict()
+    self._next_id = 0
+    self._lock = threading.Lock()
+
+  @property
+  def embeddings(self):
+    if self._embeddings is None:
+      self._embeddings = get_text_embeddings()
+    return self._embeddings
+
+  def is_cacheable(self, intent) -> bool:
+    return ANSWER_CACHE_ENABLED and self.ttl_seconds.get(intent, 0) > 0
+
+  def embed(self, question: str) -> np.ndarray:
+    vector = np.asarray(self.embeddings.embed_query(normalize_question(question)), dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+  def lookup(self, intent, tickers, question: str):
+    """Returns the cached answer text or None. Embeds the question, so call it off the event loop."""
+    if not self.is_cacheable(intent):
+      return None
+
+    key_tickers = tuple(sorted(t.upper() for t in tickers or []))
+    embedding = self.embed(question)
+
+    with self._lock:
+      self._drop_expired(time.monotonic())
+      best, best_score = None, self.similarity_threshold
+      for entry_id, entry in self._entries.items():
+        if entry.intent != intent or entry.tickers != key_tickers:
+          continue
+        score = float(np.dot(entry.embedding, embedding))
+        if score >= best_score:
+          best, best_score = (entry_id, entry), score
+
+      if best is None:
+        ANSWER_CACHE_LOOKUPS.labels(intent=intent.name, result="miss").inc()
+        return None
+
+      entry_id, entry = best
+      self._entries.move_to_end(entry_id)
+
+    ANSWER_CACHE_LOOKUPS.labels(intent=intent.name, result="hit").inc()
+    ANSWER_CACHE_SECONDS_SAVED.labels(intent=intent.name).inc(entry.pipeline_seconds)
+    logger.info(f"Answer cache hit ({best_score:.3f}) for '{question}' matched '{entry.question}'")
+    return entry.answer
+
+  def store(self, intent, tickers, question: str, answer: str, pipeline_seconds: float = 0.0):
+    if not self.is_cacheable(intent) or not answer:
+      return
+
+    entry = CachedAnswer(
+        intent=intent,
+        tickers=tuple(sorted(t.upper() for t in tickers or [])),
+        question=question,
+        embedding=self.embed(question),
+        answer=answer,
+        pipeline_seconds=pipeline_seconds,
+        expires_at=time.monotonic() + self.ttl_seconds[intent],
+    )
+
+    with self._lock:
+      self._entries[self._next_id] = entry
+      self._next_id += 1
+      while len(self._entries) > self.max_entries:
+        self._entries.popitem(last=False)
+        ANSWER_CACHE_INVALIDATIONS.labels(reason="size").inc()
+      ANSWER_CACHE_ENTRIES.set(len(self._entries))
+
+  def invalidate_ticker(self, ticker: str, intent=UserIntentionEnum.COMPANY_INFORMATION_FROM_REPORT):
+    ticker = ticker.upper()
+    with self._lock:
+      stale = [entry_id for entry_id, entry in self._entries.items() if entry.intent == intent and ticker in entry.tickers]
+      for entry_id in stale:
+        del self._entries[entry_id]
+      ANSWER_CACHE_INVALIDATIONS.labels(reason="ticker").inc(len(stale))
+      ANSWER_CACHE_ENTRIES.set(len(self._entries))
+    if stale:
+      logger.info(f"Answer cache: dropped {len(stale)} {intent.name} answers for {ticker}")
+
+  def clear(self):
+    with self._lock:
+      self._entries.clear()
+      ANSWER_CACHE_ENTRIES.set(0)
+
+  def _drop_expired(self, now):
+    expired = [entry_id for entry_id, entry in self._entries.items() if entry.expires_at <= now]
+    for entry_id in expired:
+      del self._entries[entry_id]
+    if expired:
+      ANSWER_CACHE_INVALIDATIONS.labels(reason="ttl").inc(len(expired))
+      ANSWER_CACHE_ENTRIES.set(len(self._entries))
+
+
+answer_cache = SemanticAnswerCache()
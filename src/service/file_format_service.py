@@ -7,13 +7,17 @@ from src.util.logger import logger
 from docling.document_converter import DocumentConverter
 
 def any_format_to_str(file, content_type):
+  return any_format_to_str_with_pages(file, content_type)[0]
+
+def any_format_to_str_with_pages(file, content_type):
+  """Same as any_format_to_str, also returns how many pages were parsed."""
   if content_type == "text/html":
     # return soup_html_to_text(file)
-    return parse_text_by_docling(file)
+    return parse_text_by_docling_with_pages(file)
   if content_type == "application/pdf":
-    return pdf_to_text(file)
+    return pdf_to_text_with_pages(file)
 
-  return "CAN NOT PROCESS THIS FILE TYPE"
+  return "CAN NOT PROCESS THIS FILE TYPE", 0
 
 def soup_html_to_text(html):
     soup = BeautifulSoup(html, "html.parser")
@@ -21,17 +25,27 @@ def soup_html_to_text(html):
     return text
 
 def pdf_to_text(pdf):
-    loader = PdfReader(BytesIO(pdf))
+    return pdf_to_text_with_pages(pdf)[0]
 
+def pdf_to_text_with_pages(pdf):
     full_text = []
-    for page in loader.pages:
-        text = page.extract_text()
-
+    pages = 0
+    for page_number, text in iter_pdf_pages(pdf):
+        pages = page_number
         if text:
             full_text.append(text)
-    return " ".join(full_text)
+    return " ".join(full_text), pages
+
+def iter_pdf_pages(pdf):
+    """Yields (page number from 1, page text) one page at a time, earlier pages can be freed while later ones are parsed."""
+    loader = PdfReader(BytesIO(pdf) if isinstance(pdf, bytes) else pdf)
+    for page_number, page in enumerate(loader.pages, start=1):
+        yield page_number, page.extract_text() or ""
 
 def parse_text_by_docling(file):
+    return parse_text_by_docling_with_pages(file)[0]
+
+def parse_text_by_docling_with_pages(file):
     converter = DocumentConverter()
     stream = DocumentStream(
         name="uploaded_file",
@@ -40,7 +54,7 @@ def parse_text_by_docling(file):
     )
 
     result = converter.convert(stream)
-    return result.document.export_to_markdown()
+    return result.document.export_to_markdown(), result.document.num_pages()
     # return stream.document.export_to_markdown()
     # return result.document.export_to_text()
     # return result.document.export_to_dict()
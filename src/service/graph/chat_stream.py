@@ -0,0 +1,88 @@
+import asyncio
+import json
+from typing import Any, Optional
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from src.util.logger import logger
+
+# LLM calls tagged with this tag stream their tokens to the /chat/stream/ client
+FINAL_ANSWER_TAG = "final_answer"
+
+
+def content_to_text(content) -> str:
+  if isinstance(content, str):
+    return content
+  if isinstance(content, list):
+    # bedrock converse streams content blocks instead of plain strings
+    return "".join(block.get("text", "") if isinstance(block, dict) else str(block) for block in content)
+  return str(content or "")
+
+
+async def astream_final_answer(chain, inputs: dict) -> str:
+  """Runs the chain in streaming mode so tokens reach the chat stream, returns the joined answer."""
+  chunks = []
+  async for chunk in chain.with_config(tags=[FINAL_ANSWER_TAG]).astream(inputs):
+    chunks.append(content_to_text(getattr(chunk, "content", chunk)))
+  return "".join(chunks)
+
+
+def format_sse(event: dict) -> str:
+  return f"event: {event['event']}\ndata: {json.dumps(event, default=str)}\n\n"
+
+
+class ChatStreamCallbackHandler(BaseCallbackHandler):
+  """Turns LangGraph node runs and final answer tokens into events on an asyncio queue.
+
+  Sub-graphs are invoked from inside route_app nodes, so they inherit this handler through
+  the runnable config context. Callbacks may fire on worker threads, hence call_soon_threadsafe.
+  """
+
+  # cheap and thread safe, so keep event order instead of hopping through an executor
+  run_inline = True
+
+  def __init__(self, queue: asyncio.Queue, loop: asyncio.AbstractEventLoop):
+    self.queue = queue
+    self.loop = loop
+    self._node_runs = {}
+    self._answer_runs = set()
+
+  def emit(self, event: Optional[dict]):
+    self.loop.call_soon_threadsafe(self.queue.put_nowait, event)
+
+  def close(self):
+    self.emit(None)
+
+  def on_chain_start(self, serialized: dict, inputs: Any, *, run_id: UUID, parent_run_id: Optional[UUID] = None,
+      tags: Optional[list] = None, metadata: Optional[dict] = None, **kwargs: Any) -> None:
+    node = (metadata or {}).get("langgraph_node")
+    if node and kwargs.get("name") == node and not node.startswith("__"):
+      self._node_runs[run_id] = node
+      self.emit({"event": "node_start", "node": node})
+
+  def on_chain_end(self, outputs: Any, *, run_id: UUID, **kwargs: Any) -> None:
+    node = self._node_runs.pop(run_id, None)
+    if node:
+      self.emit({"event": "node_end", "node": node})
+
+  def on_chain_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+    node = self._node_runs.pop(run_id, None)
+    if node:
+      logger.warning(f"Chat stream: node {node} failed with {error}")
+      self.emit({"event": "node_error", "node": node, "error": str(error)})
+
+  def on_chat_model_start(self, serialized: dict, messages: Any, *, run_id: UUID, tags: Optional[list] = None, **kwargs: Any) -> None:
+    if tags and FINAL_ANSWER_TAG in tags:
+      self._answer_runs.add(run_id)
+
+  def on_llm_new_token(self, token: str, *, chunk=None, run_id: UUID, **kwargs: Any) -> None:
+    if run_id not in self._answer_runs:
+      return
+    if not token and chunk is not None and getattr(chunk, "message", None) is not None:
+      token = content_to_text(chunk.message.content)
+    if token:
+      self.emit({"event": "token", "text": token})
+
+  def on_llm_end(self, response: Any, *, run_id: UUID, **kwargs: Any) -> None:
+    self._answer_runs.discard(run_id)
@@ -1,3 +1,5 @@
+import asyncio
+
 from langgraph.graph import StateGraph
 from typing_extensions import TypedDict
 from langchain.prompts import ChatPromptTemplate, HumanMessagePromptTemplate, SystemMessagePromptTemplate
@@ -6,6 +8,7 @@ from src.models.mark import ZeroToTenMark
 from src.llm.llm_provider import get_llm
 from src.util.env_property import LLM_SOURCE_REASONING
 from src.util.logger import logger
+from src.service.graph.graph_metrics import graph_metrics_handler
 
 TASK_NODE = "task_node"
 MARK_NODE = "mark_node"
@@ -34,7 +37,7 @@ class ReflectAnswerState(TypedDict):
   final_answer: str | None
 
 
-def task_node(state: ReflectAnswerState) -> ReflectAnswerState:
+async def task_node(state: ReflectAnswerState) -> ReflectAnswerState:
   llm = get_llm()
 
   prompt = ChatPromptTemplate.from_messages([
@@ -43,16 +46,16 @@ def task_node(state: ReflectAnswerState) -> ReflectAnswerState:
 
   chain = prompt | llm
 
-  answer = chain.invoke({"task_role_prompt": state['task_role_prompt'],
+  answer = (await chain.ainvoke({"task_role_prompt": state['task_role_prompt'],
                 "reviews": state['reviews'] if state['reviews'] is not None else "N/A",
                 "task_data_prompt": state['task_data_prompt'],
-                "question_prompt": state['question_prompt']}).content
+                "question_prompt": state['question_prompt']})).content
   state['answers'].append(answer)
   state['iteration'] += 1
   return state
 
-def mark_node(state: ReflectAnswerState) -> ReflectAnswerState:
-  llm = get_llm(specific_source=LLM_SOURCE_REASONING).with_structured_output(ZeroToTenMark)
+async def mark_node(state: ReflectAnswerState) -> ReflectAnswerState:
+  llm = get_llm(specific_source=LLM_SOURCE_REASONING, schema=ZeroToTenMark)
 
   prompt = ChatPromptTemplate.from_messages([
     SystemMessagePromptTemplate.from_template("{mark_role_prompt}"),
@@ -60,7 +63,7 @@ def mark_node(state: ReflectAnswerState) -> ReflectAnswerState:
 
   chain = prompt | llm
 
-  mark: ZeroToTenMark = chain.invoke({
+  mark: ZeroToTenMark = await chain.ainvoke({
     "mark_role_prompt": state['mark_role_prompt'],
     "question": state['question_prompt'],
     "task_data_prompt": state['task_data_prompt'],
@@ -85,7 +88,7 @@ def resolver_node(state: ReflectAnswerState) -> ReflectAnswerState|str:
 
   return REVIEW_NODE
 
-def review_node(state: ReflectAnswerState) -> ReflectAnswerState:
+async def review_node(state: ReflectAnswerState) -> ReflectAnswerState:
   llm = get_llm(specific_source=LLM_SOURCE_REASONING)
 
   prompt = ChatPromptTemplate.from_messages([
@@ -94,11 +97,11 @@ def review_node(state: ReflectAnswerState) -> ReflectAnswerState:
 
   chain = prompt | llm
 
-  review = chain.invoke({
+  review = (await chain.ainvoke({
     "review_role_prompt": state['review_role_prompt'],
     "question": state['question_prompt'],
     "task_data_prompt": state['task_data_prompt'],
-    "test_answer": state['answers'][-1]}).content
+    "test_answer": state['answers'][-1]})).content
 
   state['reviews'].append(review)
   return state
@@ -128,10 +131,10 @@ graph.add_conditional_edges(MARK_NODE, resolver_node, {
 })
 graph.add_edge(REVIEW_NODE, TASK_NODE)
 
-app = graph.compile(debug=True)
+app = graph_metrics_handler.bind(graph.compile(debug=True, name="reflect_answer_graph"))
 
 # todo parametrize prompts should be prompts msgs not strings
-def run_reflect_agent(
+async def arun_reflect_agent(
     question: str,
     task_data_prompt: str,
     task_role_prompt: str,
@@ -161,11 +164,25 @@ def run_reflect_agent(
       final_answer=None
   )
 
-  final_state = app.invoke(initial_state)
+  final_state = await app.ainvoke(initial_state)
   logger.info(final_state)
   return final_state
 
 
+def run_reflect_agent(
+    question: str,
+    task_data_prompt: str,
+    task_role_prompt: str,
+    mark_role_prompt: str,
+    review_role_prompt: str,
+
+    max_iterations: int,
+    accepted_mark: int
+) -> map:
+  return asyncio.run(arun_reflect_agent(question, task_data_prompt, task_role_prompt, mark_role_prompt,
+                                        review_role_prompt, max_iterations, accepted_mark))
+
+
 if __name__ == "__main__":
   # initial_state = ReflectAnswerState(
   #     answers=[],
@@ -1,16 +1,23 @@
 # fixed_subquery_retrieval.py
-from typing import List, Dict, Optional, Any
+import asyncio
+from typing import List, Dict, Optional
 from typing_extensions import TypedDict
 from pydantic import BaseModel, Field
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.messages import HumanMessage, SystemMessage
+from langchain_core.messages import SystemMessage
 from langgraph.graph import StateGraph
 from src.llm.llm_provider import get_llm
 from src.service.file_format_service import soup_html_to_text
-from src.service.query_report_service import base_query_report_question_answer
+from src.service.graph.chat_stream import astream_final_answer
+from src.service.graph.core.near_duplicate_index import NearDuplicateIndex
+from src.service.query_report_service import asearch_report
 from src.usecase.report_uc import save_text_report
 from src.util.prompt_manager import prompt_manager
 from src.util.logger import logger
+from src.service.graph.graph_metrics import graph_metrics_handler
+from src.util.metrics import metrics
+
+DUPLICATE_PASSAGES_DROPPED = metrics.counter("subquery_duplicate_passages_dropped_total", "Retrieved passages dropped as near-duplicates of collected ones")
 
 FETCH_NODE = "FETCH_NODE"
 ANSWER_NODE = "ANSWER_NODE"
@@ -20,6 +27,8 @@ COMPRESS_NODE = "COMPRESS_NODE"
 EVALUATE_CONDITION = "EVALUATE_CONDITION"
 END_NODE = "END_NODE"
 
+LLM_ERROR_ANSWER_PREFIX = "LLM error generating answer"
+
 
 class ComparableAnalysis(BaseModel):
   """A comparable analysis between two answers."""
@@ -49,6 +58,8 @@ class SubqueryRetrievalConfig(TypedDict, total=False):
   # Inner properties
   questions: List[Dict[str, str]]
   all_data: List[str]
+  # simhash index of every passage collected so far, survives compression of all_data
+  seen_passages: NearDuplicateIndex
   original_answer: Optional[str]
 
   last_review: Optional[str]
@@ -69,7 +80,7 @@ class SubqueryRetrievalConfig(TypedDict, total=False):
   final_answer: Optional[str]
 
 
-def generate_synthetic_answer(question: str, prompt: SystemMessage) -> str:
+async def generate_synthetic_answer(question: str, prompt: SystemMessage) -> str:
   llm = get_llm()
   prompt = ChatPromptTemplate.from_messages(
       [
@@ -78,12 +89,12 @@ def generate_synthetic_answer(question: str, prompt: SystemMessage) -> str:
       ]
   )
   chain = prompt | llm
-  return chain.invoke({"question": question}).content
+  return (await chain.ainvoke({"question": question})).content
 
-def fetcher_node(state: SubqueryRetrievalConfig) -> SubqueryRetrievalConfig:
+async def fetcher_node(state: SubqueryRetrievalConfig) -> SubqueryRetrievalConfig:
   if len(state["questions"]) == 0:
 
-    synthetic_answer = generate_synthetic_answer(state['original_question'], state["synthetic_answer_prompt"])
+    synthetic_answer = await generate_synthetic_answer(state['original_question'], state["synthetic_answer_prompt"])
     state["questions"].append({
       "question": state["original_question"],
       "synthetic_answer": synthetic_answer
@@ -95,19 +106,25 @@ def fetcher_node(state: SubqueryRetrievalConfig) -> SubqueryRetrievalConfig:
 
   query = query_to_search + (f" \nEXAMPLE: {synthetic_answer_to_serarch}")
 
-  reports = base_query_report_question_answer(ticker = state["ticker"], query=query, join=False)
+  # one subquestion per iteration, each depends on the review of the previous answer, so there is nothing to batch
+  reports = await asearch_report(state["ticker"], query, join=False)
+
+  if state.get("seen_passages") is None:
+    state["seen_passages"] = NearDuplicateIndex()
 
   data = [d.page_content for d in reports]
-  # append new unique data pieces
+  # append new data pieces, exact and near-duplicates of collected ones are dropped
   for p in data:
-    if p not in state["all_data"]:
+    if state["seen_passages"].add(p):
       state["all_data"].append(p)
+    else:
+      DUPLICATE_PASSAGES_DROPPED.inc()
 
   state['iteration'] += 1
 
   return state
 
-def compress_node(state: SubqueryRetrievalConfig) -> SubqueryRetrievalConfig:
+async def compress_node(state: SubqueryRetrievalConfig) -> SubqueryRetrievalConfig:
   joined_data = "\n\n".join(state["all_data"])
 
   if len(joined_data) >= state["context_threshold"]:
@@ -122,11 +139,11 @@ def compress_node(state: SubqueryRetrievalConfig) -> SubqueryRetrievalConfig:
 
     compressed_data = state["all_data"]
     try:
-      compressed = chain.invoke({
+      compressed = (await chain.ainvoke({
         "question": state["original_question"],
         "data": joined_data,
         "target_length": target_length
-      }).content
+      })).content
       compressed_data = [compressed]
     except Exception as e:
       pass
@@ -136,7 +153,7 @@ def compress_node(state: SubqueryRetrievalConfig) -> SubqueryRetrievalConfig:
   return state
 
 
-def answer_node(state: SubqueryRetrievalConfig) -> SubqueryRetrievalConfig:
+async def answer_node(state: SubqueryRetrievalConfig) -> SubqueryRetrievalConfig:
   llm = get_llm()
 
   prompt = ChatPromptTemplate.from_messages([
@@ -147,19 +164,19 @@ def answer_node(state: SubqueryRetrievalConfig) -> SubqueryRetrievalConfig:
   joined_data = "\n\n".join(state["all_data"])
 
   try:
-    answer_response = chain.invoke({
+    answer_response = await astream_final_answer(chain, {
       "data": joined_data,
       "question": state["original_question"]
-    }).content
+    })
 
   except Exception as e:
-    answer_response = f"LLM error generating answer: {e}"
+    answer_response = f"{LLM_ERROR_ANSWER_PREFIX}: {e}"
 
   state["original_answer"] = answer_response
   return state
 
-def evaluator_node(state: SubqueryRetrievalConfig) -> SubqueryRetrievalConfig:
-  llm = get_llm().with_structured_output(ComparableAnalysis)
+async def evaluator_node(state: SubqueryRetrievalConfig) -> SubqueryRetrievalConfig:
+  llm = get_llm(schema=ComparableAnalysis)
 
   synthetic = state["questions"][0]["synthetic_answer"]
   actual = state["original_answer"]
@@ -170,7 +187,7 @@ def evaluator_node(state: SubqueryRetrievalConfig) -> SubqueryRetrievalConfig:
   ])
   chain = prompt | llm
   try:
-    analysis: ComparableAnalysis = chain.invoke({
+    analysis: ComparableAnalysis = await chain.ainvoke({
       "question": state["original_question"],
       "synth": synthetic,
       "actual": actual
@@ -202,8 +219,8 @@ def evaluator_condition(state: SubqueryRetrievalConfig) -> str:
 
   return END_NODE
 
-def subquery_node(state: SubqueryRetrievalConfig) -> SubqueryRetrievalConfig:
-  llm = get_llm().with_structured_output(SubQuestion)
+async def subquery_node(state: SubqueryRetrievalConfig) -> SubqueryRetrievalConfig:
+  llm = get_llm(schema=SubQuestion)
 
   prompt = ChatPromptTemplate.from_messages([
     (state["subquery_prompt"]),
@@ -212,12 +229,12 @@ def subquery_node(state: SubqueryRetrievalConfig) -> SubqueryRetrievalConfig:
   chain = prompt | llm
   already = " || ".join(q["question"] for q in state["questions"])
 
-  subq_result:SubQuestion = chain.invoke({
+  subq_result:SubQuestion = await chain.ainvoke({
     "original_question": state["original_question"],
     "already": already
   })
 
-  synthetic_answert = generate_synthetic_answer(subq_result.subquestion, state["synthetic_answer_prompt"])
+  synthetic_answert = await generate_synthetic_answer(subq_result.subquestion, state["synthetic_answer_prompt"])
   state["questions"].append({
     "question": subq_result.subquestion,
     "synthetic_answer": synthetic_answert
@@ -251,10 +268,10 @@ graph.add_conditional_edges(EVALUATOR_NODE, evaluator_condition, {
 
 graph.add_edge(SUBQUERY_NODE, FETCH_NODE)
 
-app = graph.compile(debug=True)
+app = graph_metrics_handler.bind(graph.compile(debug=True, name="subquery_retrieval_graph"))
 
 
-def run_subquery_search_in_report(ticker: str, question: str) -> str:
+async def arun_subquery_search_in_report(ticker: str, question: str) -> str:
   initial_state: SubqueryRetrievalConfig = {
   "ticker": ticker,
   "original_question": question,
@@ -265,6 +282,7 @@ def run_subquery_search_in_report(ticker: str, question: str) -> str:
 
   "questions": [],
   "all_data": [],
+  "seen_passages": NearDuplicateIndex(),
 
   "max_iterations": 3,
   "min_iterations": 0,
@@ -280,14 +298,18 @@ def run_subquery_search_in_report(ticker: str, question: str) -> str:
   "final_answer": None
 }
 
-  final_state = app.invoke(initial_state)
+  final_state = await app.ainvoke(initial_state)
   logger.info("\n=== FINAL STATE ===")
   logger.info(final_state)
   return final_state['final_answer']
 
 
+def run_subquery_search_in_report(ticker: str, question: str) -> str:
+  return asyncio.run(arun_subquery_search_in_report(ticker, question))
 
-def run_subquery_search_in_report_full_state(ticker: str, question: str) -> dict:
+
+
+async def arun_subquery_search_in_report_full_state(ticker: str, question: str) -> dict:
   initial_state: SubqueryRetrievalConfig = {
     "ticker": ticker,
     "original_question": question,
@@ -298,6 +320,7 @@ def run_subquery_search_in_report_full_state(ticker: str, question: str) -> dict
 
     "questions": [],
     "all_data": [],
+    "seen_passages": NearDuplicateIndex(),
 
     "max_iterations": 1,
     "min_iterations": 0,
@@ -314,12 +337,16 @@ def run_subquery_search_in_report_full_state(ticker: str, question: str) -> dict
     "final_answer": None
   }
 
-  final_state = app.invoke(initial_state)
+  final_state = await app.ainvoke(initial_state)
   logger.info("\n=== FINAL STATE ===")
   logger.info(final_state)
   return final_state
 
 
+def run_subquery_search_in_report_full_state(ticker: str, question: str) -> dict:
+  return asyncio.run(arun_subquery_search_in_report_full_state(ticker, question))
+
+
 if __name__ == "__main__":
 
   # import os
@@ -351,6 +378,7 @@ if __name__ == "__main__":
 
     "questions": [],
     "all_data": [],
+    "seen_passages": NearDuplicateIndex(),
 
     "max_iterations": 3,
     "min_iterations": 0,
@@ -367,7 +395,7 @@ if __name__ == "__main__":
     "final_answer": None
   }
   #
-  final_state = app.invoke(initial_state)
+  final_state = asyncio.run(app.ainvoke(initial_state))
   logger.info("\n=== FINAL STATE ===")
   logger.info(final_state)
   logger.info(app.get_graph().draw_mermaid())
@@ -1,13 +1,15 @@
+import asyncio
+
 from langchain_core.prompts import ChatPromptTemplate
 from langgraph.graph import StateGraph
 from pydantic import BaseModel, Field
 
 from src.service.file_format_service import soup_html_to_text
-from src.service.graph.core.reflect_answer_graph import run_reflect_agent
-from src.service.thirdparty.news.finhub_news_service import fetch_company_news
+from src.service.graph.core.reflect_answer_graph import arun_reflect_agent
+from src.service.query_report_service import asearch_report_per_ticker
+from src.service.thirdparty.news.finhub_news_service import afetch_company_news
 from src.service.thirdparty.stock_price_change_service import \
-  get_price_change_for_tickers
-from src.tools.tools import report_rephrase_retriever_search
+  aget_price_change_for_tickers
 from typing_extensions import TypedDict
 import os
 from src.llm import llm_provider
@@ -15,6 +17,7 @@ from src.usecase.report_uc import save_text_report
 from src.util.env_property import LLM_SOURCE_REASONING
 from src.util.prompt_manager import prompt_manager
 from src.util.logger import logger
+from src.service.graph.graph_metrics import graph_metrics_handler
 
 REASON_PROMPT = prompt_manager.get_prompt('stock_fall_explanation_uc_logic')
 
@@ -101,8 +104,8 @@ class GraphFallExplainState(TypedDict):
   company_fall_explanation: list[CompanyFallExplanation] | None
   answer: str | None
 
-def collect_fall_change_tickers(state: GraphFallExplainState) -> GraphFallExplainState:
-  ticker_to_change_map = get_price_change_for_tickers(state["tickers_to_check"])
+async def collect_fall_change_tickers(state: GraphFallExplainState) -> GraphFallExplainState:
+  ticker_to_change_map = await aget_price_change_for_tickers(state["tickers_to_check"])
   for ticker in state["tickers_to_check"]:
     change = ticker_to_change_map[ticker]
     if change < 0:
@@ -112,8 +115,8 @@ def collect_fall_change_tickers(state: GraphFallExplainState) -> GraphFallExplai
 
       state['company_fall_explanation'] = state.get('company_fall_explanation', []) + [company_fall_explanation]
 
-  for fall_company in state['company_fall_explanation']:
-    news = fetch_company_news(fall_company['ticker'])
+  all_news = await asyncio.gather(*[afetch_company_news(fall_company['ticker']) for fall_company in state['company_fall_explanation']])
+  for fall_company, news in zip(state['company_fall_explanation'], all_news):
     # news = news_mock
     fall_company['news'] = news
   logger.info("Tickers with significant fall:", state['company_fall_explanation'])
@@ -123,69 +126,73 @@ def collect_fall_change_tickers(state: GraphFallExplainState) -> GraphFallExplai
       fall_company['verdict'] = "No news found to explain the stock price fall."
       fall_company['finished'] = True
 
-  for fall_company in state['company_fall_explanation']:
-    if 'finished' not in fall_company:
-      query = f"List the risk factors mentioned in the latest financial report. Provide a concise summary of each risk factor for share stock prise. With given score of impact for each risk  factor by yourself using reasonong. "
-      response = report_rephrase_retriever_search(fall_company['ticker'], query)['answer']
-      fall_company['report_risk_factors'] = response
+  companies_to_check = [fall_company for fall_company in state['company_fall_explanation'] if 'finished' not in fall_company]
+  query = f"List the risk factors mentioned in the latest financial report. Provide a concise summary of each risk factor for share stock prise. With given score of impact for each risk  factor by yourself using reasonong. "
+  # the shared query is embedded once and every ticker's partition is searched with that vector
+  responses = await asearch_report_per_ticker([fall_company['ticker'] for fall_company in companies_to_check], [query])
+  for fall_company in companies_to_check:
+    fall_company['report_risk_factors'] = responses[fall_company['ticker']][0]
 
   return state
 
 
+async def explain_company_fall(company_explanation: CompanyFallExplanation) -> CompanyFallExplanation:
+  data = ""
+  data += f"Ticker: {company_explanation['ticker']}\n"
+  data += f"Share price change: {company_explanation['change']}%\n"
+  data += f"Report Risk Factors: {company_explanation.get('report_risk_factors', 'No data')}\n"
+  if 'news' in company_explanation and company_explanation['news'] and len(company_explanation['news']) > 0:
+    news_summaries = [f"- {news_item['headline']}\n{news_item['text']}" for news_item in company_explanation['news']]
+    data += "Recent News that can be relevant and can affect the price:\n" + "\n".join(news_summaries) + "\n"
+  else:
+    data += "No relevant news found.\n"
+
+  reflect_state = await arun_reflect_agent(
+  question = REFLECT_QUESTION,
+  task_data_prompt = data,
+  task_role_prompt = TASK_ROLE_PROMPT,
+  mark_role_prompt = MARK_ROLE_PROMPT,
+  review_role_prompt = REVIEW_ROLE_PROMPT,
+
+  max_iterations = 3,
+  accepted_mark = 8
+  )
 
-def generate_verdict_node(state: GraphFallExplainState) -> GraphFallExplainState:
-  logger.info("VERDICT NODE")
-
-  for idx, company_explanation in enumerate(state['company_fall_explanation']):
-    if company_explanation.get('finished'):
-      continue
-
-    data = ""
-    data += f"Ticker: {company_explanation['ticker']}\n"
-    data += f"Share price change: {company_explanation['change']}%\n"
-    data += f"Report Risk Factors: {company_explanation.get('report_risk_factors', 'No data')}\n"
-    if 'news' in company_explanation and company_explanation['news'] and len(company_explanation['news']) > 0:
-      news_summaries = [f"- {news_item['headline']}\n{news_item['text']}" for news_item in company_explanation['news']]
-      data += "Recent News that can be relevant and can affect the price:\n" + "\n".join(news_summaries) + "\n"
-    else:
-      data += "No relevant news found.\n"
-
-    reflect_state = run_reflect_agent(
-    question = REFLECT_QUESTION,
-    task_data_prompt = data,
-    task_role_prompt = TASK_ROLE_PROMPT,
-    mark_role_prompt = MARK_ROLE_PROMPT,
-    review_role_prompt = REVIEW_ROLE_PROMPT,
-
-    max_iterations = 3,
-    accepted_mark = 8
-    )
-
-    llm = llm_provider.get_llm(specific_source=LLM_SOURCE_REASONING).with_structured_output(NegativeFiveToFiveMark)
-    prompt = ChatPromptTemplate.from_messages([
-        ("system", REASON_PROMPT),
-        ("human", """
+  llm = llm_provider.get_llm(specific_source=LLM_SOURCE_REASONING, schema=NegativeFiveToFiveMark)
+  prompt = ChatPromptTemplate.from_messages([
+      ("system", REASON_PROMPT),
+      ("human", """
           Ticker: {ticker}
           Change: {change}%
           Analytical summary: {analytical_summary}
 
           Please provide a verdict in a mark form if I should buy the stock share right now or not.
           """)
-      ])
+    ])
+
+  chain = prompt | llm
+
+  response: NegativeFiveToFiveMark = await chain.ainvoke({
+    "ticker": company_explanation['ticker'],
+    "change": company_explanation['change'],
+    "analytical_summary": reflect_state['final_answer']
+  })
 
-    chain = prompt | llm
+  company_explanation['verdict_type'] = response.mark
+  company_explanation['verdict'] = response.reasoning
+  company_explanation['reasoning'] = reflect_state['final_answer']
+  company_explanation['reflection_state'] = reflect_state
+  company_explanation['finished'] = True
+  return company_explanation
 
-    response: NegativeFiveToFiveMark = chain.invoke({
-      "ticker": company_explanation['ticker'],
-      "change": company_explanation['change'],
-      "analytical_summary": reflect_state['final_answer']
-    })
 
-    state['company_fall_explanation'][idx]['verdict_type'] = response.mark
-    state['company_fall_explanation'][idx]['verdict'] = response.reasoning
-    state['company_fall_explanation'][idx]['reasoning'] = reflect_state['final_answer']
-    state['company_fall_explanation'][idx]['reflection_state'] = reflect_state
-    state['company_fall_explanation'][idx]['finished'] = True
+async def generate_verdict_node(state: GraphFallExplainState) -> GraphFallExplainState:
+  logger.info("VERDICT NODE")
+
+  # every ticker is reviewed independently, run their reflection loops side by side
+  await asyncio.gather(*[explain_company_fall(company_explanation)
+                         for company_explanation in state['company_fall_explanation']
+                         if not company_explanation.get('finished')])
 
   return state
 
@@ -231,20 +238,24 @@ graph.add_edge(COLLECT_FALL_TICKERS_NODE, GENERATE_VERDICT_NODE)
 graph.add_edge(GENERATE_VERDICT_NODE, GENERATE_MSG_NODE)
 
 
-app = graph.compile(debug=True)
+app = graph_metrics_handler.bind(graph.compile(debug=True, name="fall_explanation_graph"))
 
 
-def run_company_fall_explanation_graph(tickers: list[str]) -> GraphFallExplainState:
+async def arun_company_fall_explanation_graph(tickers: list[str]) -> GraphFallExplainState:
   initial_state = GraphFallExplainState(
       tickers_to_check=tickers,
       company_fall_explanation=[],
       answer=None
   )
 
-  final_state = app.invoke(initial_state)
+  final_state = await app.ainvoke(initial_state)
   logger.info("Final State:", final_state)
   return final_state['answer']
 
+
+def run_company_fall_explanation_graph(tickers: list[str]) -> GraphFallExplainState:
+  return asyncio.run(arun_company_fall_explanation_graph(tickers))
+
 if __name__ == "__main__":
   # # with open("/Users/ibahr/Downloads/synthetic_report.pdf", "rb") as f:
   # # with open("/Users/ibahr/Desktop/reports/UBER.html", "rb") as f:
@@ -296,7 +307,7 @@ if __name__ == "__main__":
   )
 
 
-  final_state = app.invoke(initial_state)
+  final_state = asyncio.run(app.ainvoke(initial_state))
   logger.info(f"Final State: {final_state}")
   # logger.info(final_state['final_answer'])
 
@@ -0,0 +1,81 @@
+import threading
+import time
+from typing import Any, Optional
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from src.util.metrics import metrics
+
+GRAPH_NODE_SECONDS = metrics.histogram("graph_node_seconds", "Latency of LangGraph nodes", ["graph", "node"])
+GRAPH_NODE_ERRORS = metrics.counter("graph_node_errors_total", "LangGraph node runs that raised", ["graph", "node"])
+GRAPH_RUN_SECONDS = metrics.histogram("graph_run_seconds", "Latency of whole LangGraph runs", ["graph"])
+
+
+class GraphMetricsCallbackHandler(BaseCallbackHandler):
+  """Times every node of the named graphs.
+
+  Sub-graphs run inside route_app nodes and inherit its callbacks, so each compiled graph is
+  bound to this same instance; runs seen twice through that inheritance are counted once.
+  """
+
+  run_inline = True
+
+  def __init__(self):
+    self.graph_names = set()
+    self._runs = {}
+    self._parents = {}
+    self._lock = threading.Lock()
+
+  def bind(self, compiled_graph):
+    self.graph_names.add(compiled_graph.name)
+    return compiled_graph.with_config(callbacks=[self])
+
+  def _graph_of(self, run_id: Optional[UUID]) -> Optional[str]:
+    while run_id is not None:
+      run = self._runs.get(run_id)
+      if run is not None and run[0] == "graph":
+        return run[1]
+      run_id = self._parents.get(run_id)
+    return None
+
+  def on_chain_start(self, serialized: dict, inputs: Any, *, run_id: UUID, parent_run_id: Optional[UUID] = None,
+      tags: Optional[list] = None, metadata: Optional[dict] = None, **kwargs: Any) -> None:
+    name = kwargs.get("name")
+    node = (metadata or {}).get("langgraph_node")
+    with self._lock:
+      if run_id in self._parents:
+        return
+      self._parents[run_id] = parent_run_id
+      if name in self.graph_names:
+        self._runs[run_id] = ("graph", name, time.perf_counter())
+      elif node and name == node and not node.startswith("__"):
+        self._runs[run_id] = ("node", node, time.perf_counter())
+
+  def _finish(self, run_id: UUID, failed: bool):
+    with self._lock:
+      run = self._runs.get(run_id)
+      graph = self._graph_of(self._parents.get(run_id)) if run is not None and run[0] == "node" else None
+      self._runs.pop(run_id, None)
+      self._parents.pop(run_id, None)
+    if run is None:
+      return
+
+    kind, name, start_time = run
+    elapsed = time.perf_counter() - start_time
+    if kind == "graph":
+      GRAPH_RUN_SECONDS.labels(graph=name).observe(elapsed)
+      return
+    graph = graph or "unknown"
+    GRAPH_NODE_SECONDS.labels(graph=graph, node=name).observe(elapsed)
+    if failed:
+      GRAPH_NODE_ERRORS.labels(graph=graph, node=name).inc()
+
+  def on_chain_end(self, outputs: Any, *, run_id: UUID, **kwargs: Any) -> None:
+    self._finish(run_id, failed=False)
+
+  def on_chain_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+    self._finish(run_id, failed=True)
+
+
+graph_metrics_handler = GraphMetricsCallbackHandler()
@@ -0,0 +1,33 @@
+import json
+from pathlib import Path
+
+from src.db.db import get_text_embeddings, get_db_client
+from src.models.router import UserIntentionEnum
+from src.service.graph.intent_knn import IntentExampleBank, IntentFastPath, TickerExtractor
+from src.util.prompt_manager import prompt_manager
+
+EXAMPLES_PATH = Path(__file__).parent.parent.parent.parent / "resources" / "intent_examples" / "intent_examples.json"
+
+# the route prompts describe each intent with keywords, they seed the example bank next to the labelled questions
+ROUTE_PROMPTS = {
+  "company_news_route": UserIntentionEnum.NEWS_ABOUT_COMPANY,
+  "company_price_fall_route": UserIntentionEnum.ANALYSE_SHARE_PRISE,
+  "fin_report_route": UserIntentionEnum.COMPANY_INFORMATION_FROM_REPORT,
+  "other_financial_route": UserIntentionEnum.OTHER_FINANCIAL_QUESTIONS,
+}
+
+
+def load_intent_examples(path: Path = EXAMPLES_PATH) -> dict:
+  with open(path, "r", encoding="utf-8") as f:
+    return json.load(f)
+
+
+def build_intent_fast_path() -> IntentFastPath:
+  data = load_intent_examples()
+  examples = [(example["query"], UserIntentionEnum.from_str(example["intention"])) for example in data["examples"]]
+  examples += [(prompt_manager.get_prompt(prompt), intent) for prompt, intent in ROUTE_PROMPTS.items()]
+  extractor = TickerExtractor(data["known_tickers"], extra_tickers_fn=lambda: get_db_client().get_existing_reports())
+  return IntentFastPath(IntentExampleBank(examples, embeddings_fn=get_text_embeddings), extractor)
+
+
+intent_fast_path = build_intent_fast_path()
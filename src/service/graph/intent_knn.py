@@ -0,0 +1,115 @@
+import re
+import threading
+from collections import defaultdict
+from typing import Callable, List
+
+import numpy as np
+
+from src.models.router import RouterDto, UserIntentionEnum
+from src.util.env_property import INTENT_KNN_K, INTENT_KNN_MIN_SIMILARITY, \
+  INTENT_KNN_MIN_VOTE
+from src.util.logger import logger
+
+TICKER_INTENTS = {
+  UserIntentionEnum.NEWS_ABOUT_COMPANY,
+  UserIntentionEnum.COMPANY_INFORMATION_FROM_REPORT,
+  UserIntentionEnum.ANALYSE_SHARE_PRISE,
+}
+
+IMAGE_PATTERN = re.compile(r"\b(image|images|picture|pictures|photo|chart|charts|graph|graphs|plot|diagram|visual\w*)\b", re.IGNORECASE)
+
+
+class TickerExtractor:
+  """Explicit ticker symbols only, like the LLM classifier: "ticker AAPL", "$AAPL", "(AAPL)" or a known symbol in capitals.
+
+  Company names are never mapped to tickers. Known symbols of one or two letters ("MA", "T", "V") are
+  words or abbreviations as often as tickers, they only count with a "ticker", "$" or parenthesised cue.
+  """
+
+  EXPLICIT_PATTERN = re.compile(r"(?i:\bticker[s]?)\s*[:=]?\s*([A-Z]{1,5}(?:\.[A-Z])?)\b|\$([A-Za-z]{1,5}(?:\.[A-Za-z])?)\b")
+  PARENTHESISED_PATTERN = re.compile(r"\(([A-Z]{1,5}(?:\.[A-Z])?)\)")
+  SYMBOL_PATTERN = re.compile(r"(?<![\w$.(])([A-Z]{1,5}(?:\.[A-Z])?)(?![\w)])")
+  MIN_BARE_SYMBOL_LENGTH = 3
+
+  def __init__(self, known_tickers: List[str], extra_tickers_fn: Callable[[], set] = None):
+    self.known_tickers = {t.upper() for t in known_tickers}
+    self.extra_tickers_fn = extra_tickers_fn
+
+  def _known(self) -> set:
+    known = self.known_tickers
+    if self.extra_tickers_fn is not None:
+      try:
+        known = known | {t.upper() for t in self.extra_tickers_fn()}
+      except Exception as e:
+        logger.warning(f"Ticker extractor: could not read stored tickers: {e}")
+    return known
+
+  def extract(self, message: str) -> List[str]:
+    tickers = [(named or dollar).upper() for named, dollar in self.EXPLICIT_PATTERN.findall(message)]
+    known = self._known()
+    tickers += [match for match in self.PARENTHESISED_PATTERN.findall(message) if match in known]
+    # in a message written in capitals every word looks like a symbol, only cued tickers are taken
+    if any(char.islower() for char in message):
+      tickers += [match for match in self.SYMBOL_PATTERN.findall(message)
+                  if match in known and len(match) >= self.MIN_BARE_SYMBOL_LENGTH]
+    return list(dict.fromkeys(tickers))[:5]
+
+
+class IntentExampleBank:
+  """Labelled questions embedded once, messages are classified by a similarity weighted vote of their k nearest examples."""
+
+  def __init__(self, examples: List[tuple], embeddings_fn: Callable, k: int = INTENT_KNN_K):
+    self.examples = examples
+    self.embeddings_fn = embeddings_fn
+    self.k = k
+    self._matrix = None
+    self._lock = threading.Lock()
+
+  def _get_matrix(self) -> np.ndarray:
+    if self._matrix is None:
+      with self._lock:
+        if self._matrix is None:
+          vectors = np.asarray(self.embeddings_fn().embed_documents([query for query, _ in self.examples]), dtype=np.float32)
+          self._matrix = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    return self._matrix
+
+  def classify(self, message: str):
+    """Returns (intent, top similarity, vote share of the intent among the k neighbours)."""
+    matrix = self._get_matrix()
+    query = np.asarray(self.embeddings_fn().embed_query(message), dtype=np.float32)
+    similarities = matrix @ (query / np.linalg.norm(query))
+
+    nearest = np.argsort(-similarities)[:self.k]
+    votes = defaultdict(float)
+    for index in nearest:
+      votes[self.examples[index][1]] += max(float(similarities[index]), 0.0)
+    intent = max(votes, key=votes.get)
+    total = sum(votes.values())
+    vote_share = votes[intent] / total if total > 0 else 0.0
+    return intent, float(similarities[nearest[0]]), vote_share
+
+
+class IntentFastPath:
+  """First tier of the intent router, answers confident messages without the LLM classifier."""
+
+  def __init__(self, example_bank: IntentExampleBank, ticker_extractor: TickerExtractor,
+      min_similarity: float = INTENT_KNN_MIN_SIMILARITY, min_vote: float = INTENT_KNN_MIN_VOTE):
+    self.example_bank = example_bank
+    self.ticker_extractor = ticker_extractor
+    self.min_similarity = min_similarity
+    self.min_vote = min_vote
+
+  def classify(self, message: str):
+    """Returns (RouterDto or None, fallback reason or None)."""
+    intent, similarity, vote_share = self.example_bank.classify(message)
+    if similarity < self.min_similarity:
+      return None, "low_similarity"
+    if vote_share < self.min_vote:
+      return None, "ambiguous"
+
+    tickers = self.ticker_extractor.extract(message)
+    # the ticker may come from the conversation history, which only the LLM classifier reads
+    if intent in TICKER_INTENTS and not tickers:
+      return None, "no_ticker"
+
+    return RouterDto(ticker=tickers, intention=intent, image_wanted=bool(IMAGE_PATTERN.search(message))), None
@@ -1,11 +1,23 @@
+import time
+
 from langchain_core.prompts import ChatPromptTemplate
 
 from src.llm.llm_provider import get_llm
 from src.models.router import RouterDto
+from src.service.graph.intent_fast_path import intent_fast_path
+from src.util.env_property import INTENT_FAST_PATH_ENABLED
+from src.util.executor import run_blocking
+from src.util.logger import logger
+from src.util.metrics import metrics
 from src.util.prompt_manager import prompt_manager
 
-def classify_intent_with_prompt(state):
-  router_chain = get_llm().with_structured_output(RouterDto)
+INTENT_ROUTER_REQUESTS = metrics.counter("intent_router_requests_total", "Classified chat messages by the router tier that answered", ["tier"])
+INTENT_ROUTER_FALLBACKS = metrics.counter("intent_router_fallbacks_total", "Messages passed from the kNN tier to the LLM classifier", ["reason"])
+INTENT_ROUTER_SECONDS = metrics.histogram("intent_router_seconds", "Intent classification latency per tier", ["tier"])
+INTENT_ROUTER_SECONDS_SAVED = metrics.counter("intent_router_seconds_saved_total", "LLM classifier time skipped by the kNN tier, against the running LLM average")
+
+def build_classify_intent_chain(state):
+  router_chain = get_llm(schema=RouterDto)
   route_prompt = prompt_manager.get_prompt("classify_intent")
 
   user_message = ""
@@ -20,6 +32,63 @@ def classify_intent_with_prompt(state):
     ("system", route_prompt),
     ("user", user_message)
   ])
-  chain = prompt | router_chain
-  user_intention = chain.invoke({})
+  return prompt | router_chain
+
+def classify_intent_with_prompt(state):
+  user_intention = build_classify_intent_chain(state).invoke({})
   return user_intention
+
+async def aclassify_intent_with_prompt(state):
+  user_intention = await build_classify_intent_chain(state).ainvoke({})
+  return user_intention
+
+
+class TieredIntentClassifier:
+  """kNN over labelled examples first, the structured output LLM call only for messages the kNN tier is not sure about."""
+
+  # weight of the latest LLM call in the running average used to estimate saved time
+  LLM_LATENCY_SMOOTHING = 0.1
+
+  def __init__(self, fast_path=intent_fast_path, enabled: bool = INTENT_FAST_PATH_ENABLED):
+    self.fast_path = fast_path
+    self.enabled = enabled
+    self.llm_seconds_average = None
+
+  def _observe_llm(self, seconds: float):
+    if self.llm_seconds_average is None:
+      self.llm_seconds_average = seconds
+    else:
+      self.llm_seconds_average += self.LLM_LATENCY_SMOOTHING * (seconds - self.llm_seconds_average)
+
+  async def aclassify(self, state):
+    if self.enabled:
+      start_time = time.perf_counter()
+      try:
+        # the sentence transformer is blocking
+        user_intention, reason = await run_blocking(self.fast_path.classify, state["user_message"])
+      except Exception as e:
+        logger.warning(f"Intent kNN tier failed, using the LLM classifier: {e}")
+        user_intention, reason = None, "error"
+      elapsed = time.perf_counter() - start_time
+
+      if user_intention is not None:
+        INTENT_ROUTER_REQUESTS.labels(tier="knn").inc()
+        INTENT_ROUTER_SECONDS.labels(tier="knn").observe(elapsed)
+        if self.llm_seconds_average is not None:
+          INTENT_ROUTER_SECONDS_SAVED.inc(max(self.llm_seconds_average - elapsed, 0.0))
+        return user_intention
+      INTENT_ROUTER_FALLBACKS.labels(reason=reason).inc()
+
+    start_time = time.perf_counter()
+    user_intention = await aclassify_intent_with_prompt(state)
+    elapsed = time.perf_counter() - start_time
+    self._observe_llm(elapsed)
+    INTENT_ROUTER_REQUESTS.labels(tier="llm").inc()
+    INTENT_ROUTER_SECONDS.labels(tier="llm").observe(elapsed)
+    return user_intention
+
+
+tiered_intent_classifier = TieredIntentClassifier()
+
+async def aclassify_intent(state):
+  return await tiered_intent_classifier.aclassify(state)
@@ -1,15 +1,18 @@
+import asyncio
 import json
 
 from langchain_core.prompts import ChatPromptTemplate
 from langgraph.graph import StateGraph
 from pydantic import BaseModel, Field
 
-from src.service.thirdparty.news.finhub_news_service import fetch_company_news
+from src.service.graph.chat_stream import astream_final_answer
+from src.service.thirdparty.news.finhub_news_service import afetch_company_news
 from src.tools.tools import search_company_news
 from typing_extensions import TypedDict, Literal
 from src.util.logger import logger
 
 from src.llm import llm_provider
+from src.service.graph.graph_metrics import graph_metrics_handler
 #
 # mock = [
 #   {
@@ -74,16 +77,16 @@ class NewsGraphReflectionState(TypedDict):
   answer: str | None
 
 
-def act_node(state: NewsGraphReflectionState) -> NewsGraphReflectionState:
+async def act_node(state: NewsGraphReflectionState) -> NewsGraphReflectionState:
   logger.info(f"ACT NODE - Step {state['counter'] + 1}")
-  news_list = fetch_company_news(state['ticker'])
+  news_list = await afetch_company_news(state['ticker'])
 
   state['counter'] += 1
   state['relevant_news'].extend(news_list)
   return state
 
 
-def reflect_node(state: NewsGraphReflectionState) -> NewsGraphReflectionState:
+async def reflect_node(state: NewsGraphReflectionState) -> NewsGraphReflectionState:
   logger.info(f"REFLECT NODE - Step {state['counter'] + 1}")
 
   """Condition to reflect and decide next action."""
@@ -99,20 +102,23 @@ def reflect_node(state: NewsGraphReflectionState) -> NewsGraphReflectionState:
     """),
     ("user", "USER QUERY: {input}\n\nNEWS ARTICLE: {news_article}")
   ])
-  llm = llm_provider.get_llm().with_structured_output(ArticleRelevance)
+  llm = llm_provider.get_llm(schema=ArticleRelevance)
 
   chain = news_prompt | llm
 
 
-  for news in news_list:
-    article_text_for_llm = f"HEADLINE: {news['headline']}  SUMMARY: {news['summary']} ARTICLE TEXT: {news['text']}"
-    article_relevance: ArticleRelevance = chain.invoke({"input": str(state['input_query']), "news_article": article_text_for_llm})
+  # articles are scored independently, so score them concurrently
+  inputs = [{"input": str(state['input_query']),
+             "news_article": f"HEADLINE: {news['headline']}  SUMMARY: {news['summary']} ARTICLE TEXT: {news['text']}"}
+            for news in news_list]
+  relevances: list[ArticleRelevance] = await asyncio.gather(*[chain.ainvoke(item) for item in inputs])
+  for news, article_relevance in zip(news_list, relevances):
     news['relevance_score'] = article_relevance.relevance_score
 
   return state
 
 
-def summary_node(state: NewsGraphReflectionState) -> NewsGraphReflectionState:
+async def summary_node(state: NewsGraphReflectionState) -> NewsGraphReflectionState:
   logger.info(f"SUMMARY NODE - Step {state['counter'] + 1}")
 
   """Condition to summarize the findings."""
@@ -135,9 +141,9 @@ def summary_node(state: NewsGraphReflectionState) -> NewsGraphReflectionState:
 
   relevant_news_str = "\n".join([f"HEADLINE: {news['headline']} SUMMARY: {news['summary']} ARTICLE TEXT: {news['text']}" for news in relevant_news])
 
-  summary = chain.invoke({"input": str(state['input_query']), "relevant_news": relevant_news_str})
+  summary = await astream_final_answer(chain, {"input": str(state['input_query']), "relevant_news": relevant_news_str})
 
-  state['summary'] = summary.content
+  state['summary'] = summary
   state['end_reason'] = f"Summary of relevant news articles provided"
 
   return state
@@ -171,9 +177,9 @@ graph.add_edge(ACT_NODE, REFLECT_NODE)
 graph.add_edge(REFLECT_NODE, SUMMARY_NODE)
 graph.add_edge(SUMMARY_NODE, END_NODE)
 
-app = graph.compile(debug=True)
+app = graph_metrics_handler.bind(graph.compile(debug=True, name="news_summary_graph"))
 
-def run_news_graph(ticker, query) -> NewsGraphReflectionState:
+async def arun_news_graph(ticker, query) -> NewsGraphReflectionState:
   initial_state = NewsGraphReflectionState(
       counter=0,
       ticker=ticker,
@@ -184,10 +190,13 @@ def run_news_graph(ticker, query) -> NewsGraphReflectionState:
       end_reason=None
   )
 
-  final_state = app.invoke(initial_state)
+  final_state = await app.ainvoke(initial_state)
   logger.info(final_state)
   return final_state['answer']
 
+def run_news_graph(ticker, query) -> NewsGraphReflectionState:
+  return asyncio.run(arun_news_graph(ticker, query))
+
 if __name__ == "__main__":
 
   logger.info(app.get_graph().draw_mermaid())
@@ -203,5 +212,5 @@ if __name__ == "__main__":
       end_reason=None
   )
 
-  final_state = app.invoke(initial_state)
+  final_state = asyncio.run(app.ainvoke(initial_state))
   logger.info("Final State:", final_state)
@@ -7,7 +7,7 @@ from pydantic import BaseModel, Field
 from src.util.logger import logger
 
 
-from src.tools.tools import report_rephrase_retriever_search, search_in_report
+from src.tools.tools import search_in_report
 from torch.sparse import addmm
 from typing_extensions import TypedDict, Literal
 
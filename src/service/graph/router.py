@@ -1,10 +1,42 @@
+import asyncio
+
+from src.service.graph.chat_stream import ChatStreamCallbackHandler, format_sse
 from src.service.graph.router_graph import route_app, RouterState
 from src.util.logger import logger
 
-async def start_graph_v2(query: str):
+async def start_graph_v2(query: str, session_id: str = "default"):
   state = RouterState(
+      session_id=session_id,
       user_message=query,
   )
   result = await route_app.ainvoke(state)
 
   return result['bot_message']
+
+async def stream_graph_v2(query: str, session_id: str = "default"):
+  """Same as start_graph_v2 but yields server-sent events: node progress, answer tokens and the final reply."""
+  state = RouterState(
+      session_id=session_id,
+      user_message=query,
+  )
+  queue = asyncio.Queue()
+  handler = ChatStreamCallbackHandler(queue, asyncio.get_running_loop())
+
+  task = asyncio.create_task(route_app.ainvoke(state, config={"callbacks": [handler]}))
+  task.add_done_callback(lambda _: handler.close())
+
+  try:
+    while True:
+      event = await queue.get()
+      if event is None:
+        break
+      yield format_sse(event)
+
+    result = await task
+    yield format_sse({"event": "answer", "reply": f"{result['bot_message']}"})
+  except Exception as e:
+    logger.error(f"Chat stream failed: {e}")
+    yield format_sse({"event": "error", "error": str(e)})
+  finally:
+    if not task.done():
+      task.cancel()
@@ -1,10 +1,12 @@
+import time
+
 from langgraph.graph import StateGraph, START, END
 from typing import TypedDict
 from src.service.graph.fall_explanation_graph import \
-  run_company_fall_explanation_graph
-from src.service.graph.intention_service import classify_intent_with_prompt
+  arun_company_fall_explanation_graph
+from src.service.graph.intention_service import aclassify_intent
 from src.service.graph.news_search_reflection_summary_graph import \
-  run_news_graph
+  arun_news_graph
 from src.usecase.image_uc import search_image_embeddings_link
 from src.util.logger import logger
 from src.service.react.react_agent import call_agent
@@ -12,11 +14,15 @@ from langgraph.types import Command
 from src.llm.llm_provider import get_llm
 from src.models.router import UserIntentionEnum
 from src.models.summarised_chat_history_memory import SummaryChatHistory
+from src.service.answer_cache_service import answer_cache
 from src.service.graph.core.subquery_retrieval_graph1 import \
-  run_subquery_search_in_report
+  arun_subquery_search_in_report, LLM_ERROR_ANSWER_PREFIX
+from src.util.executor import run_blocking
 from src.util.prompt_manager import prompt_manager
+from src.service.graph.graph_metrics import graph_metrics_handler
 
 class RouterState(TypedDict, total=False):
+  session_id: str
   user_message: str
   bot_message: str
   history: list
@@ -25,21 +31,24 @@ class RouterState(TypedDict, total=False):
   intent: UserIntentionEnum
   image_wanted: bool
   action: str
+  cache_hit: bool
 
 class MemoryNode(SummaryChatHistory):
 
-  def __call__(self, *args, **kwargs):
+  async def __call__(self, *args, **kwargs):
     state = args[0]
+    session_id = state.get('session_id') or "default"
+    # add_message may summarise the history with a blocking llm call
     if 'bot_message' in state:
-      self.add_message("user1", "assistant", state["bot_message"])
+      await run_blocking(self.add_message, session_id, "assistant", state["bot_message"])
       return Command(goto=END)
     else:
-      self.add_message("user1", "user", state["user_message"])
-      state['history'] = self.get_history("user1")
+      await run_blocking(self.add_message, session_id, "user", state["user_message"])
+      state['history'] = self.get_history(session_id)
       return Command(update=state, goto="classify_intent")
 
-def classify_intent(state: RouterState) -> dict:
-  user_intention = classify_intent_with_prompt(state)
+async def classify_intent(state: RouterState) -> dict:
+  user_intention = await aclassify_intent(state)
 
   logger.info("ROUTER OUTPUT: " + str(user_intention))
 
@@ -49,27 +58,47 @@ def classify_intent(state: RouterState) -> dict:
   state['image_wanted'] = user_intention.image_wanted
   return state
 
+async def lookup_answer_cache(state: RouterState):
+  # image answers carry a fresh link and answers without a ticker depend on the history, both always run the full pipeline
+  if state['image_wanted'] or not state['ticker'] or not answer_cache.is_cacheable(state['intent']):
+    return Command(goto="run_intent")
+
+  answer = await run_blocking(answer_cache.lookup, state['intent'], state['ticker'], state['user_message'])
+  if answer is None:
+    return Command(goto="run_intent")
+
+  return Command(update={'bot_message': answer, 'cache_hit': True}, goto="answer_node")
+
 async def run_intent(state: RouterState) -> dict:
   intent = state["intent"]
+  start_time = time.perf_counter()
 
   if state['image_wanted']:
-    link = search_image_embeddings_link(state['user_message'])
+    link = await run_blocking(search_image_embeddings_link, state['user_message'])
     state['bot_message'] += f"\nI found this image that might help: {link}"
     return state
 
+  # only answers of the ticker graphs are shared, they do not read the session history
+  cacheable = False
   if intent == UserIntentionEnum.COMPANY_INFORMATION_FROM_REPORT and state["ticker"]:
-    answer = run_subquery_search_in_report(state['ticker'][0], state['user_message'])
+    answer = await arun_subquery_search_in_report(state['ticker'][0], state['user_message'])
     state['bot_message'] = answer
+    cacheable = bool(answer) and not answer.startswith(LLM_ERROR_ANSWER_PREFIX)
   elif intent == UserIntentionEnum.NEWS_ABOUT_COMPANY and state['ticker']:
-    answer = run_news_graph(state['ticker'][0], state['user_message'])
+    answer = await arun_news_graph(state['ticker'][0], state['user_message'])
     state['bot_message'] = answer
+    cacheable = True
   elif intent == UserIntentionEnum.ANALYSE_SHARE_PRISE and state["ticker"]:
-    answer = run_company_fall_explanation_graph(state["ticker"])
+    answer = await arun_company_fall_explanation_graph(state["ticker"])
     state['bot_message'] = answer
+    cacheable = True
   else:
     rs = await call_agent(state['user_message'], state['history'])
     state['bot_message'] =rs['output']
 
+  if cacheable:
+    await run_blocking(answer_cache.store, intent, state['ticker'], state['user_message'], state['bot_message'],
+                       time.perf_counter() - start_time)
   return state
 
 def answer_node(state: RouterState) -> dict:
@@ -77,21 +106,23 @@ def answer_node(state: RouterState) -> dict:
   return state
 
 # GRAPH DEFINITION
-memory_node = MemoryNode(get_llm(), prompt_manager.get_prompt('trim_chat_history'), window_character_size=5000, summary_trim_coeficient=0.2)
+memory_node = MemoryNode(None, prompt_manager.get_prompt('trim_chat_history'), window_character_size=5000, summary_trim_coeficient=0.2,
+                         llm_factory=get_llm)
 
 graph = StateGraph(RouterState)
 
 graph.add_node("update_history", memory_node)
 graph.add_node("classify_intent", classify_intent)
+graph.add_node("lookup_answer_cache", lookup_answer_cache)
 graph.add_node("run_intent", run_intent)
 graph.add_node("answer_node", answer_node)
 
 graph.add_edge(START, "update_history")
-graph.add_edge("classify_intent", "run_intent")
+graph.add_edge("classify_intent", "lookup_answer_cache")
 graph.add_edge("run_intent", "answer_node")
 graph.add_edge("answer_node", "update_history")
 
-route_app = graph.compile()
+route_app = graph_metrics_handler.bind(graph.compile(name="router_graph"))
 
 
 if __name__ == "__main__":
@@ -1,5 +1,6 @@
 from langchain_mcp_adapters.client import MultiServerMCPClient
 
+from src.util.component_registry import component_registry
 from src.util.env_property import MCP_FIN_URL
 from src.util.logger import logger
 
@@ -7,19 +8,21 @@ mcp_url = MCP_FIN_URL
 logger.info(f"MCP_FIN_URL: {mcp_url}")
 
 
-mcp_client = None
+def create_mcp_client():
+  # http://mond_mcp:8887/mcp
+  if mcp_url is not None and mcp_url != "":
+    logger.info("MCP_FIN_URL:", mcp_url)
+    return MultiServerMCPClient(
+        {
 
-# http://mond_mcp:8887/mcp
-if mcp_url is not None and mcp_url != "":
-  logger.info("MCP_FIN_URL:", mcp_url)
-  mcp_client = MultiServerMCPClient(
-      {
-
-        "mond_mcp": {
-          "transport": "streamable_http",
-          "url": mcp_url,
+          "mond_mcp": {
+            "transport": "streamable_http",
+            "url": mcp_url,
+          }
         }
-      }
-  )
-else:
+    )
+
   logger.warning("No MCP_FIN_URL provided, skipping MCP tools loading.")
+  return None
+
+get_mcp_client = component_registry.register("mcp_client", create_mcp_client)
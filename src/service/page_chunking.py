@@ -0,0 +1,60 @@
+from bisect import bisect_right
+
+from src.util.env_property import INGESTION_STREAM_WINDOW_CHARS, INGESTION_STREAM_MAX_WINDOW_CHARS
+
+
+def _locate_chunks(window, page_starts, split_fn):
+    # whitespace is collapsed before splitting, so every chunk is found verbatim in the window
+    offsets = [offset for offset, _ in page_starts]
+    cursor = 0
+    for chunk in split_fn(window):
+        start = window.find(chunk, cursor)
+        if start < 0:
+            start = min(cursor, len(window) - 1)
+        end = min(start + max(len(chunk), 1), len(window)) - 1
+        cursor = start + 1
+        pages = {"page_start": page_starts[bisect_right(offsets, start) - 1][1],
+                 "page_end": page_starts[bisect_right(offsets, end) - 1][1]}
+        yield chunk, pages, start
+
+def stream_page_chunks(pages, split_fn, window_chars=INGESTION_STREAM_WINDOW_CHARS,
+                       max_window_chars=INGESTION_STREAM_MAX_WINDOW_CHARS):
+    """Chunks (page number, text) pairs through a sliding window of pages, yields (chunk, {"page_start", "page_end"}).
+
+    Only the current window is held in memory. Its last chunk may continue on the next page,
+    so it is carried into the next window instead of being emitted. A window the splitter keeps
+    returning as a single chunk grows by the next pages until max_window_chars, then it is emitted as is.
+    """
+    window = ""
+    page_starts = []
+    for page_number, text in pages:
+        text = " ".join(text.split())
+        if not text:
+            continue
+        if window:
+            window += " "
+        page_starts.append((len(window), page_number))
+        window += text
+        if len(window) < window_chars:
+            continue
+
+        chunks = list(_locate_chunks(window, page_starts, split_fn))
+        if len(chunks) < 2:
+            if len(window) < max_window_chars:
+                continue
+            for chunk, chunk_pages, _ in chunks:
+                yield chunk, chunk_pages
+            window = ""
+            page_starts = []
+            continue
+        for chunk, chunk_pages, _ in chunks[:-1]:
+            yield chunk, chunk_pages
+
+        carry_from = chunks[-1][2]
+        first_page = bisect_right([offset for offset, _ in page_starts], carry_from) - 1
+        page_starts = [(max(offset - carry_from, 0), number) for offset, number in page_starts[first_page:]]
+        window = window[carry_from:]
+
+    if window:
+        for chunk, chunk_pages, _ in _locate_chunks(window, page_starts, split_fn):
+            yield chunk, chunk_pages
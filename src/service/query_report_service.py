@@ -1,15 +1,23 @@
+from typing import List
+
 from langchain_core.prompts import PromptTemplate
 from src.util.prompt_manager import prompt_manager
-from src.db.db import db_client
+from src.db.db import get_db_client
 from src.llm.llm_provider import get_llm
 from langchain.chains import create_retrieval_chain
 
 from src.service.file_format_service import soup_html_to_text
 from src.usecase.report_uc import save_text_report
+from src.util.env_property import REPORT_RETRIEVAL_MODE, REPORT_RETRIEVAL_K, \
+  RERANK_ENABLED, RERANK_TOP_N
+from src.util.executor import run_blocking
 from src.util.logger import logger
 
+# reranked passages are the best few of a wider candidate set, so fewer of them reach the prompt
+REPORT_CONTEXT_K = RERANK_TOP_N if RERANK_ENABLED else REPORT_RETRIEVAL_K
+
 def base_query_report_question_answer(ticker: str, query: str, join=True):
-  retrieval = db_client.get_base_retriever(type="similarity", ticker=ticker)
+  retrieval = get_db_client().get_base_retriever(type=REPORT_RETRIEVAL_MODE, ticker=ticker, k=REPORT_CONTEXT_K)
   result = retrieval.get_relevant_documents(query)
 
   if join:
@@ -18,10 +26,43 @@ def base_query_report_question_answer(ticker: str, query: str, join=True):
   else:
     return result
 
-def base_query_report_question_answer_full_state(ticker: str, query: str):
-  retrieval = db_client.get_base_retriever(type="similarity", ticker=ticker)
-  result = retrieval.get_relevant_documents(query)
-  all_text = "\n".join(doc.page_content for doc in result)
+async def abase_query_report_question_answer(ticker: str, query: str, join=True):
+  # chroma and the sentence transformer are blocking, keep them off the event loop
+  return await run_blocking(base_query_report_question_answer, ticker, query, join)
+
+def search_report_many(ticker_or_tickers, queries: List[str], join=True):
+  # all queries embedded together and searched with one chroma query per ticker
+  results = get_db_client().search_many(ticker_or_tickers, queries, k=REPORT_CONTEXT_K, type=REPORT_RETRIEVAL_MODE)
+  if join:
+    return ["\n".join(doc.page_content for doc in result) for result in results]
+  return results
+
+async def asearch_report_many(ticker_or_tickers, queries: List[str], join=True):
+  return await run_blocking(search_report_many, ticker_or_tickers, queries, join)
+
+def search_report(ticker: str, query: str, join=True):
+  return search_report_many(ticker, [query], join)[0]
+
+async def asearch_report(ticker: str, query: str, join=True):
+  return await run_blocking(search_report, ticker, query, join)
+
+def search_report_per_ticker(tickers: List[str], queries: List[str], join=True):
+  # one embedding batch for the queries, each ticker's partition searched with the same vectors
+  results = get_db_client().search_many_per_ticker(tickers, queries, k=REPORT_CONTEXT_K, type=REPORT_RETRIEVAL_MODE)
+  if join:
+    return {ticker: ["\n".join(doc.page_content for doc in result) for result in ticker_results]
+            for ticker, ticker_results in results.items()}
+  return results
+
+async def asearch_report_per_ticker(tickers: List[str], queries: List[str], join=True):
+  return await run_blocking(search_report_per_ticker, tickers, queries, join)
+
+def base_query_report_question_answer_full_state(ticker: str, query: str, context: str = None):
+  if context is None:
+    retrieval = get_db_client().get_base_retriever(type=REPORT_RETRIEVAL_MODE, ticker=ticker, k=REPORT_CONTEXT_K)
+    result = retrieval.get_relevant_documents(query)
+    context = "\n".join(doc.page_content for doc in result)
+  all_text = context
 
   question_answer_prompt = PromptTemplate(template=prompt_manager.get_prompt('context_based_answer'), input_variables=["input", "context"])
   chain = question_answer_prompt | get_llm()
@@ -30,16 +71,23 @@ def base_query_report_question_answer_full_state(ticker: str, query: str):
 
   return {"question": query, "context": all_text, "answer": answer.content}
 
+def base_query_report_question_answer_full_state_many(ticker: str, queries: List[str]):
+  contexts = search_report_many(ticker, queries)
+  return [base_query_report_question_answer_full_state(ticker, query, context) for query, context in zip(queries, contexts)]
+
 def report_rephrase_retriever_search(ticker: str, query: str, context: str = None):
-  retrieval = db_client.get_base_retriever(type="similarity", ticker=ticker)
+  retrieval = get_db_client().get_base_retriever(type=REPORT_RETRIEVAL_MODE, ticker=ticker, k=REPORT_CONTEXT_K)
   result = retrieval.get_relevant_documents(query)
   all_text = "\n".join(doc.page_content for doc in result)
   return {'answer': all_text}
 
+async def areport_rephrase_retriever_search(ticker: str, query: str, context: str = None):
+  return await run_blocking(report_rephrase_retriever_search, ticker, query, context)
+
 
 # todo eliminate old way
 # def report_rephrase_retriever_search(ticker: str, query: str, context: str = None):
-#     retrieval = db_client.get_rephrased_retriever(type="similarity", ticker=ticker)
+#     retrieval = get_db_client().get_rephrased_retriever(type="similarity", ticker=ticker)
 #     prompt = PromptTemplate(template="You are a financial consultant. You are provided with context and using them you need to answer the question. Question: {input}\n Context: {context}\n\n\n Answer:", input_variables=["input", "context"])
 #     qa_chain = create_stuff_documents_chain(llm=get_llm(), document_variable_name="context", prompt =prompt)
 #     chain = create_retrieval_chain(retrieval, qa_chain)
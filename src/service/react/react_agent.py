@@ -8,7 +8,7 @@ from src.util.prompt_manager import prompt_manager
 from src.tools.tools import wikipedia_info
 from langchain.agents import initialize_agent, AgentExecutor, \
   create_react_agent, AgentType
-from src.service.mcp.mcp import mcp_client
+from src.service.mcp.mcp import get_mcp_client
 
 
 @log_time
@@ -19,6 +19,7 @@ async def call_agent(query: str, history) -> str:
   memory = form_chat_history(history)
   chat_history = MessagesPlaceholder(variable_name="chat_history")
 
+  mcp_client = get_mcp_client()
   if mcp_client is not None:
     mcp_client_tools = await mcp_client.get_tools()
 
@@ -1,4 +1,4 @@
-from src.db.db import db_client
+from src.db.db import get_db_client
 
 def get_user_intention_with_similarity_search(query: str):
-    return db_client.define_route(query)
+    return get_db_client().define_route(query)
@@ -1,13 +1,28 @@
+from functools import lru_cache
+
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_experimental.text_splitter import SemanticChunker
 from langchain.embeddings import HuggingFaceEmbeddings
 
+from src.service import page_chunking
+from src.util.env_property import INGESTION_STREAM_WINDOW_CHARS, INGESTION_STREAM_MAX_WINDOW_CHARS
+
 def text_to_recursive_splitting(text, chunk_size=300, overlap=60, separators=["\n\n", "."]):
     recursive_splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=overlap,
                                                         separators=["\n\n", "\n", ".", " ", ""])
     return recursive_splitter.split_text(text)
 
+@lru_cache(maxsize=1)
+def get_splitting_embeddings():
+    # loaded once per process, ingestion workers split many reports with it
+    return HuggingFaceEmbeddings()
+
 def text_to_semantic_splitting(text):
-    embeddings = HuggingFaceEmbeddings()
+    embeddings = get_splitting_embeddings()
     semantic_splitter = SemanticChunker(embeddings=embeddings, min_chunk_size=2000, breakpoint_threshold_type="percentile", breakpoint_threshold_amount=0.5)
     return semantic_splitter.split_text(text)
+
+def stream_page_chunks(pages, split_fn=text_to_semantic_splitting, window_chars=INGESTION_STREAM_WINDOW_CHARS,
+                       max_window_chars=INGESTION_STREAM_MAX_WINDOW_CHARS):
+    # the window logic lives in page_chunking, semantic splitting is the default for pdf ingestion
+    return page_chunking.stream_page_chunks(pages, split_fn, window_chars, max_window_chars)
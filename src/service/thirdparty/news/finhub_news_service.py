@@ -1,9 +1,13 @@
+import asyncio
+
 from newspaper import Article
 
 from src.util.env_property import FINNHUB_API_KEY
 import finnhub
 from datetime import datetime, timedelta
 import time
+from src.service.thirdparty.thirdparty_metrics import track_api_call
+from src.util.executor import run_blocking
 from src.util.logger import logger
 
 
@@ -43,9 +47,10 @@ def form_article_test(article_data):
   article_result = ""
   url = article_data.get("url")
   try:
-    article = Article(url)
-    article.download()
-    article.parse()
+    with track_api_call("newspaper", "article"):
+      article = Article(url)
+      article.download()
+      article.parse()
 
     article_text = article.text
     article_result+=article_text
@@ -57,19 +62,21 @@ def form_article_test(article_data):
 
   return article_result
 
-# --HEADLINES
-def fetch_company_news(ticker, filter_by_name=True, later_than_hours_filter=24, max_articles=5):
-  counter = 0
-  ticker = ticker.strip()
+def fetch_headlines(ticker):
   now = datetime.utcnow()
-  six_hours_ago = now - timedelta(hours=later_than_hours_filter)
   yesterday = now - timedelta(days=1)
   today_str = now.strftime("%Y-%m-%d")
   yesterday_str = yesterday.strftime("%Y-%m-%d")
 
   # Fetch all news from today (UTC-based)
-  news_items = finnhub_client.company_news(ticker, _from=yesterday_str, to=today_str)
+  with track_api_call("finnhub", "company_news"):
+    news_items = finnhub_client.company_news(ticker, _from=yesterday_str, to=today_str)
   logger.info(f"HEADLINES: {news_items}")
+  return news_items
+
+def select_news_entities(ticker, news_items, filter_by_name=True, later_than_hours_filter=24, max_articles=5):
+  counter = 0
+  six_hours_ago = datetime.utcnow() - timedelta(hours=later_than_hours_filter)
 
   result = []
   for item in news_items:
@@ -96,10 +103,31 @@ def fetch_company_news(ticker, filter_by_name=True, later_than_hours_filter=24,
       "headline": item.get("headline"),
       "summary": item.get("summary")
     }
+    result.append(entity)
+
+  return result
 
+# --HEADLINES
+def fetch_company_news(ticker, filter_by_name=True, later_than_hours_filter=24, max_articles=5):
+  ticker = ticker.strip()
+  news_items = fetch_headlines(ticker)
+
+  result = select_news_entities(ticker, news_items, filter_by_name, later_than_hours_filter, max_articles)
+  for entity in result:
     time.sleep(2)
     entity['text'] = form_article_test(entity)
-    result.append(entity)
+
+  return result
+
+async def afetch_company_news(ticker, filter_by_name=True, later_than_hours_filter=24, max_articles=5):
+  ticker = ticker.strip()
+  news_items = await run_blocking(fetch_headlines, ticker)
+
+  result = select_news_entities(ticker, news_items, filter_by_name, later_than_hours_filter, max_articles)
+  # articles live on different sites, download them concurrently instead of one by one
+  texts = await asyncio.gather(*[run_blocking(form_article_test, entity) for entity in result])
+  for entity, text in zip(result, texts):
+    entity['text'] = text
 
   return result
 
@@ -2,6 +2,8 @@ from abc import ABC, abstractmethod
 import json
 import requests
 import time
+from src.service.thirdparty.thirdparty_metrics import track_api_call
+from src.util.executor import run_blocking
 from src.util.logger import logger
 
 from src.util.env_property import FINNHUB_API_KEY, TWELVE_DATA_API_KEY
@@ -113,17 +115,19 @@ class PriceProviderTwelveData(PriceProvider):
     self.api_key = api_key
 
   def get_last_price(self, ticker: str) -> StockPrice:
-    response = requests.get(f"https://api.twelvedata.com/time_series?apikey={self.api_key}&interval=1day&format=JSON&symbol={ticker}&outputsize=2")
-    data = json.loads(response.content.decode('utf-8'))
-    try:
-      today_price = float(data['values'][0]['close'])
-      yesterday_price = float(data['values'][1]['close'])
-      logger.info("get data from twelvedata for ticker: " + ticker)
-
-      return StockPrice.init_with_price(ticker, today_price, yesterday_price)
-    except Exception as e:
-      logger.info(f"{type(self)} Failed to fetch price for {ticker}. response is: {data}")
-      return None
+    with track_api_call("twelvedata", "time_series") as call:
+      response = requests.get(f"https://api.twelvedata.com/time_series?apikey={self.api_key}&interval=1day&format=JSON&symbol={ticker}&outputsize=2")
+      data = json.loads(response.content.decode('utf-8'))
+      try:
+        today_price = float(data['values'][0]['close'])
+        yesterday_price = float(data['values'][1]['close'])
+        logger.info("get data from twelvedata for ticker: " + ticker)
+
+        return StockPrice.init_with_price(ticker, today_price, yesterday_price)
+      except Exception as e:
+        call.fail()
+        logger.info(f"{type(self)} Failed to fetch price for {ticker}. response is: {data}")
+        return None
 
 
 class PriceProviderFinHub(PriceProvider):
@@ -136,16 +140,18 @@ class PriceProviderFinHub(PriceProvider):
     self.api_key = api_key
 
   def get_last_price(self, ticker: str) -> StockPrice:
-    response = requests.get(f"https://finnhub.io/api/v1/quote?symbol={ticker}&token={self.api_key}")
-    data = json.loads(response.content.decode('utf-8'))
-    try:
-      today_price = float(data['c'])
-      change = float(data['dp'])
-      logger.info("get data from finhub for ticker: " + ticker)
-      return StockPrice.init_with_change(ticker, today_price, change)
-    except Exception:
-      logger.info(f"{type(self)} Failed to fetch price for {ticker}. response is: {data}")
-      return None
+    with track_api_call("finnhub", "quote") as call:
+      response = requests.get(f"https://finnhub.io/api/v1/quote?symbol={ticker}&token={self.api_key}")
+      data = json.loads(response.content.decode('utf-8'))
+      try:
+        today_price = float(data['c'])
+        change = float(data['dp'])
+        logger.info("get data from finhub for ticker: " + ticker)
+        return StockPrice.init_with_change(ticker, today_price, change)
+      except Exception:
+        call.fail()
+        logger.info(f"{type(self)} Failed to fetch price for {ticker}. response is: {data}")
+        return None
 
 price_provider1 = PriceProviderFinHub(FINNHUB_API_KEY)
 price_provider2 = PriceProviderTwelveData(TWELVE_DATA_API_KEY)
@@ -156,3 +162,7 @@ def get_price_change_for_tickers(tickers: [str]):
   factory = PriceFactory([price_provider1, price_provider2], tickers)
   return factory.get_ticker_change_map()
   # example return {'AAPL': -3.5, 'MU': -2.3, 'SOFI': -3.1, 'UBER': -1.8, 'PGY': -3}
+
+async def aget_price_change_for_tickers(tickers: [str]):
+  # the factory polls providers with sleeps between retries, run it on the blocking executor
+  return await run_blocking(get_price_change_for_tickers, tickers)
@@ -0,0 +1,30 @@
+import time
+from contextlib import contextmanager
+
+from src.util.metrics import metrics
+
+THIRD_PARTY_REQUEST_SECONDS = metrics.histogram("third_party_request_seconds", "Latency of third-party api calls", ["api", "operation"])
+THIRD_PARTY_REQUESTS = metrics.counter("third_party_requests_total", "Third-party api calls by result (ok/error)", ["api", "operation", "result"])
+
+
+class ApiCall:
+  def __init__(self):
+    self.failed = False
+
+  def fail(self):
+    # for calls that return normally but carry no usable data (rate limit bodies, empty pages)
+    self.failed = True
+
+
+@contextmanager
+def track_api_call(api: str, operation: str):
+  call = ApiCall()
+  start_time = time.perf_counter()
+  try:
+    yield call
+  except Exception:
+    call.failed = True
+    raise
+  finally:
+    THIRD_PARTY_REQUEST_SECONDS.labels(api=api, operation=operation).observe(time.perf_counter() - start_time)
+    THIRD_PARTY_REQUESTS.labels(api=api, operation=operation, result="error" if call.failed else "ok").inc()
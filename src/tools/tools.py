@@ -1,9 +1,10 @@
-from langchain_core.tools import tool
+from langchain_core.tools import tool, StructuredTool
 from pydantic import Field, BaseModel
 from src.util.logger import logger
 
-from src.service.query_report_service import report_rephrase_retriever_search, base_query_report_question_answer
-from src.service.thirdparty.news.finhub_news_service import fetch_company_news
+from src.service.query_report_service import base_query_report_question_answer, \
+  abase_query_report_question_answer
+from src.service.thirdparty.news.finhub_news_service import fetch_company_news, afetch_company_news
 import wikipediaapi
 
 class WikipediaSearchByNoun(BaseModel):
@@ -51,21 +52,39 @@ class SearchLatestNews(BaseModel):
         description="Stock ticker symbol (e.g. AAPL, GOOGL, MSFT). This field is required and cannot be null. Use value near the word 'ticker' in user's question.",
     )
 
-@tool(args_schema=SearchLatestNews)
-def search_company_news(ticker: str) -> str:
-  """
-  Call this tool in any situation providing question and ticker to fetch latest news for given ticker
-  """
+def _search_company_news(ticker: str) -> str:
   logger.info("Latest news tool called with ticker: " + str(ticker))
   response = fetch_company_news(ticker)
 
   return response
 
+async def _asearch_company_news(ticker: str) -> str:
+  logger.info("Latest news tool called with ticker: " + str(ticker))
+  response = await afetch_company_news(ticker)
+
+  return response
+
+search_company_news = StructuredTool.from_function(
+    func=_search_company_news,
+    coroutine=_asearch_company_news,
+    name="search_company_news",
+    description="Call this tool in any situation providing question and ticker to fetch latest news for given ticker",
+    args_schema=SearchLatestNews
+)
 
-@tool(args_schema=SearchInReportInput)
-def search_in_report(question: str, ticker: str) -> str:
-  """
-  Call this tool in any situation providing question and ticker by default for searching in the report context.
-  """
+
+def _search_in_report(question: str, ticker: str) -> str:
   response = base_query_report_question_answer(ticker, question)
   return response
+
+async def _asearch_in_report(question: str, ticker: str) -> str:
+  response = await abase_query_report_question_answer(ticker, question)
+  return response
+
+search_in_report = StructuredTool.from_function(
+    func=_search_in_report,
+    coroutine=_asearch_in_report,
+    name="search_in_report",
+    description="Call this tool in any situation providing question and ticker by default for searching in the report context.",
+    args_schema=SearchInReportInput
+)
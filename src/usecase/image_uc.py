@@ -1,11 +1,101 @@
-from src.db.db import db_client
+import io
+import os
+import zipfile
+
+from PIL import Image
+
+from src.db.db import get_db_client
+from src.util.env_property import CLIP_BATCH_SIZE, IMAGE_UPLOAD_MAX_BYTES
 from src.util.logger import logger
 
+IMAGE_EXTENSIONS = {".png", ".jpg", ".jpeg", ".gif", ".bmp", ".webp", ".tif", ".tiff"}
+
 def save_image_embeddings(file_bytes, metadata: dict, link: str):
-  db_client.store_image_embedding(file_bytes, uri=link, metadata=metadata)
+  return get_db_client().store_image_embedding(file_bytes, uri=link, metadata=metadata)
+
+def iter_image_files(files, max_bytes: int = IMAGE_UPLOAD_MAX_BYTES):
+  """Yields (filename, binary stream, error) of every image among (filename, bytes or file) pairs.
+
+  Zip archives are expanded entry by entry. An unreadable archive or entry, or an entry over max_bytes
+  uncompressed, comes back with a None stream and the error, the other images are still yielded.
+  """
+  for filename, content in files:
+    stream = io.BytesIO(content) if isinstance(content, bytes) else content
+    if not zipfile.is_zipfile(stream):
+      stream.seek(0)
+      yield filename, stream, None
+      continue
+    try:
+      archive = zipfile.ZipFile(stream)
+    except Exception as e:
+      logger.warning(f"Skipping archive {filename}: {e}")
+      yield filename, None, f"Cannot read archive: {e}"
+      continue
+    with archive:
+      for entry in archive.infolist():
+        if entry.is_dir() or os.path.splitext(entry.filename)[1].lower() not in IMAGE_EXTENSIONS:
+          continue
+        # the reader never returns more than the declared size, so checking it bounds the decompression
+        if entry.file_size > max_bytes:
+          yield entry.filename, None, f"Image is {entry.file_size} bytes uncompressed, the limit is {max_bytes}"
+          continue
+        try:
+          data = archive.read(entry)
+        except Exception as e:
+          logger.warning(f"Skipping archive entry {entry.filename}: {e}")
+          yield entry.filename, None, f"Cannot read archive entry: {e}"
+          continue
+        yield entry.filename, io.BytesIO(data), None
+
+def save_image_embeddings_batch(files, metadata: dict, links: dict, batch_size: int = CLIP_BATCH_SIZE):
+  """Embeds many images at once. Returns one result per image with its id, or the decoding error.
+
+  Images are decoded one CLIP batch at a time and the batch is released before the next is decoded.
+  """
+  results = []
+  images, uris, metadatas, positions = [], [], [], []
+
+  def flush():
+    try:
+      ids = get_db_client().store_image_embeddings(images, uris, metadatas)
+      for position, doc_id in zip(positions, ids):
+        results[position]["id"] = doc_id
+    except Exception as e:
+      # earlier batches are stored already, their ids are still returned
+      logger.error(f"Storing {len(images)} images failed: {e}")
+      for position in positions:
+        results[position]["error"] = f"Cannot store image: {e}"
+    for batch in (images, uris, metadatas, positions):
+      batch.clear()
+
+  for filename, stream, error in iter_image_files(files):
+    if error:
+      results.append({"filename": filename, "id": None, "error": error})
+      continue
+    try:
+      image = Image.open(stream)
+      image.load()
+    except Exception as e:
+      logger.warning(f"Skipping image {filename}: {e}")
+      results.append({"filename": filename, "id": None, "error": f"Cannot decode image: {e}"})
+      continue
+
+    link = links.get(filename, filename)
+    positions.append(len(results))
+    results.append({"filename": filename, "id": None, "error": None})
+    images.append(image)
+    uris.append(link)
+    metadatas.append({**metadata, "link": link, "filename": filename})
+    if len(images) >= batch_size:
+      flush()
+
+  if images:
+    flush()
+
+  return results
 
 def search_image_embeddings_link(query: str):
-  result = db_client.search_image_embedd(query)
+  result = get_db_client().search_image_embedd(query)
   logger.info(f"Image search result: {result}")
   metadatas = result.get('metadatas')
   if metadatas and metadatas[0] and 'link' in metadatas[0][0]:
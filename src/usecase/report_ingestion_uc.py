@@ -0,0 +1,138 @@
+import multiprocessing
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict
+from uuid import uuid4
+
+from src.db.db import report_partition_name
+from src.models.ingestion_job import IngestionJob, IngestionStage
+from src.service.file_format_service import any_format_to_str_with_pages, iter_pdf_pages
+from src.service.split_service import text_to_semantic_splitting, stream_page_chunks
+from src.usecase.report_uc import store_report_chunks
+from src.util.env_property import INGESTION_WORKERS, INGESTION_JOBS_HISTORY
+from src.util.logger import logger
+
+
+class ReportIngestionQueue:
+  """Runs report ingestion in the background and keeps the state of recent jobs.
+
+  Parsing and semantic chunking are CPU bound and go to a pool of worker processes.
+  Embedding and insertion stay in this process because the vector db lives here.
+  PDFs are streamed: pages are parsed one at a time, each window of pages is chunked in
+  the pool and the chunks are embedded batch by batch, so memory does not grow with the report.
+  Jobs of one ticker write its partition one after the other, other tickers run side by side.
+  """
+
+  def __init__(self, workers: int = INGESTION_WORKERS, history_size: int = INGESTION_JOBS_HISTORY):
+    self.workers = workers
+    self.history_size = history_size
+    self._jobs: OrderedDict[str, IngestionJob] = OrderedDict()
+    self._ticker_locks: Dict[str, threading.Lock] = {}
+    self._lock = threading.Lock()
+    self._job_executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="report-ingestion")
+    self._process_pool = None
+
+  def _get_process_pool(self):
+    with self._lock:
+      if self._process_pool is None:
+        # spawn, so workers do not inherit torch / chroma state of the api process
+        self._process_pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+      return self._process_pool
+
+  def _ticker_lock(self, ticker: str) -> threading.Lock:
+    # keyed like the partition, so tickers that differ only in case share one writer
+    with self._lock:
+      return self._ticker_locks.setdefault(report_partition_name(ticker), threading.Lock())
+
+  def submit(self, file: bytes, metadata: dict, content_type: str) -> IngestionJob:
+    job = IngestionJob(id=str(uuid4()), ticker=metadata["ticker"], date=metadata["date"], content_type=content_type)
+    with self._lock:
+      self._jobs[job.id] = job
+      self._evict_finished_jobs()
+
+    self._job_executor.submit(self._run, job.id, file, metadata, content_type)
+    logger.info(f"Report ingestion job {job.id} queued for {job.ticker}")
+    return job.model_copy()
+
+  def get(self, job_id: str) -> IngestionJob | None:
+    with self._lock:
+      job = self._jobs.get(job_id)
+      return job.model_copy() if job else None
+
+  def _evict_finished_jobs(self):
+    finished = [job_id for job_id, job in self._jobs.items() if job.stage in (IngestionStage.DONE, IngestionStage.FAILED)]
+    while len(self._jobs) > self.history_size and finished:
+      self._jobs.pop(finished.pop(0), None)
+
+  def _update(self, job_id: str, **fields):
+    with self._lock:
+      job = self._jobs[job_id]
+      for key, value in fields.items():
+        setattr(job, key, value)
+
+  def _record_timing(self, job_id: str, stage: IngestionStage, started_at: float):
+    with self._lock:
+      self._jobs[job_id].timings[stage.value.lower()] = round(time.perf_counter() - started_at, 3)
+
+  def _track_pages(self, job_id: str, pages):
+    for page_number, text in pages:
+      self._update(job_id, pages_parsed=page_number)
+      yield page_number, text
+
+  def _track_chunks(self, job_id: str, chunks):
+    for count, chunk in enumerate(chunks, start=1):
+      self._update(job_id, chunks_total=count)
+      yield chunk
+
+  def _run_streaming(self, job_id: str, file: bytes, metadata: dict, pool):
+    started_at = time.perf_counter()
+    self._update(job_id, stage=IngestionStage.STREAMING)
+    pages = self._track_pages(job_id, iter_pdf_pages(file))
+    chunks = stream_page_chunks(pages, split_fn=lambda window: pool.submit(text_to_semantic_splitting, window).result())
+    # the chunks are consumed by the upsert, so parsing of this report waits for the ticker's previous job
+    with self._ticker_lock(metadata["ticker"]):
+      upsert = store_report_chunks(self._track_chunks(job_id, chunks), metadata,
+                                   progress=lambda done: self._update(job_id, chunks_embedded=done))
+    self._update(job_id, chunks_reused=upsert["kept"], chunks_removed=upsert["removed"])
+    self._record_timing(job_id, IngestionStage.STREAMING, started_at)
+    return upsert["added"] + upsert["kept"]
+
+  def _run(self, job_id: str, file: bytes, metadata: dict, content_type: str):
+    pool = self._get_process_pool()
+    try:
+      if content_type == "application/pdf":
+        chunks = self._run_streaming(job_id, file, metadata, pool)
+        self._update(job_id, stage=IngestionStage.DONE, finished_at=datetime.utcnow())
+        logger.info(f"Report ingestion job {job_id} finished: {chunks} chunks streamed from {self.get(job_id).pages_parsed} pages")
+        return
+
+      started_at = time.perf_counter()
+      self._update(job_id, stage=IngestionStage.PARSING)
+      text, pages = pool.submit(any_format_to_str_with_pages, file, content_type).result()
+      self._update(job_id, pages_parsed=pages)
+      self._record_timing(job_id, IngestionStage.PARSING, started_at)
+
+      started_at = time.perf_counter()
+      self._update(job_id, stage=IngestionStage.CHUNKING)
+      chunks = pool.submit(text_to_semantic_splitting, text).result()
+      self._update(job_id, chunks_total=len(chunks))
+      self._record_timing(job_id, IngestionStage.CHUNKING, started_at)
+
+      started_at = time.perf_counter()
+      self._update(job_id, stage=IngestionStage.EMBEDDING)
+      with self._ticker_lock(metadata["ticker"]):
+        upsert = store_report_chunks(chunks, metadata, progress=lambda done: self._update(job_id, chunks_embedded=done))
+      self._update(job_id, chunks_reused=upsert["kept"], chunks_removed=upsert["removed"])
+      self._record_timing(job_id, IngestionStage.EMBEDDING, started_at)
+
+      self._update(job_id, stage=IngestionStage.DONE, finished_at=datetime.utcnow())
+      logger.info(f"Report ingestion job {job_id} finished: {len(chunks)} chunks from {pages} pages")
+    except Exception as e:
+      logger.error(f"Report ingestion job {job_id} failed: {e}")
+      self._update(job_id, stage=IngestionStage.FAILED, error=str(e), finished_at=datetime.utcnow())
+
+
+report_ingestion_queue = ReportIngestionQueue()
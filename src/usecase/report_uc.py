@@ -1,29 +1,49 @@
 from src.service.split_service import text_to_semantic_splitting, \
-  text_to_recursive_splitting
-from src.db.db import db_client
-from src.service.file_format_service import any_format_to_str
+  text_to_recursive_splitting, stream_page_chunks
+from src.db.db import get_db_client
+from src.service.answer_cache_service import answer_cache
+from src.service.file_format_service import any_format_to_str, iter_pdf_pages
 from src.util.logger import logger
 
 def save_report(file, metadata, content_type):
+  if content_type == "application/pdf":
+    # pages stream through the chunker into the db, the report text is never joined into one string
+    upsert = store_report_chunks(stream_page_chunks(iter_pdf_pages(file)), metadata)
+    logger.info(f"Total chunks created: {upsert['added'] + upsert['kept']}")
+    return
+
   text = any_format_to_str(file, content_type)
   chunks = text_to_semantic_splitting(text)
   # chunks = text_to_recursive_splitting(text)
   logger.info(f"Total chunks created: {len(chunks)}")
 
-  db_client.add_new_report(chunks, metadata)
+  store_report_chunks(chunks, metadata)
 
 def save_text_report(text, metadata):
   chunks = text_to_semantic_splitting(text)
   # chunks = text_to_recursive_splitting(text)
   logger.info(f"Total chunks created: {len(chunks)}")
 
-  db_client.add_new_report(chunks, metadata)
+  store_report_chunks(chunks, metadata)
+
+def store_report_chunks(chunks, metadata, progress=None):
+  try:
+    return get_db_client().add_new_report(chunks, metadata, progress=progress)
+  finally:
+    # a failed upsert may already have written some batches, cached answers are dropped either way
+    answer_cache.invalidate_ticker(metadata["ticker"])
 
 def delete_report(ticker):
-  db_client.delete_report(ticker)
+  try:
+    get_db_client().delete_report(ticker)
+  finally:
+    answer_cache.invalidate_ticker(ticker)
 
 def get_report_list():
-    return db_client.get_existing_reports()
+    return get_db_client().get_existing_reports()
+
+def get_report_details(ticker):
+    return get_db_client().get_report_details(ticker)
 
 
 if __name__ == "__main__":
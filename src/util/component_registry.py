@@ -0,0 +1,116 @@
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+from src.util.logger import logger
+from src.util.metrics import metrics
+
+COMPONENT_LOAD_SECONDS = metrics.gauge("component_load_seconds", "Time it took to load a lazily created component", ["component"])
+COMPONENT_LOADED = metrics.gauge("component_loaded", "1 when the component is loaded, 0 otherwise", ["component"])
+
+
+class Component:
+  def __init__(self, name: str, factory: Callable, warm_up: bool = True):
+    self.name = name
+    self.factory = factory
+    self.warm_up = warm_up
+    self.instance = None
+    self.loaded = False
+    self.load_seconds: Optional[float] = None
+    self.error: Optional[str] = None
+    self.lock = threading.Lock()
+
+
+class ComponentRegistry:
+  """Models and clients created on first use instead of at import time.
+
+  Components flagged with warm_up are loaded by warm_up(), usually from a background thread
+  at startup, and the service reports ready once all of them are loaded.
+  """
+
+  def __init__(self):
+    self._components: Dict[str, Component] = {}
+    self._lock = threading.Lock()
+    self._warm_up_thread = None
+    self._warm_up_started = False
+    self._warm_up_done = threading.Event()
+
+  def register(self, name: str, factory: Callable, warm_up: bool = True):
+    with self._lock:
+      if name not in self._components:
+        self._components[name] = Component(name, factory, warm_up)
+        COMPONENT_LOADED.labels(component=name).set(0)
+    return lambda: self.get(name)
+
+  def get(self, name: str):
+    component = self._components[name]
+    if component.loaded:
+      return component.instance
+
+    with component.lock:
+      if component.loaded:
+        return component.instance
+
+      logger.info(f"Loading component {name}")
+      start_time = time.perf_counter()
+      try:
+        instance = component.factory()
+      except Exception as e:
+        component.error = str(e)
+        logger.error(f"Component {name} failed to load: {e}")
+        raise
+      component.load_seconds = time.perf_counter() - start_time
+      component.instance = instance
+      component.error = None
+      component.loaded = True
+
+    COMPONENT_LOAD_SECONDS.labels(component=name).set(component.load_seconds)
+    COMPONENT_LOADED.labels(component=name).set(1)
+    logger.info(f"Component {name} loaded in {component.load_seconds:.2f}s")
+    return component.instance
+
+  def warm_up(self, names: Optional[List[str]] = None):
+    names = names or [c.name for c in self._components.values() if c.warm_up]
+    start_time = time.perf_counter()
+    for name in names:
+      try:
+        self.get(name)
+      except Exception:
+        # already logged, readiness reports the error
+        pass
+    self._warm_up_done.set()
+    logger.info(f"Warm-up finished in {time.perf_counter() - start_time:.2f}s")
+    self.log_report()
+
+  def start_warm_up(self):
+    with self._lock:
+      if self._warm_up_started:
+        return
+      self._warm_up_started = True
+    self._warm_up_thread = threading.Thread(target=self.warm_up, name="component-warm-up", daemon=True)
+    self._warm_up_thread.start()
+
+  def is_ready(self) -> bool:
+    # without a warm-up components load on first request, so the service is ready right away
+    if not self._warm_up_started:
+      return True
+    if not self._warm_up_done.is_set():
+      return False
+    return all(c.loaded for c in self._components.values() if c.warm_up)
+
+  def report(self) -> dict:
+    return {
+      c.name: {
+        "loaded": c.loaded,
+        "load_seconds": round(c.load_seconds, 3) if c.load_seconds is not None else None,
+        "error": c.error,
+      }
+      for c in self._components.values()
+    }
+
+  def log_report(self):
+    for name, status in self.report().items():
+      logger.info(f"Startup component {name}: loaded={status['loaded']} seconds={status['load_seconds']} error={status['error']}")
+
+
+component_registry = ComponentRegistry()
@@ -38,11 +38,127 @@ BEDROCK_MODEL_REASONING=config('BEDROCK_MODEL_REASONING', None)
 BEDROCK_MODEL_CHEAP=config('BEDROCK_MODEL_CHEAP', None)
 BEDROCK_MODEL_SUMMARY=config('BEDROCK_MODEL_SUMMARY', None)
 BEDROCK_MODEL_JUDGE=config('BEDROCK_MODEL_JUDGE', None)
+AWS_REGION=config('AWS_REGION', 'us-east-1')
+
+# AWS QUOTAS - requests and tokens per minute budget per model, shared by the whole process
+BEDROCK_MODEL_RPM=config('BEDROCK_MODEL_RPM', 50, cast=int)
+BEDROCK_MODEL_TPM=config('BEDROCK_MODEL_TPM', 200000, cast=int)
+BEDROCK_MODEL_REASONING_RPM=config('BEDROCK_MODEL_REASONING_RPM', BEDROCK_MODEL_RPM, cast=int)
+BEDROCK_MODEL_REASONING_TPM=config('BEDROCK_MODEL_REASONING_TPM', BEDROCK_MODEL_TPM, cast=int)
+BEDROCK_MODEL_CHEAP_RPM=config('BEDROCK_MODEL_CHEAP_RPM', BEDROCK_MODEL_RPM, cast=int)
+BEDROCK_MODEL_CHEAP_TPM=config('BEDROCK_MODEL_CHEAP_TPM', BEDROCK_MODEL_TPM, cast=int)
+BEDROCK_MODEL_SUMMARY_RPM=config('BEDROCK_MODEL_SUMMARY_RPM', BEDROCK_MODEL_RPM, cast=int)
+BEDROCK_MODEL_SUMMARY_TPM=config('BEDROCK_MODEL_SUMMARY_TPM', BEDROCK_MODEL_TPM, cast=int)
+BEDROCK_MODEL_JUDGE_RPM=config('BEDROCK_MODEL_JUDGE_RPM', BEDROCK_MODEL_RPM, cast=int)
+BEDROCK_MODEL_JUDGE_TPM=config('BEDROCK_MODEL_JUDGE_TPM', BEDROCK_MODEL_TPM, cast=int)
+
+# GOOGLE / OPEN AI QUOTAS
+GOOGLE_AI_MODEL_RPM=config('GOOGLE_AI_MODEL_RPM', 15, cast=int)
+GOOGLE_AI_MODEL_TPM=config('GOOGLE_AI_MODEL_TPM', 1000000, cast=int)
+OPEN_AI_MODEL_RPM=config('OPEN_AI_MODEL_RPM', 500, cast=int)
+OPEN_AI_MODEL_TPM=config('OPEN_AI_MODEL_TPM', 200000, cast=int)
+
+# retries on throttling errors, with jittered exponential backoff
+LLM_MAX_RETRIES=config('LLM_MAX_RETRIES', 6, cast=int)
+
+# LLM CLIENT POOL
+LLM_MAX_POOL_CONNECTIONS=config('LLM_MAX_POOL_CONNECTIONS', 50, cast=int)
+LLM_CREDENTIALS_REFRESH_SECONDS=config('LLM_CREDENTIALS_REFRESH_SECONDS', 300, cast=int)
+
+# LLM RESPONSE CACHE
+LLM_CACHE_PATH=config('LLM_CACHE_PATH', '.cache/llm_cache.sqlite')
+# comma separated namespaces served from the cache, empty disables it
+LLM_CACHE_NAMESPACES=config('LLM_CACHE_NAMESPACES', 'evaluation', cast=lambda v: [n.strip() for n in v.split(',') if n.strip()])
+LLM_CACHE_MAX_ENTRIES=config('LLM_CACHE_MAX_ENTRIES', 50000, cast=int)
 
 # LOCAL
 LLM_URL = config('LLM_URL', 'http://localhost:11434')
 
 
+# VECTOR DB
+# inmemory | persistent | mmap
+VECTOR_DB_SOURCE=config('VECTOR_DB_SOURCE', 'inmemory')
+VECTOR_DB_PATH=config('VECTOR_DB_PATH', '.data/chroma')
+# mmap: report embeddings as memory-mapped .npy files, float16 halves the size, float32 skips the upcast per query
+MMAP_VECTOR_DB_PATH=config('MMAP_VECTOR_DB_PATH', '.data/mmap')
+MMAP_VECTOR_DTYPE=config('MMAP_VECTOR_DTYPE', 'float16')
+
+# TEXT EMBEDDING CACHE
+EMBEDDING_CACHE_MAX_ENTRIES=config('EMBEDDING_CACHE_MAX_ENTRIES', 20000, cast=int)
+# sqlite file that keeps embeddings across restarts, empty keeps the cache in memory only
+EMBEDDING_CACHE_PATH=config('EMBEDDING_CACHE_PATH', '')
+EMBEDDING_CACHE_PERSIST_MAX_ENTRIES=config('EMBEDDING_CACHE_PERSIST_MAX_ENTRIES', 500000, cast=int)
+
+# REPORT RETRIEVAL
+# similarity | hybrid (bm25 + vector, fused by reciprocal rank)
+REPORT_RETRIEVAL_MODE=config('REPORT_RETRIEVAL_MODE', 'hybrid')
+REPORT_RETRIEVAL_K=config('REPORT_RETRIEVAL_K', 4, cast=int)
+# candidates taken from each of the bm25 and vector lists before fusion
+REPORT_HYBRID_FETCH_K=config('REPORT_HYBRID_FETCH_K', 12, cast=int)
+
+# REPORT INDEX
+# hnsw parameters of new report partitions, empty keeps the chroma default. Fixed once a partition is created
+REPORT_HNSW_M=config('REPORT_HNSW_M', '', cast=lambda v: int(v) if v else None)
+REPORT_HNSW_CONSTRUCTION_EF=config('REPORT_HNSW_CONSTRUCTION_EF', '', cast=lambda v: int(v) if v else None)
+REPORT_HNSW_SEARCH_EF=config('REPORT_HNSW_SEARCH_EF', '', cast=lambda v: int(v) if v else None)
+
+# REPORT RERANKING
+# cross-encoder pass over a wide candidate set, only the best RERANK_TOP_N passages reach the prompts
+RERANK_ENABLED=config('RERANK_ENABLED', False, cast=bool)
+RERANK_MODEL=config('RERANK_MODEL', 'cross-encoder/ms-marco-MiniLM-L-6-v2')
+RERANK_CANDIDATES=config('RERANK_CANDIDATES', 20, cast=int)
+RERANK_TOP_N=config('RERANK_TOP_N', 3, cast=int)
+RERANK_BATCH_SIZE=config('RERANK_BATCH_SIZE', 32, cast=int)
+RERANK_MAX_LENGTH=config('RERANK_MAX_LENGTH', 512, cast=int)
+
+# IMAGE EMBEDDINGS
+CLIP_MODEL_NAME=config('CLIP_MODEL_NAME', 'ViT-B-32')
+CLIP_CHECKPOINT=config('CLIP_CHECKPOINT', 'laion2b_s34b_b79k')
+# torch | int8 | onnx
+CLIP_BACKEND=config('CLIP_BACKEND', 'torch')
+CLIP_BATCH_SIZE=config('CLIP_BATCH_SIZE', 16, cast=int)
+CLIP_ONNX_PATH=config('CLIP_ONNX_PATH', '.cache/clip_image_encoder.onnx')
+# archive entries larger than this (uncompressed) are rejected instead of decompressed
+IMAGE_UPLOAD_MAX_BYTES=config('IMAGE_UPLOAD_MAX_BYTES', 20 * 1024 * 1024, cast=int)
+
+# STARTUP
+# loads models and clients in the background at startup, /health/ready waits for it
+WARM_UP_ON_STARTUP=config('WARM_UP_ON_STARTUP', True, cast=bool)
+
+# ASYNC EXECUTION
+BLOCKING_IO_WORKERS=config('BLOCKING_IO_WORKERS', 32, cast=int)
+
+# CHAT MEMORY
+CHAT_MEMORY_MAX_SESSIONS=config('CHAT_MEMORY_MAX_SESSIONS', 1000, cast=int)
+CHAT_MEMORY_TTL_SECONDS=config('CHAT_MEMORY_TTL_SECONDS', 3600, cast=int)
+
+# ANSWER CACHE
+ANSWER_CACHE_ENABLED=config('ANSWER_CACHE_ENABLED', True, cast=bool)
+ANSWER_CACHE_SIMILARITY_THRESHOLD=config('ANSWER_CACHE_SIMILARITY_THRESHOLD', 0.92, cast=float)
+ANSWER_CACHE_MAX_ENTRIES=config('ANSWER_CACHE_MAX_ENTRIES', 2000, cast=int)
+# per intent time to live, 0 disables caching for the intent
+ANSWER_CACHE_TTL_NEWS_SECONDS=config('ANSWER_CACHE_TTL_NEWS_SECONDS', 900, cast=int)
+ANSWER_CACHE_TTL_SHARE_PRICE_SECONDS=config('ANSWER_CACHE_TTL_SHARE_PRICE_SECONDS', 900, cast=int)
+ANSWER_CACHE_TTL_REPORT_SECONDS=config('ANSWER_CACHE_TTL_REPORT_SECONDS', 86400, cast=int)
+ANSWER_CACHE_TTL_OTHER_SECONDS=config('ANSWER_CACHE_TTL_OTHER_SECONDS', 0, cast=int)
+
+# INTENT ROUTER
+# embedding kNN over labelled examples answers confident messages, the rest goes to the LLM classifier
+INTENT_FAST_PATH_ENABLED=config('INTENT_FAST_PATH_ENABLED', True, cast=bool)
+INTENT_KNN_K=config('INTENT_KNN_K', 5, cast=int)
+INTENT_KNN_MIN_SIMILARITY=config('INTENT_KNN_MIN_SIMILARITY', 0.6, cast=float)
+# share of the neighbours' similarity that must vote for the winning intent
+INTENT_KNN_MIN_VOTE=config('INTENT_KNN_MIN_VOTE', 0.8, cast=float)
+
+# REPORT INGESTION
+INGESTION_WORKERS=config('INGESTION_WORKERS', 2, cast=int)
+INGESTION_EMBED_BATCH_SIZE=config('INGESTION_EMBED_BATCH_SIZE', 64, cast=int)
+INGESTION_JOBS_HISTORY=config('INGESTION_JOBS_HISTORY', 200, cast=int)
+# characters of page text the streaming pdf chunker splits at once
+INGESTION_STREAM_WINDOW_CHARS=config('INGESTION_STREAM_WINDOW_CHARS', 20000, cast=int)
+# a window the splitter still returns as one chunk is emitted once it grows past this, it is never held unbounded
+INGESTION_STREAM_MAX_WINDOW_CHARS=config('INGESTION_STREAM_MAX_WINDOW_CHARS', 80000, cast=int)
+
 # 3rd PARTY API KEYS
 FINNHUB_API_KEY = config('FINNHUB_API_KEY', None)
 TWELVE_DATA_API_KEY = config('TWELVE_DATA_API_KEY', None)
@@ -66,8 +182,18 @@ logger.info(f"LLM_SOURCE_CHEAP: {LLM_SOURCE_CHEAP}")
 logger.info(f"LLM_SOURCE_REASONING: {LLM_SOURCE_REASONING}")
 logger.info(f"LLM_SOURCE_JUDGE: {LLM_SOURCE_JUDGE}")
 logger.info(f"BEDROCK_MODEL: {BEDROCK_MODEL}")
+logger.info(f"LLM_MAX_POOL_CONNECTIONS: {LLM_MAX_POOL_CONNECTIONS}")
+logger.info(f"LLM_CACHE_NAMESPACES: {LLM_CACHE_NAMESPACES}")
 logger.info(f"FINNHUB_API_KEY: {'enabled' if FINNHUB_API_KEY else 'disabled'}")
 logger.info(f"TWELVE_DATA_API_KEY: {'enabled' if TWELVE_DATA_API_KEY else 'disabled'}")
+logger.info(f"ANSWER_CACHE_ENABLED: {ANSWER_CACHE_ENABLED}")
+logger.info(f"INTENT_FAST_PATH_ENABLED: {INTENT_FAST_PATH_ENABLED}")
+logger.info(f"VECTOR_DB_SOURCE: {VECTOR_DB_SOURCE}")
+logger.info(f"REPORT_RETRIEVAL_MODE: {REPORT_RETRIEVAL_MODE}")
+logger.info(f"RERANK_ENABLED: {RERANK_ENABLED}")
+logger.info(f"CLIP_BACKEND: {CLIP_BACKEND}")
+logger.info(f"WARM_UP_ON_STARTUP: {WARM_UP_ON_STARTUP}")
+logger.info(f"INGESTION_WORKERS: {INGESTION_WORKERS}")
 logger.info(f"MCP_FIN_URL: {MCP_FIN_URL}")
 logger.info(f"LANGSMITH_TRACING: {LANGSMITH_TRACING}")
 logger.info(f"LANGSMITH_ENDPOINT: {LANGSMITH_ENDPOINT}")
@@ -0,0 +1,18 @@
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from src.util.env_property import BLOCKING_IO_WORKERS
+
+# Bounded pool for the blocking work left on the async request path (chroma, finnhub, newspaper, requests).
+# Bounded on purpose: a burst of chats queues here instead of spawning unlimited threads.
+blocking_executor = ThreadPoolExecutor(max_workers=BLOCKING_IO_WORKERS, thread_name_prefix="blocking-io")
+
+
+async def run_blocking(func, *args, **kwargs):
+  """Runs a blocking call on the bounded executor, keeping context vars (runnable config, callbacks)."""
+  loop = asyncio.get_running_loop()
+  context = contextvars.copy_context()
+  call = functools.partial(context.run, func, *args, **kwargs)
+  return await loop.run_in_executor(blocking_executor, call)
@@ -0,0 +1,178 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, Tuple
+
+# Small in-process metrics registry rendered in the Prometheus text format.
+# Kept dependency free on purpose so every module can record metrics at import time.
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+def _format_labels(labelnames: Tuple[str, ...], labelvalues: Tuple[str, ...], extra: Dict[str, str] = None) -> str:
+  pairs = list(zip(labelnames, labelvalues))
+  if extra:
+    pairs.extend(extra.items())
+  if not pairs:
+    return ""
+  escaped = [f'{k}="' + str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"' for k, v in pairs]
+  return "{" + ",".join(escaped) + "}"
+
+
+class _Metric:
+  metric_type = "untyped"
+
+  def __init__(self, name: str, description: str, labelnames: Iterable[str] = ()):
+    self.name = name
+    self.description = description
+    self.labelnames = tuple(labelnames)
+    self._children = {}
+    self._lock = threading.Lock()
+
+  def labels(self, **labelvalues):
+    key = tuple(str(labelvalues.get(name, "")) for name in self.labelnames)
+    with self._lock:
+      child = self._children.get(key)
+      if child is None:
+        child = self._new_child()
+        self._children[key] = child
+    return child
+
+  def _default(self):
+    return self.labels()
+
+  def _new_child(self):
+    raise NotImplementedError
+
+  def samples(self):
+    with self._lock:
+      children = list(self._children.items())
+    for key, child in children:
+      yield from child.samples(self.name, self.labelnames, key)
+
+  def render(self) -> str:
+    lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} {self.metric_type}"]
+    for sample_name, labels, value in self.samples():
+      lines.append(f"{sample_name}{labels} {value}")
+    return "\n".join(lines)
+
+
+class _CounterChild:
+  def __init__(self):
+    self.value = 0.0
+    self._lock = threading.Lock()
+
+  def inc(self, amount: float = 1.0):
+    with self._lock:
+      self.value += amount
+
+  def samples(self, name, labelnames, labelvalues):
+    yield name, _format_labels(labelnames, labelvalues), self.value
+
+
+class _GaugeChild(_CounterChild):
+  def set(self, value: float):
+    with self._lock:
+      self.value = value
+
+  def dec(self, amount: float = 1.0):
+    self.inc(-amount)
+
+
+class _HistogramChild:
+  def __init__(self, buckets):
+    self.buckets = buckets
+    self.counts = [0] * len(buckets)
+    self.sum = 0.0
+    self.count = 0
+    self._lock = threading.Lock()
+
+  def observe(self, value: float):
+    with self._lock:
+      self.sum += value
+      self.count += 1
+      for idx, bound in enumerate(self.buckets):
+        if value <= bound:
+          self.counts[idx] += 1
+
+  @contextmanager
+  def time(self):
+    start_time = time.perf_counter()
+    try:
+      yield
+    finally:
+      self.observe(time.perf_counter() - start_time)
+
+  def samples(self, name, labelnames, labelvalues):
+    for bound, count in zip(self.buckets, self.counts):
+      yield f"{name}_bucket", _format_labels(labelnames, labelvalues, {"le": str(bound)}), count
+    yield f"{name}_bucket", _format_labels(labelnames, labelvalues, {"le": "+Inf"}), self.count
+    yield f"{name}_sum", _format_labels(labelnames, labelvalues), self.sum
+    yield f"{name}_count", _format_labels(labelnames, labelvalues), self.count
+
+
+class Counter(_Metric):
+  metric_type = "counter"
+
+  def _new_child(self):
+    return _CounterChild()
+
+  def inc(self, amount: float = 1.0):
+    self._default().inc(amount)
+
+
+class Gauge(_Metric):
+  metric_type = "gauge"
+
+  def _new_child(self):
+    return _GaugeChild()
+
+  def set(self, value: float):
+    self._default().set(value)
+
+
+class Histogram(_Metric):
+  metric_type = "histogram"
+
+  def __init__(self, name: str, description: str, labelnames: Iterable[str] = (), buckets=DEFAULT_BUCKETS):
+    super().__init__(name, description, labelnames)
+    self.buckets = tuple(sorted(buckets))
+
+  def _new_child(self):
+    return _HistogramChild(self.buckets)
+
+  def observe(self, value: float):
+    self._default().observe(value)
+
+
+class MetricsRegistry:
+  def __init__(self):
+    self._metrics: Dict[str, _Metric] = {}
+    self._lock = threading.Lock()
+
+  def _get_or_create(self, cls, name, description, labelnames, **kwargs):
+    with self._lock:
+      metric = self._metrics.get(name)
+      if metric is None:
+        metric = cls(name, description, labelnames, **kwargs)
+        self._metrics[name] = metric
+      elif not isinstance(metric, cls):
+        raise ValueError(f"Metric '{name}' already registered with type {metric.metric_type}")
+      return metric
+
+  def counter(self, name: str, description: str, labelnames: Iterable[str] = ()) -> Counter:
+    return self._get_or_create(Counter, name, description, labelnames)
+
+  def gauge(self, name: str, description: str, labelnames: Iterable[str] = ()) -> Gauge:
+    return self._get_or_create(Gauge, name, description, labelnames)
+
+  def histogram(self, name: str, description: str, labelnames: Iterable[str] = (), buckets=DEFAULT_BUCKETS) -> Histogram:
+    return self._get_or_create(Histogram, name, description, labelnames, buckets=buckets)
+
+  def render(self) -> str:
+    with self._lock:
+      metrics = list(self._metrics.values())
+    return "\n".join(metric.render() for metric in metrics) + "\n"
+
+
+metrics = MetricsRegistry()
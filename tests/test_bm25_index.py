@@ -0,0 +1,86 @@
+import math
+
+from langchain_core.documents import Document
+
+from src.db.bm25_index import BM25Index, reciprocal_rank_fusion, tokenize
+
+CHUNKS = {
+  "revenue": "Total net revenue grew 8% to 391.0 billion, driven by services revenue.",
+  "risk": "Supply chain disruption is a key risk factor for the company.",
+  "buyback": "The company repurchased 94.9 billion of its common stock.",
+}
+
+
+def build_index():
+  index = BM25Index()
+  index.add(list(CHUNKS), list(CHUNKS.values()), [{"section": doc_id} for doc_id in CHUNKS])
+  return index
+
+
+def test_tokenize_drops_stop_words_and_keeps_numbers():
+  assert tokenize("What is the revenue of 391.0 billion?") == ["revenue", "391.0", "billion"]
+
+
+def test_search_ranks_matching_chunk_first():
+  results = build_index().search("services revenue", k=3)
+
+  assert [document.id for document, _ in results] == ["revenue"]
+  assert results[0][0].metadata == {"section": "revenue"}
+
+
+def test_score_matches_okapi_formula():
+  index = BM25Index(k1=1.5, b=0.75)
+  index.add(["a", "b"], ["apple banana", "cherry"])
+
+  (_, score), = index.search("apple")
+  # one of two documents holds the term, document length 2 over an average length of 1.5
+  idf = math.log(1 + (2 - 1 + 0.5) / (1 + 0.5))
+  expected = idf * 1 * 2.5 / (1 + 1.5 * (1 - 0.75 + 0.75 * 2 / 1.5))
+  assert math.isclose(score, expected)
+
+
+def test_rarer_terms_weigh_more():
+  index = BM25Index()
+  index.add(["a", "b", "c"], ["company revenue", "company risk", "company buyback"])
+
+  results = index.search("company risk", k=3)
+  assert results[0][0].id == "b"
+
+
+def test_remove_drops_document_and_its_postings():
+  index = build_index()
+  index.remove(["risk", "missing"])
+
+  assert len(index) == 2
+  assert index.search("supply chain risk") == []
+  assert index._postings.get("supply") is None
+
+
+def test_re_adding_an_id_replaces_the_document():
+  index = build_index()
+  index.add(["risk"], ["Currency exposure is the main risk."])
+
+  assert len(index) == 3
+  assert index.search("supply chain") == []
+  assert [document.id for document, _ in index.search("currency")] == ["risk"]
+
+
+def test_empty_index_returns_nothing():
+  assert BM25Index().search("revenue") == []
+
+
+def test_fusion_prefers_documents_ranked_in_both_lists():
+  a, b, c, d = (Document(page_content=text) for text in "abcd")
+
+  fused = reciprocal_rank_fusion([[a, b, c], [c, d, b]], k=4)
+  # b and c appear in both lists, c has the better best rank
+  assert [document.page_content for document in fused] == ["c", "b", "a", "d"]
+
+
+def test_fusion_keeps_first_document_for_duplicate_text_and_cuts_at_k():
+  first = Document(page_content="same", metadata={"source": "keyword"})
+  second = Document(page_content="same", metadata={"source": "vector"})
+  other = Document(page_content="other")
+
+  fused = reciprocal_rank_fusion([[first, other], [second]], k=1)
+  assert fused == [first]
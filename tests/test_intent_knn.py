@@ -0,0 +1,124 @@
+import pytest
+
+from src.models.router import UserIntentionEnum
+from src.service.graph.intent_knn import IntentExampleBank, IntentFastPath, TickerExtractor
+
+KNOWN = ["AAPL", "MSFT", "IBM", "COST", "GS", "MS", "MA", "V", "T", "F", "BRK.B"]
+
+# one dimension per keyword, the stub embeds a text as the count of each keyword in it
+KEYWORDS = ["news", "headlines", "report", "revenue", "fall", "drop", "inflation"]
+
+
+class KeywordEmbeddings:
+  def embed_query(self, text):
+    words = text.lower().replace("?", " ").split()
+    # the last dimension keeps texts without keywords from being a zero vector
+    return [float(words.count(keyword)) for keyword in KEYWORDS] + [0.1]
+
+  def embed_documents(self, texts):
+    return [self.embed_query(text) for text in texts]
+
+
+EXAMPLES = [
+  ("latest news about the company", UserIntentionEnum.NEWS_ABOUT_COMPANY),
+  ("news headlines today", UserIntentionEnum.NEWS_ABOUT_COMPANY),
+  ("revenue in the annual report", UserIntentionEnum.COMPANY_INFORMATION_FROM_REPORT),
+  ("report revenue by segment", UserIntentionEnum.COMPANY_INFORMATION_FROM_REPORT),
+  ("why did the share price fall", UserIntentionEnum.ANALYSE_SHARE_PRISE),
+  ("explain the price drop", UserIntentionEnum.ANALYSE_SHARE_PRISE),
+  ("what is inflation", UserIntentionEnum.OTHER_FINANCIAL_QUESTIONS),
+]
+
+
+def build_fast_path(k=2):
+  bank = IntentExampleBank(EXAMPLES, embeddings_fn=KeywordEmbeddings, k=k)
+  return IntentFastPath(bank, TickerExtractor(KNOWN), min_similarity=0.6, min_vote=0.8)
+
+
+@pytest.mark.parametrize("message, expected", [
+  ("What is the latest news about AAPL?", ["AAPL"]),
+  ("Compare MSFT and IBM revenue", ["MSFT", "IBM"]),
+  ("news for ticker: NEWCO", ["NEWCO"]),
+  ("How did $brk.b do?", ["BRK.B"]),
+  ("Berkshire (BRK.B) report", ["BRK.B"]),
+  ("Is Apple doing well?", []),
+  ("news about aapl", []),
+])
+def test_extracts_explicit_and_known_tickers(message, expected):
+  assert TickerExtractor(KNOWN).extract(message) == expected
+
+
+@pytest.mark.parametrize("message", [
+  "Is the 50 day MA above the 200 day MA?",
+  "I think T and F are cheap, V too",
+  "GS and MS reported",
+])
+def test_short_known_symbols_need_a_cue(message):
+  assert TickerExtractor(KNOWN).extract(message) == []
+
+
+@pytest.mark.parametrize("message, expected", [
+  ("news for ticker MA", ["MA"]),
+  ("What about $v?", ["V"]),
+  ("Mastercard (MA) news", ["MA"]),
+])
+def test_short_symbols_with_a_cue(message, expected):
+  assert TickerExtractor(KNOWN).extract(message) == expected
+
+
+def test_message_in_capitals_only_takes_cued_tickers():
+  extractor = TickerExtractor(KNOWN)
+
+  assert extractor.extract("WHAT IS THE COST OF IBM DEBT") == []
+  assert extractor.extract("WHAT IS THE NEWS ON $IBM") == ["IBM"]
+
+
+def test_stored_tickers_are_known_and_failures_are_ignored():
+  assert TickerExtractor([], extra_tickers_fn=lambda: {"acme"}).extract("ACME guidance") == ["ACME"]
+
+  def broken():
+    raise RuntimeError("db down")
+
+  assert TickerExtractor(["AAPL"], extra_tickers_fn=broken).extract("AAPL news") == ["AAPL"]
+
+
+def test_fast_path_answers_confident_message_with_ticker():
+  router, reason = build_fast_path().classify("news about AAPL")
+
+  assert reason is None
+  assert router.intention == UserIntentionEnum.NEWS_ABOUT_COMPANY
+  assert router.ticker == ["AAPL"]
+  assert not router.image_wanted
+
+
+def test_fast_path_sets_image_wanted():
+  router, _ = build_fast_path().classify("report revenue chart for MSFT")
+
+  assert router.intention == UserIntentionEnum.COMPANY_INFORMATION_FROM_REPORT
+  assert router.image_wanted
+
+
+def test_ticker_intent_without_ticker_falls_back():
+  assert build_fast_path().classify("latest news please") == (None, "no_ticker")
+
+
+def test_short_symbol_does_not_make_the_fast_path_answer():
+  # "MA" is a moving average here, the LLM classifier decides with the history
+  assert build_fast_path().classify("why did the price fall below the MA") == (None, "no_ticker")
+
+
+def test_other_financial_question_needs_no_ticker():
+  router, reason = build_fast_path().classify("what is inflation")
+
+  assert reason is None
+  assert router.intention == UserIntentionEnum.OTHER_FINANCIAL_QUESTIONS
+  assert router.ticker == []
+
+
+def test_unrelated_message_falls_back_on_similarity():
+  assert build_fast_path().classify("hello there") == (None, "low_similarity")
+
+
+def test_message_between_intents_falls_back_as_ambiguous():
+  # equally close to one news and two report examples, the report intent wins two thirds of the vote, under 0.8
+  assert build_fast_path(k=3).classify("news headlines report revenue AAPL") == (None, "ambiguous")
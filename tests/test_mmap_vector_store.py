@@ -0,0 +1,107 @@
+import os
+
+import numpy as np
+
+from src.db.mmap_vector_store import CURRENT_FILE, MmapReportPartition, normalize, recover_interrupted_swaps
+
+IDS = ["revenue", "risk", "buyback"]
+TEXTS = ["Net revenue grew 8%.", "Supply chain risk.", "Shares were repurchased."]
+METADATAS = [{"date": "2024", "page_start": 1}, {"date": "2024", "page_start": 7}, {"date": "2023", "page_start": 3}]
+VECTORS = normalize(np.eye(3, 4))
+
+
+def written_partition(path, dtype="float32"):
+  partition = MmapReportPartition(str(path), dtype=dtype)
+  partition.write(IDS, TEXTS, METADATAS, VECTORS)
+  return partition
+
+
+def test_write_then_reopen_reads_every_row(tmp_path):
+  written_partition(tmp_path / "report_AAPL")
+
+  reopened = MmapReportPartition(str(tmp_path / "report_AAPL"))
+  assert len(reopened) == 3
+  assert reopened.get() == {"ids": IDS, "documents": TEXTS, "metadatas": METADATAS}
+
+
+def test_search_decodes_only_the_hits(tmp_path):
+  partition = written_partition(tmp_path / "report_AAPL")
+
+  (hits,) = partition.search(normalize([0, 1, 0, 0]), k=1)
+  distance, document = hits[0]
+  assert abs(distance) < 1e-6
+  assert (document.id, document.page_content, document.metadata) == ("risk", TEXTS[1], METADATAS[1])
+
+
+def test_opening_is_lazy(tmp_path):
+  written_partition(tmp_path / "report_AAPL")
+
+  partition = MmapReportPartition(str(tmp_path / "report_AAPL"))
+  assert partition._version is None
+  partition.search(normalize([1, 0, 0, 0]), k=1)
+  assert partition._version is not None
+
+
+def test_vectors_are_looked_up_by_id(tmp_path):
+  partition = written_partition(tmp_path / "report_AAPL", dtype="float16")
+
+  vectors = partition.vectors(["buyback", "revenue"])
+  assert vectors.dtype == np.float32
+  assert np.allclose(vectors, VECTORS[[2, 0]], atol=1e-3)
+
+
+def test_rewrite_switches_version_and_removes_the_previous_one(tmp_path):
+  path = tmp_path / "report_AAPL"
+  partition = written_partition(path)
+  partition.write(IDS[:1], TEXTS[:1], METADATAS[:1], VECTORS[:1])
+
+  assert sorted(os.listdir(path)) == [CURRENT_FILE, "v2"]
+  assert MmapReportPartition(str(path)).get()["ids"] == ["revenue"]
+
+
+def test_crash_before_the_pointer_switch_keeps_the_previous_version(tmp_path):
+  path = tmp_path / "report_AAPL"
+  written_partition(path)
+  # an interrupted write leaves a half written version directory next to the current one
+  (path / "v2").mkdir()
+  (path / "v2" / "embeddings.npy").write_bytes(b"partial")
+
+  reopened = MmapReportPartition(str(path))
+  assert reopened.get()["ids"] == IDS
+
+  reopened.write(IDS[:2], TEXTS[:2], METADATAS[:2], VECTORS[:2])
+  assert MmapReportPartition(str(path)).get()["ids"] == IDS[:2]
+
+
+def test_flat_layout_is_read_and_replaced_on_write(tmp_path):
+  path = tmp_path / "report_AAPL"
+  written_partition(path)
+  version_path = path / "v1"
+  for name in os.listdir(version_path):
+    os.replace(version_path / name, path / name)
+  os.rmdir(version_path)
+  os.remove(path / CURRENT_FILE)
+  os.remove(path / "offsets.npy")
+
+  partition = MmapReportPartition(str(path))
+  assert partition.get()["ids"] == IDS
+
+  partition.write(IDS, TEXTS, METADATAS, VECTORS)
+  assert sorted(os.listdir(path)) == [CURRENT_FILE, "v1"]
+
+
+def test_interrupted_rename_swap_is_recovered(tmp_path):
+  written_partition(tmp_path / "report_AAPL")
+  os.replace(tmp_path / "report_AAPL", tmp_path / "report_AAPL.old")
+
+  recover_interrupted_swaps(str(tmp_path))
+  assert MmapReportPartition(str(tmp_path / "report_AAPL")).get()["ids"] == IDS
+
+
+def test_drop_removes_the_partition(tmp_path):
+  partition = written_partition(tmp_path / "report_AAPL")
+  partition.drop()
+
+  assert len(partition) == 0
+  assert partition.search(normalize([1, 0, 0, 0]), k=2) == [[]]
+  assert not (tmp_path / "report_AAPL").exists()
@@ -0,0 +1,124 @@
+import random
+
+import pytest
+
+from src.service.graph.core.near_duplicate_index import NearDuplicateIndex, simhash
+
+RISK_FACTORS = (
+  "The Company's operations and performance depend significantly on global and regional economic conditions and "
+  "adverse economic conditions can materially adversely affect the Company's business, results of operations and "
+  "financial condition. The Company has international operations with sales outside the U.S. representing a majority "
+  "of the Company's total net sales. In addition, the Company's global supply chain is large and complex and a "
+  "majority of the Company's supplier facilities, including manufacturing and assembly sites, are located outside "
+  "the U.S. As a result, the Company's operations and performance depend significantly on global and regional "
+  "economic conditions. Adverse macroeconomic conditions, including slow growth or recession, high unemployment, "
+  "inflation, tighter credit, higher interest rates, and currency fluctuations, can adversely impact consumer "
+  "confidence and spending and materially adversely affect demand for the Company's products and services. In "
+  "addition, consumer confidence and spending can be materially adversely affected in response to changes in fiscal "
+  "and monetary policy, financial market volatility, declines in income or asset values, and other economic factors. "
+  "In addition to an adverse impact on demand for the Company's products and services, uncertainty about, or a "
+  "decline in, global or regional economic conditions can have a significant impact on the Company's suppliers, "
+  "contract manufacturers, logistics providers, distributors, cellular network carriers and other channel partners. "
+  "Potential effects include financial instability; inability to obtain credit to finance operations and purchases "
+  "of the Company's products; and insolvency. Adverse economic conditions can also lead to increased credit and "
+  "collectibility risk on the Company's trade receivables; the failure of derivative counterparties and other "
+  "financial institutions; limitations on the Company's ability to issue new debt; reduced liquidity; and declines "
+  "in the fair values of the Company's financial instruments. These and other economic factors can materially "
+  "adversely affect the Company's business, results of operations, financial condition and stock price. The "
+  "Company's business can be impacted by political events, trade and other international disputes, war, terrorism, "
+  "natural disasters, public health issues, industrial accidents and other business interruptions. Political events, "
+  "trade and other international disputes, war, terrorism, natural disasters, public health issues, industrial "
+  "accidents and other business interruptions can harm or disrupt international commerce and the global economy, "
+  "and could have a material adverse effect on the Company and its customers, suppliers, contract manufacturers, "
+  "logistics providers, distributors, cellular network carriers and other channel partners."
+).split()
+
+LIQUIDITY = (
+  "The Company believes its balances of unrestricted cash, cash equivalents and marketable securities, along with "
+  "cash generated by ongoing operations and continued access to debt markets, will be sufficient to satisfy its cash "
+  "requirements and capital return program over the next 12 months and beyond. The Company's contractual "
+  "obligations consist of manufacturing purchase obligations, debt, leases and other commitments. The Company's "
+  "manufacturing purchase obligations primarily consist of noncancelable commitments to acquire components, "
+  "products and capacity with its outsourcing partners. During fiscal year the Company repurchased its common stock "
+  "and paid dividends and dividend equivalents. The Company issues unsecured short-term promissory notes pursuant to "
+  "a commercial paper program and uses the net proceeds for general corporate purposes, including dividends and "
+  "share repurchases. Term debt consists of fixed-rate senior notes with maturities ranging over several decades, "
+  "and future interest payments associated with the notes are payable over the same period. The Company's lease "
+  "obligations consist of operating leases for retail space, offices, data centers and other facilities, with "
+  "remaining lease terms of up to twenty years. Other purchase obligations include noncancelable commitments for "
+  "capital expenditures and supplier arrangements, licensed intellectual property and content, and distribution "
+  "rights. The Company also records deferred tax liabilities related to the deemed repatriation tax, payable in "
+  "installments. Changes in foreign currency exchange rates affect the value of cash flows denominated in other "
+  "currencies, and the Company may enter into forwards and option contracts to protect gross margins from these "
+  "fluctuations. The Company's investment policy and strategy are focused on the preservation of capital and "
+  "supporting the Company's liquidity requirements. The Company uses a combination of internal and external "
+  "management to execute its investment strategy and achieve its investment objectives, and typically invests in "
+  "highly rated securities with the primary objective of minimizing the potential risk of principal loss."
+).split()
+
+CHUNK_WORDS = 300
+
+
+def chunk(words, start=0):
+  return " ".join(words[start:start + CHUNK_WORDS])
+
+
+def edited(words, positions, replacement="amended"):
+  return " ".join(replacement if i in positions else word for i, word in enumerate(words[:CHUNK_WORDS]))
+
+
+def distance(a: str, b: str) -> int:
+  return bin(simhash(a) ^ simhash(b)).count("1")
+
+
+def test_exact_duplicate_is_dropped():
+  index = NearDuplicateIndex()
+  assert index.add(chunk(RISK_FACTORS))
+  assert not index.add(chunk(RISK_FACTORS))
+  assert index.size == 1
+
+
+@pytest.mark.parametrize("sibling", [
+  pytest.param(chunk(RISK_FACTORS, start=10), id="overlapping sibling, 290 of 300 words shared"),
+  pytest.param(edited(RISK_FACTORS, {50, 150, 250}), id="three words edited"),
+  pytest.param(edited(RISK_FACTORS, set(range(5, CHUNK_WORDS, 30))), id="ten words edited"),
+])
+def test_near_duplicate_siblings_are_dropped(sibling):
+  index = NearDuplicateIndex()
+  assert index.add(chunk(RISK_FACTORS))
+  assert not index.add(sibling)
+
+
+def test_unrelated_passages_are_kept():
+  assert distance(chunk(RISK_FACTORS), chunk(LIQUIDITY)) > 20
+
+  index = NearDuplicateIndex()
+  assert index.add(chunk(RISK_FACTORS))
+  assert index.add(chunk(LIQUIDITY))
+  assert index.size == 2
+
+
+def test_twelve_bits_spread_over_every_band_are_still_found():
+  index = NearDuplicateIndex(max_distance=12)
+  assert index._band_bounds == [0, 16, 32, 48, 64]
+
+  fingerprint = simhash(chunk(RISK_FACTORS))
+  index._insert(fingerprint)
+  # three flipped bits in each band, no band matches exactly
+  flipped = fingerprint
+  for start in index._band_bounds[:-1]:
+    for bit in range(3):
+      flipped ^= 1 << start + bit * 5
+  assert index.is_duplicate(flipped)
+  assert not index.is_duplicate(flipped ^ 1 << 15)
+
+
+def test_lookup_compares_a_small_share_of_the_index():
+  index = NearDuplicateIndex()
+  rng = random.Random(1)
+  for _ in range(3000):
+    index._insert(rng.getrandbits(64))
+
+  candidates = sum(len(list(index._candidates(rng.getrandbits(64)))) for _ in range(100)) / 100
+  # a random fingerprint falls within 3 bits of a stored one in some 16 bit band about 4% of the time
+  assert candidates < 0.1 * index.size
@@ -0,0 +1,71 @@
+import re
+
+from src.service.page_chunking import stream_page_chunks
+
+
+def split_sentences(text):
+  return [sentence for sentence in re.split(r"(?<=\.)\s+", text) if sentence]
+
+
+def numbered_pages(count, sentences_per_page=4):
+  return [(page, " ".join(f"Page {page} sentence {i}." for i in range(sentences_per_page)))
+          for page in range(1, count + 1)]
+
+
+def test_chunks_keep_their_page_across_window_boundaries():
+  pages = numbered_pages(6)
+
+  chunks = list(stream_page_chunks(pages, split_sentences, window_chars=60, max_window_chars=1000))
+
+  expected = [sentence for _, text in pages for sentence in split_sentences(text)]
+  assert [chunk for chunk, _ in chunks] == expected
+  for chunk, chunk_pages in chunks:
+    page = int(chunk.split()[1])
+    assert chunk_pages == {"page_start": page, "page_end": page}
+
+
+def test_sentence_continued_on_next_page_spans_both_pages():
+  pages = [
+    (1, "Revenue grew 8%. Services revenue"),
+    (2, "reached a record.   Margins\nexpanded."),
+    (3, ""),
+    (4, "Buybacks continued."),
+  ]
+
+  chunks = list(stream_page_chunks(pages, split_sentences, window_chars=20, max_window_chars=1000))
+
+  assert chunks == [
+    ("Revenue grew 8%.", {"page_start": 1, "page_end": 1}),
+    ("Services revenue reached a record.", {"page_start": 1, "page_end": 2}),
+    ("Margins expanded.", {"page_start": 2, "page_end": 2}),
+    ("Buybacks continued.", {"page_start": 4, "page_end": 4}),
+  ]
+
+
+def test_carried_chunk_keeps_its_first_page_after_several_windows():
+  # the carried last chunk starts mid page, offsets of the next window are relative to it
+  pages = [(1, "A" * 30 + ". Tail of page one"), (2, "still going."), (3, "Next sentence."), (4, "Last one.")]
+
+  chunks = list(stream_page_chunks(pages, split_sentences, window_chars=25, max_window_chars=1000))
+
+  assert chunks[1] == ("Tail of page one still going.", {"page_start": 1, "page_end": 2})
+  assert chunks[2:] == [("Next sentence.", {"page_start": 3, "page_end": 3}),
+                        ("Last one.", {"page_start": 4, "page_end": 4})]
+
+
+def test_window_is_capped_when_the_splitter_returns_one_chunk():
+  windows = []
+
+  def one_chunk(window):
+    windows.append(len(window))
+    return [window]
+
+  pages = [(page, "x" * 100) for page in range(1, 21)]
+
+  chunks = list(stream_page_chunks(pages, one_chunk, window_chars=100, max_window_chars=500))
+
+  assert max(windows) < 600
+  assert len(chunks) == 4
+  assert chunks[0][1] == {"page_start": 1, "page_end": 5}
+  assert chunks[-1][1] == {"page_start": 16, "page_end": 20}
+  assert sum(chunk.count("x") for chunk, _ in chunks) == 20 * 100
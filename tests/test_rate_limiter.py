@@ -0,0 +1,121 @@
+import asyncio
+
+from langchain_core.outputs import Generation, LLMResult
+
+from src.llm.rate_limiter import TokenBucketRateLimiter, TokenUsageCallbackHandler
+
+
+class FakeClock:
+  def __init__(self):
+    self.now = 0.0
+
+  def __call__(self):
+    return self.now
+
+  def advance(self, seconds):
+    self.now += seconds
+
+
+def test_unlimited_limiter_never_waits():
+  limiter = TokenBucketRateLimiter("unlimited", None, None, clock=FakeClock())
+  assert all(limiter.acquire(blocking=False) for _ in range(1000))
+
+
+def test_request_burst_then_refill():
+  clock = FakeClock()
+  # 60 rpm is one request per second, a 10 second burst allows 10 requests at once
+  limiter = TokenBucketRateLimiter("burst", 60, clock=clock, burst_seconds=10)
+
+  assert all(limiter.acquire(blocking=False) for _ in range(10))
+  assert not limiter.acquire(blocking=False)
+
+  clock.advance(0.5)
+  assert not limiter.acquire(blocking=False)
+  clock.advance(0.5)
+  assert limiter.acquire(blocking=False)
+  assert not limiter.acquire(blocking=False)
+
+
+def test_refill_is_capped_at_burst_capacity():
+  clock = FakeClock()
+  limiter = TokenBucketRateLimiter("cap", 60, clock=clock, burst_seconds=2)
+
+  clock.advance(3600)
+  assert limiter.acquire(blocking=False)
+  assert limiter.acquire(blocking=False)
+  assert not limiter.acquire(blocking=False)
+
+
+def test_token_debt_blocks_until_paid_back():
+  clock = FakeClock()
+  # 600 tpm refills 10 tokens per second
+  limiter = TokenBucketRateLimiter("tokens", None, 600, clock=clock)
+
+  assert limiter.acquire(blocking=False)
+  limiter.record_tokens(900)
+  assert not limiter.acquire(blocking=False)
+
+  clock.advance(30)
+  assert not limiter.acquire(blocking=False)
+  clock.advance(0.1)
+  assert limiter.acquire(blocking=False)
+
+
+def test_record_tokens_without_token_budget_is_ignored():
+  clock = FakeClock()
+  limiter = TokenBucketRateLimiter("requests_only", 60, clock=clock, burst_seconds=1)
+
+  limiter.record_tokens(10 ** 6)
+  assert limiter.acquire(blocking=False)
+
+
+def test_waiters_are_served_in_arrival_order():
+  limiter = TokenBucketRateLimiter("fifo", 60, clock=FakeClock())
+
+  with limiter._condition:
+    earlier_waiter = limiter._enqueue()
+  assert not limiter.acquire(blocking=False)
+
+  with limiter._condition:
+    limiter._leave(earlier_waiter)
+  assert limiter.acquire(blocking=False)
+
+
+def test_async_acquire_shares_the_budget():
+  clock = FakeClock()
+  limiter = TokenBucketRateLimiter("async", 60, clock=clock, burst_seconds=1)
+
+  assert limiter.acquire(blocking=False)
+  assert not asyncio.run(limiter.aacquire(blocking=False))
+  clock.advance(1)
+  assert asyncio.run(limiter.aacquire(blocking=False))
+  assert not limiter.acquire(blocking=False)
+
+
+def test_async_acquire_waits_for_refill():
+  clock = FakeClock()
+  # 6000 rpm, so the coroutine retries after 10ms of real time
+  limiter = TokenBucketRateLimiter("async_wait", 6000, clock=clock, burst_seconds=0.01)
+
+  async def scenario():
+    assert await limiter.aacquire(blocking=False)
+
+    async def refill():
+      await asyncio.sleep(0)
+      clock.advance(1)
+
+    acquired, _ = await asyncio.gather(asyncio.wait_for(limiter.aacquire(), timeout=5), refill())
+    return acquired
+
+  assert asyncio.run(scenario())
+
+
+def test_callback_debits_reported_tokens():
+  clock = FakeClock()
+  limiter = TokenBucketRateLimiter("callback", None, 60, clock=clock)
+  handler = TokenUsageCallbackHandler(limiter)
+
+  handler.on_llm_end(LLMResult(generations=[[Generation(text="ok")]], llm_output={"token_usage": {"total_tokens": 120}}))
+  assert not limiter.acquire(blocking=False)
+  clock.advance(61)
+  assert limiter.acquire(blocking=False)